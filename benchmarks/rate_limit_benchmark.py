@@ -0,0 +1,75 @@
+"""
+Benchmarks the overhead of the rate limit middleware per request: an empty ASGI app served with and without the
+middleware in front, for each rate limit backend. Requests carry a valid JWT, such that the buckets are keyed on the
+token subject like for authenticated API clients. Run it from the root of the repository, e.g.:
+
+    PYTHONPATH=src python benchmarks/rate_limit_benchmark.py --requests 100000
+"""
+import time
+import asyncio
+import argparse
+
+from datetime import datetime, timedelta
+
+import jwt
+
+from api.rate_limit import RateLimitMiddleware, InMemoryRateLimitBackend, rate_limit_backend_from_url
+
+
+JWT_KEY = "benchmark"
+ALGORITHM = "HS256"
+
+
+async def empty_app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive() -> dict:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message: dict) -> None:
+    pass
+
+
+async def time_requests(app, n_requests: int, n_users: int) -> float:
+    """
+    Serves requests of a number of users, alternating between them.
+
+    :param app: the ASGI app
+    :param n_requests: number of requests
+    :param n_users: number of users
+    :return: the average time per request, in microseconds
+    """
+    tokens = [jwt.encode(payload={"sub": f"user_{user}", "exp": datetime.utcnow() + timedelta(hours=1)}, key=JWT_KEY,
+                         algorithm=ALGORITHM) for user in range(n_users)]
+    scopes = [{"type": "http", "method": "GET", "path": "/cellar_views/wine_in_cellar/get_your_bottles",
+               "headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("127.0.0.1", 50000)}
+              for token in tokens]
+    start = time.perf_counter()
+    for request in range(n_requests):
+        await app(scopes[request % n_users], receive, send)
+    return (time.perf_counter() - start) / n_requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the overhead of the rate limit middleware.")
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    # Buckets that never run out, such that every request passes the middleware
+    limits = {"cellar_views": {"capacity": 10 * args.requests, "refill_per_second": 1.}}
+    baseline = asyncio.run(time_requests(empty_app, n_requests=args.requests, n_users=args.users))
+    print(f"{'no middleware':>30}: {baseline:6.2f} µs/request")
+    for name, backend in (("in-memory backend", InMemoryRateLimitBackend()),
+                          ("Redis backend on stand-in", rate_limit_backend_from_url("memory://"))):
+        middleware = RateLimitMiddleware(app=empty_app, backend=backend, limits=limits, jwt_key=JWT_KEY,
+                                         algorithm=ALGORITHM)
+        elapsed = asyncio.run(time_requests(middleware, n_requests=args.requests, n_users=args.users))
+        print(f"{name:>30}: {elapsed:6.2f} µs/request ({elapsed - baseline:+.2f} µs overhead)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmarks the latency of the search index on a synthetic corpus. Run it from the root of the repository, e.g.:
+
+    PYTHONPATH=src python benchmarks/search_benchmark.py --ratings 1000000
+"""
+import time
+import random
+import argparse
+import statistics
+
+from api.search_index import SearchIndex
+
+
+WORDS = ["cherry", "plum", "leather", "tar", "roses", "oak", "vanilla", "tobacco", "earthy", "smoky", "citrus",
+         "apple", "pear", "honey", "mineral", "tannic", "fresh", "long", "finish", "balanced", "spicy", "pepper",
+         "violet", "blackcurrant", "cedar", "butter", "toast", "grass", "lemon", "peach", "apricot", "herbs"]
+GRAPES = ["Nebbiolo", "Barbera", "Sangiovese", "Merlot", "Cabernet Sauvignon", "Pinot Noir", "Chardonnay", "Riesling",
+          "Syrah", "Grenache", "Tempranillo", "Sauvignon Blanc"]
+REGIONS = ["Piedmont", "Tuscany", "Bordeaux", "Burgundy", "Rioja", "Mosel", "Rhone", "Napa", "Barossa", "Loire"]
+
+
+def build_index(n_wines: int, n_ratings: int, n_owners: int, seed: int) -> SearchIndex:
+    """
+    Fills a search index with random wines and ratings.
+
+    :param n_wines: number of wines in the catalogue
+    :param n_ratings: number of ratings
+    :param n_owners: number of owners the ratings are spread over
+    :param seed: seed of the random generator
+    :return: the filled index
+    """
+    rng = random.Random(seed)
+    index = SearchIndex()
+    for wine_id in range(n_wines):
+        index.add_wine(wine_id=wine_id, name=f"{rng.choice(REGIONS)} {rng.choice(WORDS)} {wine_id}",
+                       vintage=rng.randint(1980, 2023), grapes=", ".join(rng.sample(GRAPES, 2)),
+                       geographic_info=f"country: None,\tregion: {rng.choice(REGIONS)},\tproducer: None")
+    for rating_id in range(n_ratings):
+        index.add_rating(rating_id=rating_id, rater_id=rng.randrange(n_owners), wine_id=rng.randrange(n_wines),
+                         comments=" ".join(rng.choices(WORDS, k=12)))
+    index.loaded = True
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the search index latency.")
+    parser.add_argument("--wines", type=int, default=100_000)
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=5_000)
+    parser.add_argument("--owner-wines", type=int, default=500, help="Number of wines in the cellar of an owner.")
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(n_wines=args.wines, n_ratings=args.ratings, n_owners=args.owners, seed=args.seed)
+    print(f"Indexed {args.wines} wines and {args.ratings} ratings in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(args.seed)
+    latencies = []
+    for _ in range(args.queries):
+        owner_wines = set(rng.sample(range(args.wines), args.owner_wines))
+        query = " ".join(rng.sample(WORDS + GRAPES + REGIONS, rng.randint(1, 3)))
+        start = time.perf_counter()
+        index.search(query=query, owner_id=rng.randrange(args.owners), owner_wines=owner_wines)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"Search latency over {args.queries} queries: p50 {percentiles[49]:.2f} ms, "
+          f"p99 {percentiles[98]:.2f} ms, max {max(latencies):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
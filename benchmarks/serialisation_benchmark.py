@@ -0,0 +1,88 @@
+"""
+Benchmarks the serialisation of a list response: FastAPI's validation of every row into the response model followed by
+`jsonable_encoder`, against the trusted-row path that encodes the DB rows straight to JSON. Run it from the root of the
+repository, e.g.:
+
+    PYTHONPATH=src python benchmarks/serialisation_benchmark.py --rows 10000
+"""
+import json
+import time
+import random
+import datetime
+import argparse
+import statistics
+
+from typing import Any, Callable
+
+from pydantic import parse_obj_as
+from fastapi.encoders import jsonable_encoder
+
+from api.models import CellarOutModel
+from api.response_formats import json_bytes, orjson
+
+
+def build_rows(n_rows: int, seed: int) -> list[dict[str, Any]]:
+    """
+    Generates rows as returned for the CellarOutModel endpoints by the DB.
+
+    :param n_rows: number of rows
+    :param seed: seed of the random generator
+    :return: the rows
+    """
+    rng = random.Random(seed)
+    rows = []
+    for cellar_id in range(n_rows):
+        vintage = rng.randint(1980, 2023)
+        rows.append({"name": f"wine {rng.randrange(100_000)}", "vintage": vintage, "cellar_id": cellar_id,
+                     "storage_unit": rng.randrange(50), "quantity": rng.randint(1, 12), "bottle_size_cl": 75,
+                     "wine_id": rng.randrange(100_000), "owner_id": 1,
+                     "drink_from": datetime.date(vintage + 2, 1, 1), "drink_before": datetime.date(vintage + 15, 1, 1)})
+    return rows
+
+
+def validated_json(rows: list[dict[str, Any]]) -> bytes:
+    """
+    Serialises rows the way FastAPI serialises a response model of list[CellarOutModel].
+
+    :param rows: the rows
+    :return: the JSON document
+    """
+    return json.dumps(jsonable_encoder(parse_obj_as(list[CellarOutModel], rows))).encode()
+
+
+def measure(serialise: Callable[[list[dict[str, Any]]], bytes], rows: list[dict[str, Any]],
+            repeats: int) -> tuple[list[float], float]:
+    """
+    Times a serialisation function.
+
+    :param serialise: the function
+    :param rows: the rows to serialise
+    :param repeats: number of serialisations
+    :return: the latency of each serialisation in ms and the CPU time per serialisation in ms
+    """
+    latencies = []
+    cpu_start = time.process_time()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        serialise(rows)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, (time.process_time() - cpu_start) * 1000 / repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the serialisation of list responses.")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = build_rows(n_rows=args.rows, seed=args.seed)
+    encoder = "orjson" if orjson is not None else "json"
+    for name, serialise in (("response model", validated_json), (f"trusted rows ({encoder})", json_bytes)):
+        latencies, cpu = measure(serialise=serialise, rows=rows, repeats=args.repeats)
+        print(f"{name:>25}: p50 {statistics.median(latencies):.1f} ms, max {max(latencies):.1f} ms, "
+              f"CPU {cpu:.1f} ms per response of {args.rows} rows")
+
+
+if __name__ == "__main__":
+    main()
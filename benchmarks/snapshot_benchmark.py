@@ -0,0 +1,75 @@
+"""
+Benchmarks the restore and snapshot of the cellar DB on a synthetic dataset. The benchmark REPLACES the content of
+the cellar table of the DB configured in src/env.yml, only run it against a scratch DB. Run it from the root of the
+repository, e.g.:
+
+    PYTHONPATH=src python benchmarks/snapshot_benchmark.py --rows 10000000 --yes
+"""
+import os
+import json
+import time
+import datetime
+import argparse
+import tempfile
+
+import polars as pl
+
+from db.mariadb_jdbc import JdbcMariaDB
+
+from api.constants import DB_CREDS
+from api.snapshots import SNAPSHOT_MANIFEST, snapshot_database, restore_database
+
+
+def write_synthetic_snapshot(directory: str, n_rows: int, part_size: int, seed: int) -> None:
+    """
+    Writes a snapshot holding only a cellar table of random bottles.
+
+    :param directory: the directory of the snapshot
+    :param n_rows: number of bottles
+    :param part_size: number of rows per part file
+    :param seed: seed of the random generator
+    """
+    os.makedirs(os.path.join(directory, "cellar"))
+    for part, start in enumerate(range(0, n_rows, part_size)):
+        size = min(part_size, n_rows - start)
+        id_ = pl.col("id")
+        drink_from = pl.lit(datetime.date(2000, 1, 1)) + pl.duration(days=(id_ * 7919 + seed) % 10_000)
+        (pl.DataFrame({"id": pl.int_range(start + 1, start + size + 1, eager=True)})
+         .with_columns(wine_id=(id_ * 31 + seed) % 100_000, storage_unit=(id_ + seed) % 50,
+                       owner_id=(id_ * 17 + seed) % 5_000, bottle_size_cl=pl.lit(75), quantity=id_ % 12 + 1,
+                       drink_from=drink_from, drink_before=drink_from + pl.duration(days=3650))
+         .write_parquet(os.path.join(directory, "cellar", f"part_{part:08d}.parquet")))
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST), 'w') as file:
+        json.dump({"name": "synthetic", "created_at": str(datetime.datetime.now()), "tables": {"cellar": n_rows}},
+                  file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the restore and snapshot of the cellar DB.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--yes", action="store_true", help="Confirm that the cellar table may be replaced.")
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error("the benchmark replaces the content of the cellar table, confirm with --yes")
+
+    with tempfile.TemporaryDirectory(prefix="cellar_benchmark_") as directory, JdbcMariaDB(**DB_CREDS.dict()) as db:
+        synthetic = os.path.join(directory, "synthetic")
+        write_synthetic_snapshot(directory=synthetic, n_rows=args.rows, part_size=args.batch_size, seed=args.seed)
+
+        start = time.perf_counter()
+        restore_database(db_conn=db, directory=synthetic, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"Restored {args.rows} rows in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+        start = time.perf_counter()
+        manifest = snapshot_database(db_conn=db, directory=os.path.join(directory, "snapshot"),
+                                     batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        rows = sum(manifest["tables"].values())
+        print(f"Snapshotted {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,9 @@ setuptools.setup(
         "passlib[bcrypt]",
         "python-multipart",
         "fastapi-pagination==0.12.4",
-        "loguru"
+        "loguru",
+        "msgpack>=1.0",
+        "orjson>=3.8"
     ],
     package_data={'': ['*.sql']},
     include_package_data=True
@@ -0,0 +1,109 @@
+import time
+import asyncio
+
+from collections import deque
+
+
+class DbAdmission:
+    """
+    Admission controller capping the number of requests that use the DB concurrently, such that a traffic spike queues
+    requests in the worker instead of opening connections until MariaDB refuses them all. Requests over the limit wait
+    in a FIFO queue per priority, lower priority values are admitted first. Requests that cannot be admitted within the
+    timeout, or that arrive when the queue is full, are shed and should be answered with a 503.
+
+    The controller belongs to the event loop of a worker: admissions are acquired and released from coroutines only.
+    """
+    def __init__(self, max_concurrency: int = 20, max_queue: int = 200, timeout_seconds: float = 5.,
+                 retry_after_seconds: int = 1, priorities: dict[str, int] | None = None):
+        """
+        Sets class attributes.
+
+        :param max_concurrency: maximum number of admitted requests, should not exceed the size of the connection pool
+        :param max_queue: maximum number of waiting requests, further requests are shed immediately
+        :param timeout_seconds: maximum time a request waits for its admission
+        :param retry_after_seconds: value of the Retry-After header of shed requests
+        :param priorities: priority of each kind of request, lower values are admitted first, e.g. {"write": 0}
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.priorities = priorities or {"write": 0, "read": 1}
+        self._active = 0
+        self._queues: dict[int, deque[asyncio.Future]] = {priority: deque()
+                                                          for priority in sorted(set(self.priorities.values()))}
+        self.admitted = 0
+        self.queued = 0
+        self.shed_timeout = 0
+        self.shed_queue_full = 0
+        self.total_wait_seconds = 0.
+        self.max_wait_seconds = 0.
+
+    @property
+    def queue_length(self) -> int:
+        """
+        Number of requests waiting for their admission.
+        """
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self, kind: str) -> bool:
+        """
+        Waits for the admission of a request. An admitted request must call release once it no longer uses the DB.
+
+        :param kind: kind of the request, one of the keys of the priorities, e.g. "read" or "write"
+        :return: whether the request was admitted, False if it was shed
+        """
+        if self._active < self.max_concurrency and not self.queue_length:
+            self._active += 1
+            self.admitted += 1
+            return True
+        if self.queue_length >= self.max_queue:
+            self.shed_queue_full += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[self.priorities[kind]].append(waiter)
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if waiter.done() and not waiter.cancelled():
+                # The admission was handed over while the wait ended, pass it on to the next request
+                self.release()
+            else:
+                self._queues[self.priorities[kind]].remove(waiter)
+            if isinstance(error, asyncio.CancelledError):
+                raise
+            self.shed_timeout += 1
+            return False
+        finally:
+            wait = time.perf_counter() - start
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """
+        Releases the admission of a request, handing it over to the first waiting request of the highest priority.
+        """
+        for queue in self._queues.values():
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._active -= 1
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Retrieves the state and statistics of the admissions.
+
+        :return: the statistics, formatted to the DbAdmissionStatsModel schema
+        """
+        return {"max_concurrency": self.max_concurrency, "active": self._active, "queue_length": self.queue_length,
+                "admitted": self.admitted, "queued": self.queued, "shed_timeout": self.shed_timeout,
+                "shed_queue_full": self.shed_queue_full,
+                "average_wait_seconds": self.total_wait_seconds / self.queued if self.queued else 0.,
+                "max_wait_seconds": self.max_wait_seconds}
@@ -10,8 +10,9 @@ from fastapi import Depends, HTTPException, status, Response
 from db.jdbc_interface import JdbcDbConn
 
 from .auth_utils import OAuth2PasswordBearerCookie
+from .dependencies import LazyDbConn, admit
 from .models import OwnerDbModel, OwnerModel, TokenData
-from .constants import JWT_KEY, ALGORITHM, SCOPES, DB_CONN
+from .constants import JWT_KEY, ALGORITHM, SCOPES, DB_CONN, USER_CACHE
 
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
@@ -55,9 +56,35 @@ def verify_scopes(scopes: list[str], user_scopes: str, is_admin: bool = False) -
     return [scope for scope in scopes if scope in user_scopes.split(' ')]
 
 
-def get_user(username: str, user_db: JdbcDbConn) -> OwnerDbModel | None:
+def get_user(username: str, user_db: JdbcDbConn) -> OwnerModel | None:
     """
     Get the user information for a user from the database. Return None if the user does not exist.
+    Existing users are cached, the cache entry is dropped whenever the user is updated or deleted. The password hash is
+    neither retrieved nor cached, as the cache may be shared through an external backend.
+
+    :param username: The username to get information for
+    :param user_db: The user database connection
+    :return: User model or None
+    """
+    if (cached_user := USER_CACHE.get(username)) is not None:
+        return OwnerModel(**cached_user)
+    try:
+        user = user_db.execute_query_select(query="SELECT id, name, username, scopes, is_admin, enabled "
+                                                  "FROM cellar.owners WHERE username=%(username)s",
+                                            params={"username": username},
+                                            get_fields=True)
+        owner = OwnerModel(**user[0])
+        USER_CACHE.set(username, dict(user[0]))
+        return owner
+    except Exception as e:
+        print(e)
+        return
+
+
+def get_user_with_password(username: str, user_db: JdbcDbConn) -> OwnerDbModel | None:
+    """
+    Get the user information including the password hash for a user from the database, without caching it. Return None
+    if the user does not exist.
 
     :param username: The username to get information for
     :param user_db: The user database connection
@@ -83,7 +110,7 @@ def authenticate_user(username: str, password: str, user_db: JdbcDbConn) -> Owne
     :param user_db: The user database connection
     :return: User model or False
     """
-    user = get_user(username=username, user_db=user_db)
+    user = get_user_with_password(username=username, user_db=user_db)
     if not user:
         return False
     if not verify_password(plain_password=password, hashed_password=user.password):
@@ -111,7 +138,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
 async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str, Depends(oauth2_scheme)],
                            user_db: Annotated[JdbcDbConn, Depends(DB_CONN)],
-                           response: Response) -> OwnerDbModel:
+                           response: Response) -> OwnerModel:
     """
     Dependency to validate a JWT token. It checks if the token is linked to a valid user and if the token has all the
     scopes needed for the operations that called this dependency. Raise HTTP exception if anything is not valid.
@@ -138,7 +165,22 @@ async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str
         token_data = TokenData(username=username, scopes=token_scopes)
     except Exception:
         raise credentials_exception
-    user = get_user(username=token_data.username, user_db=user_db)
+    if (cached_user := USER_CACHE.get(token_data.username)) is not None:
+        user = OwnerModel(**cached_user)
+    else:
+        # The lookup opens a pooled connection, so it passes the admission controller like the endpoints do
+        admission = user_db.admission if isinstance(user_db, LazyDbConn) else None
+        if admission is not None:
+            await admit(admission, "read")
+        try:
+            user = get_user(username=token_data.username, user_db=user_db)
+        finally:
+            if isinstance(user_db, LazyDbConn):
+                # The handle of this dependency is not passed to the endpoint, so it would otherwise be held until the
+                # response is sent, i.e. for the whole session of a streaming response
+                user_db.release()
+            if admission is not None:
+                admission.release()
     if user is None:
         raise credentials_exception
     for scope in security_scopes.scopes:
@@ -0,0 +1,209 @@
+import time
+import uuid
+import bisect
+import threading
+import unicodedata
+
+from collections import OrderedDict
+from typing import Any
+
+from db.jdbc_interface import JdbcDbConn
+
+from .cache_backends import CacheBackend
+
+
+def fold(text: str) -> str:
+    """
+    Normalises a text for case and accent insensitive prefix matching, e.g. 'Côte Rôtie' becomes 'cote rotie'.
+
+    :param text: the text to normalise
+    :return: the normalised text
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+class WineNameIndex:
+    """
+    Process-local sorted array of the wine names in the catalogue, used to suggest existing wines while typing. The
+    array is loaded from the DB on the first lookup and is kept up to date by `add_wine_to_db`, so lookups never touch
+    the DB.
+
+    The memory is bounded by the maximum number of entries, when the index is full the oldest wine is dropped. When a
+    cache backend is provided, the wines added by the other workers are announced over the backend and fetched on the
+    next lookup, and clearing the index, e.g. after a restore of the DB, clears the indexes of all workers. An optional
+    TTL reloads the index periodically, which bounds its age for announcements this process misses.
+    """
+    def __init__(self, max_entries: int = 100_000, backend: CacheBackend | None = None, namespace: str | None = None,
+                 ttl_seconds: float | None = None):
+        """
+        Sets class attributes.
+
+        :param max_entries: maximum number of wines held in the index
+        :param backend: Optional cache backend carrying the added wines and clears between workers
+        :param namespace: Name of the index in the invalidation messages, required when a backend is provided
+        :param ttl_seconds: Optional maximum age of the index, the index is only reloaded when cleared if omitted
+        """
+        self.max_entries = max_entries
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.loaded = False
+        self._loaded_at = 0.
+        self._origin = uuid.uuid4().hex
+        self._lock = threading.RLock()
+        self._entries: list[tuple[str, str, int, int]] = []
+        self._keys: OrderedDict[int, tuple[str, str, int, int]] = OrderedDict()
+        self._pending: set[int] = set()
+        if backend is not None:
+            backend.subscribe(self._handle_invalidation)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, db_conn: JdbcDbConn) -> None:
+        """
+        (Re)builds the index from the most recently added wines in the wines table.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        with self._lock:
+            # Wines announced from here on may be missing from the queried rows, so they are fetched afterwards
+            self._pending.clear()
+        wines = db_conn.execute_query_select(query="SELECT id, name, vintage FROM cellar.wines "
+                                                   "ORDER BY id DESC LIMIT %(max_entries)s",
+                                             params={"max_entries": self.max_entries})
+        with self._lock:
+            self._clear()
+            for wine_id, name, vintage in reversed(wines):
+                self.add(wine_id=wine_id, name=name, vintage=vintage)
+            self.loaded = True
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db_conn: JdbcDbConn) -> None:
+        """
+        Loads the index if it has not been loaded yet or is older than the TTL, otherwise adds the wines the other
+        workers announced since.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        if not self.loaded or self._expired():
+            with self._lock:
+                if not self.loaded or self._expired():
+                    self.load(db_conn=db_conn)
+        elif self._pending:
+            self._load_pending(db_conn=db_conn)
+
+    def _expired(self) -> bool:
+        """
+        Whether the index is older than the TTL.
+        """
+        return self.ttl_seconds is not None and time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def _load_pending(self, db_conn: JdbcDbConn) -> None:
+        """
+        Adds the wines announced by other workers.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        with self._lock:
+            wine_ids = sorted(self._pending)
+            self._pending.clear()
+        params = {f"wine_{i}": wine_id for i, wine_id in enumerate(wine_ids)}
+        wines = db_conn.execute_query_select(query=f"SELECT id, name, vintage FROM cellar.wines "
+                                                   f"WHERE id IN ({', '.join(f'%({key})s' for key in params)}) "
+                                                   f"ORDER BY id",
+                                             params=params)
+        with self._lock:
+            for wine_id, name, vintage in wines:
+                self.add(wine_id=wine_id, name=name, vintage=vintage)
+
+    def publish(self, wine_ids: list[int]) -> None:
+        """
+        Announces wines added by this worker to the indexes of the other workers.
+
+        :param wine_ids: ids of the added wines
+        """
+        if self.backend is not None and wine_ids:
+            self.backend.publish(f"{self.namespace}:wines:{','.join(map(str, wine_ids))}:{self._origin}")
+
+    def clear(self) -> None:
+        """
+        Drops all entries, the index is reloaded on the next lookup.
+        """
+        self._clear()
+        if self.backend is not None:
+            self.backend.publish(f"{self.namespace}:*")
+
+    def _clear(self) -> None:
+        """
+        Drops all entries of this process only.
+        """
+        with self._lock:
+            self.loaded = False
+            self._entries.clear()
+            self._keys.clear()
+
+    def _handle_invalidation(self, message: str) -> None:
+        """
+        Clears the index when any worker cleared its index and records the wines the other workers added.
+
+        :param message: the invalidation message, formatted as '<namespace>:*' or '<namespace>:wines:<ids>:<origin>'
+        """
+        namespace, _, key = message.partition(":")
+        if namespace != self.namespace:
+            return
+        if key == "*":
+            self._clear()
+            return
+        kind, ids, origin = (key.split(":") + ["", ""])[:3]
+        if kind != "wines" or origin == self._origin:
+            return
+        with self._lock:
+            self._pending.update(int(wine_id) for wine_id in ids.split(",")
+                                 if wine_id.isdigit() and int(wine_id) not in self._keys)
+
+    def add(self, wine_id: int, name: str, vintage: int) -> None:
+        """
+        Adds a wine to the index, dropping the oldest wine if the index is full.
+
+        :param wine_id: id of the wine
+        :param name: name of the wine
+        :param vintage: vintage of the wine
+        """
+        with self._lock:
+            self._remove(wine_id)
+            if self.max_entries <= 0:
+                return
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._keys)))
+            entry = (fold(name), name, vintage, wine_id)
+            bisect.insort(self._entries, entry)
+            self._keys[wine_id] = entry
+
+    def _remove(self, wine_id: int) -> None:
+        """
+        Removes a wine from the index, if present.
+
+        :param wine_id: id of the wine
+        """
+        if (entry := self._keys.pop(wine_id, None)) is not None:
+            del self._entries[bisect.bisect_left(self._entries, entry)]
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict[str, Any]]:
+        """
+        Retrieves the wines whose name starts with a prefix, ignoring case and accents.
+
+        :param prefix: the start of the wine name
+        :param limit: maximum number of suggestions
+        :return: the matching wines in alphabetical order, formatted to the WineSuggestionModel schema
+        """
+        folded = fold(prefix)
+        with self._lock:
+            start = bisect.bisect_left(self._entries, (folded,))
+            suggestions = []
+            for folded_name, name, vintage, wine_id in self._entries[start:start + limit]:
+                if not folded_name.startswith(folded):
+                    break
+                suggestions.append({"wine_id": wine_id, "name": name, "vintage": vintage})
+            return suggestions
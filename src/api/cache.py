@@ -0,0 +1,336 @@
+import json
+import time
+import uuid
+import datetime
+import threading
+
+from typing import Any
+from collections import OrderedDict
+
+from db.jdbc_interface import JdbcDbConn
+
+from .cache_backends import CacheBackend
+
+
+class OwnerCache:
+    """
+    Process-local cache holding one computed result per owner. Entries are dropped whenever the owner writes to the
+    cellar, so a cached value is never older than the owner's last write. When a cache backend is provided, the
+    invalidations are broadcast to the caches of the other workers. An optional TTL bounds the age of entries for
+    invalidations this process misses.
+    """
+    def __init__(self, ttl_seconds: float | None = None, backend: CacheBackend | None = None,
+                 namespace: str | None = None):
+        """
+        Sets class attributes.
+
+        :param ttl_seconds: Optional maximum age of an entry, entries never expire if omitted
+        :param backend: Optional cache backend carrying the invalidations between workers
+        :param namespace: Name of the cache in the invalidation messages, required when a backend is provided
+        """
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.namespace = namespace
+        self._entries: dict[int, tuple[float, Any]] = {}
+        if backend is not None:
+            backend.subscribe(self._handle_invalidation)
+
+    def get(self, owner_id: int) -> Any | None:
+        """
+        Retrieves the cached value of an owner.
+
+        :param owner_id: id of the owner
+        :return: the cached value, None if nothing is cached for the owner or the cached value expired
+        """
+        entry = self._entries.get(owner_id)
+        if entry is None:
+            return None
+        cached_at, value = entry
+        if self.ttl_seconds is not None and time.monotonic() - cached_at > self.ttl_seconds:
+            self._entries.pop(owner_id, None)
+            return None
+        return value
+
+    def set(self, owner_id: int, value: Any) -> None:
+        """
+        Stores a value for an owner.
+
+        :param owner_id: id of the owner
+        :param value: the value to cache
+        """
+        self._entries[owner_id] = (time.monotonic(), value)
+
+    def invalidate(self, owner_id: int) -> None:
+        """
+        Drops the cached value of an owner.
+
+        :param owner_id: id of the owner
+        """
+        self._entries.pop(owner_id, None)
+        if self.backend is not None:
+            self.backend.publish(f"{self.namespace}:{owner_id}")
+
+    def clear(self) -> None:
+        """
+        Drops all cached values.
+        """
+        self._entries.clear()
+        if self.backend is not None:
+            self.backend.publish(f"{self.namespace}:*")
+
+    def _handle_invalidation(self, message: str) -> None:
+        """
+        Drops the cached values invalidated by a message of any worker.
+
+        :param message: the invalidation message, formatted as '<namespace>:<owner id>' or '<namespace>:*'
+        """
+        namespace, _, owner_id = message.partition(":")
+        if namespace != self.namespace:
+            return
+        if owner_id == "*":
+            self._entries.clear()
+        elif owner_id.isdigit():
+            self._entries.pop(int(owner_id), None)
+
+
+def seconds_until_midnight() -> float:
+    """
+    Determines the time left until the end of the current day, such that values computed for today expire with it.
+
+    :return: the number of seconds until midnight, local time
+    """
+    now = datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return (midnight - now).total_seconds()
+
+
+class SharedCache:
+    """
+    Cache storing JSON serialisable values in a cache backend, such that all workers using the backend share the
+    values. Offers the same interface as `OwnerCache`.
+    """
+    def __init__(self, backend: CacheBackend, namespace: str, ttl_seconds: float | None = None):
+        """
+        Sets class attributes.
+
+        :param backend: the cache backend holding the values
+        :param namespace: prefix of the keys of this cache in the backend
+        :param ttl_seconds: Optional maximum age of an entry, entries never expire if omitted
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: int | str) -> Any | None:
+        """
+        Retrieves a cached value.
+
+        :param key: the key of the value, e.g. the id of an owner
+        :return: the cached value, None if nothing is cached for the key
+        """
+        value = self.backend.get(f"{self.namespace}:{key}")
+        return None if value is None else json.loads(value)
+
+    def set(self, key: int | str, value: Any, ttl_seconds: float | None = None) -> None:
+        """
+        Stores a value. Values that are not JSON types, e.g. dates, are stored as strings.
+
+        :param key: the key of the value
+        :param value: the value to cache
+        :param ttl_seconds: Optional maximum age of this value, e.g. for values that depend on the date, defaults to the
+            TTL of the cache
+        """
+        self.backend.set(f"{self.namespace}:{key}", json.dumps(value, default=str).encode(),
+                         ttl_seconds=self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+
+    def invalidate(self, key: int | str) -> None:
+        """
+        Drops a cached value for all workers.
+
+        :param key: the key of the value
+        """
+        self.backend.delete(f"{self.namespace}:{key}")
+        self.backend.publish(f"{self.namespace}:{key}")
+
+    def clear(self) -> None:
+        """
+        Drops all cached values for all workers.
+        """
+        self.backend.delete_prefix(f"{self.namespace}:")
+        self.backend.publish(f"{self.namespace}:*")
+
+
+class OwnerVersions:
+    """
+    Version of the cellar data of each owner, replaced with a new random version on every write of the owner. The
+    versions are kept in the cache backend, such that all workers hand out the same version. An owner without a stored
+    version, e.g. after a restart of an in-process backend, gets a new one, so a version is never reused for
+    different data. With an in-process backend every worker has its own versions and does not see the writes handled
+    by the other workers, so an optional TTL bounds how long a worker hands out a version that may be outdated.
+    """
+    def __init__(self, backend: CacheBackend, ttl_seconds: float | None = None):
+        """
+        Sets class attributes.
+
+        :param backend: the cache backend holding the versions
+        :param ttl_seconds: Optional maximum age of a version, versions never expire if omitted
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, owner_id: int) -> str:
+        """
+        Retrieves the current version of an owner's data.
+
+        :param owner_id: id of the owner
+        :return: the version
+        """
+        version = self.backend.get(f"versions:{owner_id}")
+        if version is None:
+            return self.bump(owner_id)
+        return version.decode()
+
+    def bump(self, owner_id: int) -> str:
+        """
+        Replaces the version of an owner's data after a write.
+
+        :param owner_id: id of the owner
+        :return: the new version
+        """
+        version = uuid.uuid4().hex
+        self.backend.set(f"versions:{owner_id}", version.encode(), ttl_seconds=self.ttl_seconds)
+        return version
+
+    def clear(self) -> None:
+        """
+        Drops the versions of all owners, such that every owner gets a new version, e.g. after a restore of the DB.
+        """
+        self.backend.delete_prefix("versions:")
+
+
+class WineCatalogueCache:
+    """
+    Process-local LRU cache of the wines catalogue, mapping (name, vintage) to the id of a wine and holding the ids
+    known to exist. Wines are never removed from the catalogue, so entries do not have to be invalidated; the least
+    recently used entries are dropped once the cache is full. When a cache backend is provided, clearing the cache,
+    e.g. after a restore of the DB, clears the caches of all workers.
+    """
+    def __init__(self, max_entries: int = 10_000, backend: CacheBackend | None = None, namespace: str | None = None):
+        """
+        Sets class attributes.
+
+        :param max_entries: maximum number of wines held in the cache
+        :param backend: Optional cache backend carrying the clears between workers
+        :param namespace: Name of the cache in the invalidation messages, required when a backend is provided
+        """
+        self.max_entries = max_entries
+        self.backend = backend
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._ids: OrderedDict[tuple[str, int], int] = OrderedDict()
+        self._known_ids: OrderedDict[int, None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if backend is not None:
+            backend.subscribe(self._handle_invalidation)
+
+    def get_id(self, name: str, vintage: int) -> int | None:
+        """
+        Retrieves the id of a wine.
+
+        :param name: name of the wine
+        :param vintage: vintage of the wine
+        :return: the id of the wine, None if the wine is not cached
+        """
+        with self._lock:
+            wine_id = self._ids.get((name, vintage))
+            if wine_id is None:
+                self.misses += 1
+                return None
+            self._ids.move_to_end((name, vintage))
+            self.hits += 1
+            return wine_id
+
+    def contains_id(self, wine_id: int) -> bool:
+        """
+        Verifies whether a wine id is known to exist.
+
+        :param wine_id: id of the wine
+        :return: True if the id is cached, False if it is not cached (which does not mean it does not exist)
+        """
+        with self._lock:
+            if wine_id not in self._known_ids:
+                self.misses += 1
+                return False
+            self._known_ids.move_to_end(wine_id)
+            self.hits += 1
+            return True
+
+    def add(self, wine_id: int, name: str | None = None, vintage: int | None = None) -> None:
+        """
+        Stores a wine that exists in the catalogue.
+
+        :param wine_id: id of the wine
+        :param name: name of the wine, only the id is stored if omitted
+        :param vintage: vintage of the wine
+        """
+        with self._lock:
+            self._known_ids[wine_id] = None
+            self._known_ids.move_to_end(wine_id)
+            if name is not None and vintage is not None:
+                self._ids[(name, vintage)] = wine_id
+                self._ids.move_to_end((name, vintage))
+            for entries in (self._known_ids, self._ids):
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+
+    def warm(self, db_conn: JdbcDbConn) -> None:
+        """
+        Fills the cache with the most recently added wines of the catalogue.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        wines = db_conn.execute_query_select(query="SELECT id, name, vintage FROM cellar.wines "
+                                                   "ORDER BY id DESC LIMIT %(max_entries)s",
+                                             params={"max_entries": self.max_entries})
+        for wine_id, name, vintage in reversed(wines):
+            self.add(wine_id=wine_id, name=name, vintage=vintage)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Retrieves the usage statistics of the cache.
+
+        :return: the hits, misses, hit ratio and number of cached wines
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.,
+                    "cached_names": len(self._ids), "cached_ids": len(self._known_ids)}
+
+    def clear(self) -> None:
+        """
+        Drops all cached wines and resets the statistics.
+        """
+        self._clear()
+        if self.backend is not None:
+            self.backend.publish(f"{self.namespace}:*")
+
+    def _clear(self) -> None:
+        """
+        Drops all cached wines and resets the statistics of this process only.
+        """
+        with self._lock:
+            self._ids.clear()
+            self._known_ids.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _handle_invalidation(self, message: str) -> None:
+        """
+        Clears the cache when any worker cleared its cache.
+
+        :param message: the invalidation message, formatted as '<namespace>:*'
+        """
+        namespace, _, key = message.partition(":")
+        if namespace == self.namespace and key == "*":
+            self._clear()
@@ -0,0 +1,288 @@
+import time
+import fnmatch
+import threading
+
+from typing import Any, Callable
+from abc import ABCMeta, abstractmethod
+
+
+INVALIDATION_CHANNEL = "cellar:invalidate"
+
+
+class CacheBackend(metaclass=ABCMeta):
+    """
+    Interface for the storage behind the shared caches. Besides storing values, a backend carries invalidation
+    messages to all processes using it, such that process-local caches can drop entries written elsewhere.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """
+        Retrieves a value.
+
+        :param key: the key of the value
+        :return: the value, None if the key is not set or expired
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        """
+        Stores a value.
+
+        :param key: the key of the value
+        :param value: the value
+        :param ttl_seconds: Optional time after which the value expires
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        """
+        Removes values.
+
+        :param keys: the keys of the values
+        """
+        pass
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        """
+        Removes all values of which the key starts with a prefix.
+
+        :param prefix: the prefix of the keys
+        """
+        pass
+
+    @abstractmethod
+    def publish(self, message: str) -> None:
+        """
+        Sends an invalidation message to all subscribers, including the subscribers of the publishing process.
+
+        :param message: the message
+        """
+        pass
+
+    @abstractmethod
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        """
+        Registers a callback that is called with each invalidation message.
+
+        :param callback: the callback
+        """
+        pass
+
+
+class InProcessCacheBackend(CacheBackend):
+    """
+    Cache backend keeping the values in the memory of the process. Invalidation messages only reach the subscribers
+    within the process, so this backend suits single worker deployments.
+    """
+    def __init__(self):
+        """
+        Sets class attributes.
+        """
+        self._lock = threading.Lock()
+        self._values: dict[str, tuple[float | None, bytes]] = {}
+        self._subscribers: list[Callable[[str], None]] = []
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() > expires_at:
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        with self._lock:
+            expires_at = None if ttl_seconds is None else time.monotonic() + ttl_seconds
+            self._values[key] = (expires_at, value)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._values if key.startswith(prefix)]:
+                del self._values[key]
+
+    def publish(self, message: str) -> None:
+        for callback in list(self._subscribers):
+            callback(message)
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        self._subscribers.append(callback)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache backend storing the values in a service speaking the Redis protocol, shared by all workers. Invalidation
+    messages are carried over Redis pub/sub and handled in a background thread.
+    """
+    def __init__(self, client: Any, key_prefix: str = "cellar:"):
+        """
+        Sets class attributes.
+
+        :param client: Redis client, e.g. `redis.Redis` or the `InMemoryRedis` stand-in
+        :param key_prefix: prefix of all keys written by the backend
+        """
+        self.client = client
+        self.key_prefix = key_prefix
+        self._subscribers: list[Callable[[str], None]] = []
+        self._listener = None
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(f"{self.key_prefix}{key}")
+
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        px = None if ttl_seconds is None else int(ttl_seconds * 1000)
+        self.client.set(f"{self.key_prefix}{key}", value, px=px)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*(f"{self.key_prefix}{key}" for key in keys))
+
+    def delete_prefix(self, prefix: str) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.key_prefix}{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def publish(self, message: str) -> None:
+        self.client.publish(INVALIDATION_CHANNEL, message)
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        self._subscribers.append(callback)
+        if self._listener is None:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._handle_message})
+            self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _handle_message(self, message: dict[str, Any]) -> None:
+        """
+        Passes a pub/sub message on to the subscribers.
+
+        :param message: the pub/sub message
+        """
+        data = message["data"]
+        data = data.decode() if isinstance(data, bytes) else data
+        for callback in list(self._subscribers):
+            callback(data)
+
+
+class InMemoryRedis:
+    """
+    In-memory stand-in for the subset of the `redis.Redis` client used by `RedisCacheBackend`, to run the Redis code
+    path without a Redis service, e.g. locally or in tests. Values and messages are not shared between processes.
+    Lua scripts cannot run on the stand-in: modules using a script register a Python equivalent in `scripts`.
+    """
+    scripts: dict[str, Callable[["InMemoryRedis", list[str], list[Any]], Any]] = {}
+
+    def __init__(self):
+        """
+        Sets class attributes.
+        """
+        self._lock = threading.Lock()
+        self._values: dict[str, tuple[float | None, bytes]] = {}
+        self._channels: dict[str, list[Callable[[dict[str, Any]], None]]] = {}
+
+    def get(self, name: str) -> bytes | None:
+        with self._lock:
+            entry = self._values.get(name)
+            if entry is None or (entry[0] is not None and time.monotonic() > entry[0]):
+                self._values.pop(name, None)
+                return None
+            return entry[1]
+
+    def set(self, name: str, value: bytes | str, px: int | None = None) -> bool:
+        with self._lock:
+            expires_at = None if px is None else time.monotonic() + px / 1000
+            self._values[name] = (expires_at, value.encode() if isinstance(value, str) else value)
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(self._values.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match: str = "*"):
+        with self._lock:
+            keys = [key for key in self._values if fnmatch.fnmatchcase(key, match)]
+        yield from keys
+
+    def publish(self, channel: str, message: str) -> int:
+        handlers = list(self._channels.get(channel, []))
+        for handler in handlers:
+            handler({"type": "message", "channel": channel.encode(), "data": message.encode()})
+        return len(handlers)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "InMemoryPubSub":
+        return InMemoryPubSub(client=self)
+
+    def register_script(self, script: str) -> Callable[..., Any]:
+        implementation = self.scripts[script]
+
+        def run(keys: list[str], args: list[Any]) -> Any:
+            return implementation(self, keys, args)
+        return run
+
+
+class InMemoryPubSub:
+    """
+    Stand-in for `redis.client.PubSub`, handlers are called synchronously on publish.
+    """
+    def __init__(self, client: InMemoryRedis):
+        self.client = client
+
+    def subscribe(self, **handlers: Callable[[dict[str, Any]], None]) -> None:
+        for channel, handler in handlers.items():
+            self.client._channels.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time: float = 0, daemon: bool = False) -> "InMemoryPubSub":
+        return self
+
+
+_REDIS_CLIENTS: dict[str, Any] = {}
+_REDIS_CLIENTS_LOCK = threading.Lock()
+
+
+def redis_client_from_url(url: str) -> Any:
+    """
+    Retrieves the Redis client of a URL: 'memory://' for the in-memory stand-in and 'redis://...' for a Redis service,
+    which requires the redis package. The clients are shared per URL, such that the cache and rate limit backends on
+    the same Redis service use a single client and connection pool.
+
+    :param url: URL of the Redis service
+    :return: the Redis client
+    :raises ValueError: if the URL is not a Redis URL
+    """
+    if not url.startswith(("memory://", "redis://", "rediss://", "unix://")):
+        raise ValueError(f"Unsupported Redis URL: {url}")
+    with _REDIS_CLIENTS_LOCK:
+        if url not in _REDIS_CLIENTS:
+            if url.startswith("memory://"):
+                _REDIS_CLIENTS[url] = InMemoryRedis()
+            else:
+                try:
+                    import redis
+                except ImportError as e:
+                    raise ImportError("The redis package is required for a Redis backend: pip install redis") from e
+                _REDIS_CLIENTS[url] = redis.Redis.from_url(url)
+        return _REDIS_CLIENTS[url]
+
+
+def cache_backend_from_url(url: str | None) -> CacheBackend:
+    """
+    Constructs the cache backend configured by a URL: no URL for the in-process backend, 'memory://' for the Redis
+    backend on the in-memory stand-in and 'redis://...' for a Redis service, which requires the redis package.
+
+    :param url: Optional URL of the cache backend
+    :return: the cache backend
+    """
+    if not url:
+        return InProcessCacheBackend()
+    return RedisCacheBackend(client=redis_client_from_url(url))
@@ -1,7 +1,17 @@
 import yaml
 
+from db.query_cache import QueryCache
+
+from .cache import OwnerCache, SharedCache, OwnerVersions, WineCatalogueCache
+from .cache_backends import cache_backend_from_url
+from .events import EventBroadcaster
+from .jobs import ImportJobs
+from .search_index import SearchIndex
+from .autocomplete import WineNameIndex
 from .models import DbConnModel
+from .admission import DbAdmission
 from .dependencies import DBConnDep
+from .rate_limit import rate_limit_backend_from_url
 
 
 OPENAPI_URL = f"/drink_your_wine"
@@ -12,9 +22,80 @@ SQL = f'{SRC}sql/'
 with open(f'{SRC}env.yml', 'r') as file:
     env = yaml.safe_load(file)
 DB_CREDS = DbConnModel(user=env['DB_USER'], password=env['DB_PW'])
-DB_CONN = DBConnDep(db_creds=DB_CREDS)
+# Opt-in cache of select query results, only safe when a single process writes to the DB
+QUERY_CACHE_ENABLED = False
+QUERY_CACHE = QueryCache(max_entries=4096)
+# Connection pool per worker, and the admission of requests to it: requests over the concurrency limit wait in a
+# queue, writes before reads, and get a 503 when they are not admitted within the timeout
+DB_POOL_SIZE = 10
+DB_POOL_MAX_OVERFLOW = 10
+DB_ADMISSION = DbAdmission(max_concurrency=DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW, max_queue=200, timeout_seconds=5.,
+                           retry_after_seconds=1, priorities={"write": 0, "read": 1})
+DB_CONN = DBConnDep(db_creds=DB_CREDS, query_cache=QUERY_CACHE if QUERY_CACHE_ENABLED else None,
+                    pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW, admission=DB_ADMISSION)
 SETUP_DB = False
 
+# Caches, shared between workers through a Redis backend when CACHE_BACKEND_URL is set in the env file
+CACHE_BACKEND = cache_backend_from_url(env.get('CACHE_BACKEND_URL'))
+STATS_CACHE = SharedCache(backend=CACHE_BACKEND, namespace="stats")
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE = SharedCache(backend=CACHE_BACKEND, namespace="users", ttl_seconds=USER_CACHE_TTL_SECONDS)
+STORAGE_CACHE_TTL_SECONDS = 300
+STORAGE_CACHE = OwnerCache(ttl_seconds=STORAGE_CACHE_TTL_SECONDS, backend=CACHE_BACKEND, namespace="storages")
+# Versions expire such that workers of an in-process backend stop answering 304 for data changed by other workers
+OWNER_VERSIONS_TTL_SECONDS = 300
+OWNER_VERSIONS = OwnerVersions(backend=CACHE_BACKEND, ttl_seconds=OWNER_VERSIONS_TTL_SECONDS)
+WINE_CATALOGUE_CACHE = WineCatalogueCache(max_entries=10_000, backend=CACHE_BACKEND, namespace="wines")
+WARM_WINE_CATALOGUE_CACHE = False
+
+# Search
+# The indexes are reloaded periodically, as an in-process backend does not carry the writes of the other workers
+SEARCH_INDEX_TTL_SECONDS = 600
+SEARCH_INDEX = SearchIndex(backend=CACHE_BACKEND, namespace="search", ttl_seconds=SEARCH_INDEX_TTL_SECONDS)
+WINE_NAME_INDEX_MAX_ENTRIES = 100_000
+WINE_NAME_INDEX = WineNameIndex(max_entries=WINE_NAME_INDEX_MAX_ENTRIES, backend=CACHE_BACKEND,
+                                namespace="wine_names", ttl_seconds=SEARCH_INDEX_TTL_SECONDS)
+
+# Change log, the table and owner column of each entity of which the changes are logged
+CHANGE_LOG_ENTITIES = {"storage": ("storages", "owner_id"),
+                       "cellar": ("cellar", "owner_id"),
+                       "rating": ("ratings", "rater_id"),
+                       "owner": ("owners", "id")}
+CHANGE_LOG_MAX_PAGE_SIZE = 1000
+CHANGE_LOG_RETENTION_DAYS = 30
+# Age after which a change is handed out, the ids are assigned before the transaction commits. Should exceed the
+# duration of the longest write transaction.
+CHANGE_LOG_SAFETY_LAG_SECONDS = 5
+
+# Push of change events to connected clients, shared between workers through the cache backend
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_MAX_QUEUED = 100
+EVENT_BROADCASTER = EventBroadcaster(backend=CACHE_BACKEND, max_queued=EVENTS_MAX_QUEUED)
+
+# Cellar views
+DRINK_WINDOW_FORECAST_YEARS = 20
+DRINK_WINDOW_FORECAST_MAX_YEARS = 200
+# Years after the current year up to which the drinkable years of a bottle are stored in the drink window table
+DRINK_WINDOW_MAX_YEARS = DRINK_WINDOW_FORECAST_MAX_YEARS
+EXPORT_BATCH_SIZE = 1000
+RATINGS_MAX_WINE_IDS = 500
+DASHBOARD_RECENT_RATINGS = 10
+
+# Bulk imports, run as background jobs of the worker that accepted the upload
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_JOBS = ImportJobs(max_jobs=100, max_reported_errors=1000)
+
+# Parquet snapshots of the whole cellar schema, written to a directory on the API server
+SNAPSHOT_DIR = env.get('SNAPSHOT_DIR', 'snapshots/')
+SNAPSHOT_BATCH_SIZE = 10_000
+
+# Rate limits per client, a token bucket per router: requests take a token, buckets refill at a steady rate up to
+# their capacity. Shared between workers through a Redis backend when RATE_LIMIT_BACKEND_URL is set in the env file.
+RATE_LIMITS = env.get('RATE_LIMITS', {"users": {"capacity": 30, "refill_per_second": 1.},
+                                      "cellar": {"capacity": 60, "refill_per_second": 5.},
+                                      "cellar_views": {"capacity": 120, "refill_per_second": 10.}})
+RATE_LIMIT_BACKEND = rate_limit_backend_from_url(env.get('RATE_LIMIT_BACKEND_URL'))
+
 JWT_KEY = env['JWT_KEY']
 ALGORITHM = env['JWT_ALGORITHM']
 ACCESS_TOKEN_EXPIRATION_MIN = env['ACCESS_TOKEN_EXPIRATION_MIN']
@@ -1,12 +1,14 @@
 import os
 import time
 import yaml
+import datetime
 
 from db.mariadb_jdbc import JdbcMariaDB
 from db.jdbc_interface import JdbcDbConn
-from .constants import SRC, SQL
+from .constants import SRC, SQL, CHANGE_LOG_RETENTION_DAYS
 from .models import DbConnModel
 from .authentication import get_password_hash
+from .wine_info import drink_window_years, parse_geo_info, parse_grapes
 
 
 def database_service(restarted: bool = True) -> bool:
@@ -33,6 +35,7 @@ def setup_new_database(db_conn: JdbcDbConn) -> None:
     db_conn.execute_query("drop database if exists cellar;")
     db_conn.execute_sql_file(file_path=f'{SQL}create_databases.sql')
     db_conn.execute_sql_file(file_path=f'{SQL}create_tables.sql')
+    db_conn.execute_sql_file(file_path=f'{SQL}create_indexes.sql')
 
 
 def make_db_admin_user(db_conn: JdbcDbConn) -> None:
@@ -93,7 +96,176 @@ def db_setup(db_creds: DbConnModel, restarted: bool = True) -> None:
     """
     database_service(restarted=restarted)
     with JdbcMariaDB(**db_creds.dict()) as db:
-        if not check_for_cellar_db(db_conn=db):
+        if check_for_cellar_db(db_conn=db):
+            upgrade_database(db_conn=db)
+        else:
             setup_new_database(db_conn=db)
         if not check_for_admin_user(db_conn=db):
             make_db_admin_user(db_conn=db)
+
+
+def upgrade_database(db_conn: JdbcDbConn) -> list[str]:
+    """
+    Brings a DB that was set up with an older version of the tables up to date, i.e. creates the missing tables,
+    adds the missing columns and creates the missing indexes. Tables derived from the cellar and wines tables are
+    filled once, when the upgrade creates them, such that the bottles stored before are summarised, drinkable and
+    filterable right away.
+
+    :param db_conn: The MariaDB JDBC connection
+    :return: names of the tables that were created and filled
+    """
+    db_conn.execute_query("use cellar")
+    existing_tables = {table for table, in db_conn.execute_query_select(query="show tables")}
+    db_conn.execute_sql_file(file_path=f'{SQL}create_tables.sql')
+    db_conn.execute_sql_file(file_path=f'{SQL}migrate_structured_wine_info.sql')
+    db_conn.execute_sql_file(file_path=f'{SQL}create_indexes.sql')
+
+    backfills = {("owner_summary", "owner_type_vintage_summary"): rebuild_owner_summary,
+                 ("drink_window", ): rebuild_drink_window,
+                 ("wine_grapes", ): backfill_structured_wine_info}
+    backfilled = []
+    for tables, backfill in backfills.items():
+        if new_tables := [table for table in tables if table not in existing_tables]:
+            print(f"Filling the new table(s) {', '.join(new_tables)}")
+            backfill(db_conn=db_conn)
+            backfilled += new_tables
+    return backfilled
+
+
+def backfill_structured_wine_info(db_conn: JdbcDbConn, batch_size: int = 1000) -> None:
+    """
+    Fills the country, region and producer columns and the wine_grapes table by parsing the geographic info and
+    grapes texts of all wines in the wines table.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param batch_size: Number of grape rows inserted per query
+    """
+    wines = db_conn.execute_query_select(query="SELECT id, geographic_info, grapes FROM cellar.wines")
+    queries = ["DELETE FROM cellar.wine_grapes"]
+    params = [{}]
+    for wine_id, geographic_info, _ in wines:
+        queries.append("UPDATE cellar.wines "
+                       "SET country = %(country)s, region = %(region)s, producer = %(producer)s "
+                       "WHERE id = %(wine_id)s")
+        params.append({"wine_id": wine_id, **parse_geo_info(geographic_info)})
+
+    rows = [(wine_id, grape) for wine_id, _, grapes in wines for grape in parse_grapes(grapes)]
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        queries.append("INSERT INTO cellar.wine_grapes (wine_id, grape) VALUES " +
+                       ", ".join(f"(%(wine_id_{i})s, %(grape_{i})s)" for i in range(len(batch))))
+        params.append({f"{field}_{i}": value
+                       for i, row in enumerate(batch)
+                       for field, value in zip(("wine_id", "grape"), row)})
+    db_conn.execute_query(queries, params=params)
+
+
+def rebuild_owner_summary(db_conn: JdbcDbConn, owner_id: int | None = None) -> None:
+    """
+    Recomputes the owner summary tables from scratch based on the cellar table. All owners are rebuilt unless a
+    specific owner is provided.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param owner_id: Optional id of the only owner to rebuild the summary for
+    """
+    delete_cond = "" if owner_id is None else "WHERE owner_id = %(owner_id)s"
+    cellar_cond = "" if owner_id is None else "WHERE c.owner_id = %(owner_id)s"
+    queries = [f"DELETE FROM cellar.owner_summary {delete_cond}",
+               f"DELETE FROM cellar.owner_type_vintage_summary {delete_cond}",
+               "INSERT INTO cellar.owner_summary (owner_id, bottles, volume_cl) "
+               "SELECT c.owner_id, SUM(c.quantity), SUM(c.quantity * c.bottle_size_cl) "
+               "FROM cellar.cellar AS c "
+               f"{cellar_cond} "
+               "GROUP BY c.owner_id",
+               "INSERT INTO cellar.owner_type_vintage_summary (owner_id, type, vintage, bottles, volume_cl) "
+               "SELECT c.owner_id, w.type, w.vintage, SUM(c.quantity), SUM(c.quantity * c.bottle_size_cl) "
+               "FROM cellar.cellar AS c "
+               "JOIN cellar.wines AS w ON w.id = c.wine_id "
+               f"{cellar_cond} "
+               "GROUP BY c.owner_id, w.type, w.vintage"]
+    db_conn.execute_query(queries, params=len(queries) * [{"owner_id": owner_id}])
+
+
+def verify_owner_summary(db_conn: JdbcDbConn) -> list[int]:
+    """
+    Verifies whether the owner summary tables are consistent with the cellar table.
+
+    :param db_conn: The MariaDB JDBC connection
+    :return: ids of the owners with an inconsistent summary
+    """
+    expected = db_conn.execute_query_select(query="SELECT c.owner_id, w.type, w.vintage, SUM(c.quantity), "
+                                                  "       SUM(c.quantity * c.bottle_size_cl) "
+                                                  "FROM cellar.cellar AS c "
+                                                  "JOIN cellar.wines AS w ON w.id = c.wine_id "
+                                                  "GROUP BY c.owner_id, w.type, w.vintage")
+    actual = db_conn.execute_query_select(query="SELECT owner_id, type, vintage, bottles, volume_cl "
+                                                "FROM cellar.owner_type_vintage_summary "
+                                                "WHERE bottles <> 0 OR volume_cl <> 0")
+    expected_totals = db_conn.execute_query_select(query="SELECT owner_id, SUM(quantity), "
+                                                         "       SUM(quantity * bottle_size_cl) "
+                                                         "FROM cellar.cellar GROUP BY owner_id")
+    actual_totals = db_conn.execute_query_select(query="SELECT owner_id, bottles, volume_cl FROM cellar.owner_summary "
+                                                       "WHERE bottles <> 0 OR volume_cl <> 0")
+
+    inconsistent = set()
+    for expected_rows, actual_rows in ((expected, actual), (expected_totals, actual_totals)):
+        expected_rows = {tuple(row[:-2]): tuple(row[-2:]) for row in expected_rows}
+        actual_rows = {tuple(row[:-2]): tuple(row[-2:]) for row in actual_rows}
+        for key in expected_rows.keys() | actual_rows.keys():
+            if expected_rows.get(key) != actual_rows.get(key):
+                inconsistent.add(key[0])
+    return sorted(inconsistent)
+
+
+def rebuild_drink_window(db_conn: JdbcDbConn, owner_id: int | None = None, batch_size: int = 1000) -> None:
+    """
+    Recomputes the drink window table from scratch based on the cellar table, e.g. to backfill bottles that were added
+    before the table existed. All owners are rebuilt unless a specific owner is provided.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param owner_id: Optional id of the only owner to rebuild the drink window for
+    :param batch_size: Number of rows inserted per query
+    """
+    delete_cond = "" if owner_id is None else "WHERE owner_id = %(owner_id)s"
+    entries = db_conn.execute_query_select(query=f"SELECT id, owner_id, drink_from, drink_before "
+                                                 f"FROM cellar.cellar {delete_cond}",
+                                           params={"owner_id": owner_id})
+    rows = [(entry_owner_id, year, cellar_id)
+            for cellar_id, entry_owner_id, drink_from, drink_before in entries
+            if drink_from is not None and drink_before is not None
+            for year in drink_window_years(drink_from, drink_before)]
+
+    queries = [f"DELETE FROM cellar.drink_window {delete_cond}"]
+    params = [{"owner_id": owner_id}]
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        queries.append("INSERT INTO cellar.drink_window (owner_id, drink_year, cellar_id) VALUES " +
+                       ", ".join(f"(%(owner_id_{i})s, %(drink_year_{i})s, %(cellar_id_{i})s)"
+                                 for i in range(len(batch))))
+        params.append({f"{field}_{i}": value
+                       for i, row in enumerate(batch)
+                       for field, value in zip(("owner_id", "drink_year", "cellar_id"), row)})
+    db_conn.execute_query(queries, params=params)
+
+
+def compact_changes(db_conn: JdbcDbConn, retention_days: int = CHANGE_LOG_RETENTION_DAYS) -> None:
+    """
+    Shrinks the change log: changes superseded by a later change of the same entity are removed, and deletes older
+    than the retention period are removed altogether. Clients that synced before the removed deletes are asked for a
+    full resync, as they can no longer learn about these deletes.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param retention_days: Number of days deletes are kept in the change log
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    pruned_through = db_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes "
+                                                        "WHERE operation = 'delete' AND changed_at < %(cutoff)s",
+                                                  params={"cutoff": cutoff})[0][0]
+    queries = ["DELETE FROM cellar.changes "
+               "WHERE id NOT IN (SELECT id FROM (SELECT MAX(id) AS id FROM cellar.changes "
+               "                                 GROUP BY owner_id, entity, entity_id) AS latest)"]
+    if pruned_through is not None:
+        queries += ["INSERT INTO cellar.changes_compaction (id, pruned_through) VALUES (1, %(pruned_through)s) "
+                    "ON DUPLICATE KEY UPDATE pruned_through = VALUES(pruned_through)",
+                    "DELETE FROM cellar.changes WHERE operation = 'delete' AND id <= %(pruned_through)s"]
+    db_conn.execute_query(queries, params=len(queries) * [{"pruned_through": pruned_through}])
@@ -1,7 +1,22 @@
-from db.mariadb_jdbc import JdbcMariaDB
+import asyncio
+import functools
+import threading
+
+from typing import Any, Callable, Type
+
+from fastapi import HTTPException, status
+from fastapi.routing import APIRoute
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from db.mariadb_jdbc import JdbcMariaDB, mariadb_connection_string
 from db.jdbc_interface import JdbcDbConn
+from db.query_cache import QueryCache
 from .models import DbConnModel
-from typing import Type
+from .admission import DbAdmission
 
 
 # class DBConnDep:
@@ -32,28 +47,225 @@ from typing import Type
 #             print('DB conn has been terminated')
 
 
+class LazyDbConn:
+    """
+    Handle of a DB connection that is only opened on the first query and can be released before the request ends.
+    Attribute access is forwarded to the connection, so endpoints use the handle like any JdbcDbConn. After a release,
+    the next query opens a new connection.
+    """
+    def __init__(self, connect: Callable[[], JdbcDbConn], admission: DbAdmission | None = None):
+        """
+        Sets class attributes.
+
+        :param connect: factory of a DB connection instance, the connection is initiated by the handle
+        :param admission: Optional admission controller the endpoints using the handle have to pass
+        """
+        self._connect = connect
+        self.admission = admission
+        self._db: JdbcDbConn | None = None
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the handle currently holds a connection.
+        """
+        return self._db is not None
+
+    def acquire(self) -> JdbcDbConn:
+        """
+        Opens the connection if the handle does not hold one yet.
+
+        :return: the live connection
+        """
+        if self._db is None:
+            db = self._connect()
+            db._initiate_connection()
+            self._db = db
+        return self._db
+
+    def release(self) -> None:
+        """
+        Closes the connection, which returns it to the pool of the engine it was checked out of.
+        """
+        if self._db is not None:
+            db, self._db = self._db, None
+            db._close_connection()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.acquire(), name)
+
+
 class DBConnDep:
     """
-    Dependency which yields a DB connection to use in endpoints.
+    Dependency which yields a lazy DB connection handle to use in endpoints. All connections are checked out of the
+    pool of a single engine, which is created on the first connection.
     """
-    def __init__(self, db_creds: DbConnModel):
+    def __init__(self, db_creds: DbConnModel, query_cache: QueryCache | None = None, pool_size: int = 10,
+                 max_overflow: int = 10, admission: DbAdmission | None = None):
         """
         Sets class attributes.
 
         :param db_creds: Credentials for the DB connection
+        :param query_cache: Optional cache for select query results, shared by all yielded connections
+        :param pool_size: Number of connections kept open in the pool
+        :param max_overflow: Number of connections opened on top of the pool when all pooled connections are in use
+        :param admission: Optional admission controller capping the number of endpoints using the DB concurrently
         """
         self.db_creds = db_creds.dict()
+        self.query_cache = query_cache
+        self.admission = admission
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self._engine: Engine | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        """
+        The engine shared by all connections, created on first use.
+        """
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(mariadb_connection_string(**self.db_creds), pool_pre_ping=True,
+                                             pool_size=self.pool_size, max_overflow=self.max_overflow)
+            return self._engine
+
+    def connect(self) -> JdbcDbConn:
+        """
+        Instantiates the MariaDB class on the shared engine, without initiating the connection.
+        """
+        return JdbcMariaDB(**self.db_creds, query_cache=self.query_cache, engine=self.engine)
 
     def __call__(self):
         """
-        Instantiates the MariaDB class and yield a live connection which is always closed in the 'finally' block.
+        Yields a lazy connection handle, its connection is opened on the first query and always released in the
+        'finally' block. Routes of the DbConnRoute class release it as soon as the endpoint returns.
         """
-        db = JdbcMariaDB(**self.db_creds)
+        db = LazyDbConn(connect=self.connect, admission=self.admission)
         try:
-            db._initiate_connection()
-            print('DB conn has been established')
             yield db
         finally:
-            db._close_connection()
-            print('DB conn has been terminated')
+            db.release()
+
+
+async def admit(admission: DbAdmission, kind: str) -> None:
+    """
+    Waits for the admission of a request to the DB. The caller releases the admission once it no longer uses the DB.
+
+    :param admission: the admission controller
+    :param kind: kind of the request for its admission priority, "read" or "write"
+    :raises HTTPException: 503 with a Retry-After header if the request is shed
+    """
+    if not await admission.acquire(kind):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many requests are using the database, retry later",
+                            headers={"Retry-After": str(admission.retry_after_seconds)})
+
+
+async def run_admitted(admission: DbAdmission | None, kind: str, func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a sync function using the DB on a worker thread once admitted, for DB work outside of an endpoint such as a
+    background job. Unlike requests, the work is never shed but keeps waiting until it is admitted.
+
+    :param admission: Optional admission controller, the function runs immediately if omitted
+    :param kind: kind of the work for its admission priority, "read" or "write"
+    :param func: the function to run
+    :return: the result of the function
+    """
+    if admission is not None:
+        while not await admission.acquire(kind):
+            await asyncio.sleep(admission.retry_after_seconds)
+    try:
+        return await run_in_threadpool(func, *args, **kwargs)
+    finally:
+        if admission is not None:
+            admission.release()
+
+
+def release_after_stream(response: StreamingResponse, release: Callable[[], None]) -> None:
+    """
+    Defers a release until a streaming response has been sent, as the stream may still query the DB. The release runs
+    once, when the stream ends or fails, or at the latest after the response when the client disconnected.
+
+    :param response: the streaming response
+    :param release: the function releasing the connections and admissions of the response
+    """
+    released = False
+
+    def release_once():
+        nonlocal released
+        if not released:
+            released = True
+            release()
+
+    body_iterator, background = response.body_iterator, response.background
+
+    async def stream():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            release_once()
+
+    async def after_response():
+        try:
+            if background is not None:
+                await background()
+        finally:
+            release_once()
+
+    response.body_iterator = stream()
+    response.background = BackgroundTask(after_response)
 
+
+def release_db_connections(endpoint: Callable, kind: str = "write") -> Callable:
+    """
+    Wraps an endpoint such that the DB connections it received are released as soon as it returns, instead of being
+    held while the response is serialised and sent. Connections and admissions of streaming responses are released
+    once the stream ends, as the stream may still query the DB. When the connections have an admission controller, the
+    endpoint only runs once admitted and a 503 with a Retry-After header is returned if the request is shed.
+
+    :param endpoint: the endpoint function
+    :param kind: kind of the endpoint for its admission priority, "read" or "write"
+    :return: the wrapped endpoint, a coroutine with the signature of the endpoint
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        handles = [value for value in kwargs.values() if isinstance(value, LazyDbConn)]
+        admissions = list({id(handle.admission): handle.admission for handle in handles
+                           if handle.admission is not None}.values())
+        admitted = []
+
+        def release():
+            for handle in handles:
+                handle.release()
+            for admission in admitted:
+                admission.release()
+
+        result = None
+        try:
+            for admission in admissions:
+                await admit(admission, kind)
+                admitted.append(admission)
+            if asyncio.iscoroutinefunction(endpoint):
+                result = await endpoint(*args, **kwargs)
+            else:
+                # Sync endpoints run on a worker thread, like FastAPI runs them
+                result = await run_in_threadpool(endpoint, *args, **kwargs)
+            return result
+        finally:
+            if isinstance(result, StreamingResponse):
+                release_after_stream(result, release)
+            else:
+                release()
+    return wrapper
+
+
+class DbConnRoute(APIRoute):
+    """
+    Route class releasing the DB connections of an endpoint as soon as the endpoint returns and passing the endpoint
+    through the admission controller of its DB connections. GET endpoints are admitted as reads, others as writes.
+    """
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        kind = "read" if set(kwargs.get("methods") or ["GET"]) <= {"GET", "HEAD"} else "write"
+        super().__init__(path, release_db_connections(endpoint, kind=kind), **kwargs)
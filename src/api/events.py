@@ -0,0 +1,181 @@
+import json
+import asyncio
+import threading
+
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from .cache_backends import CacheBackend
+
+
+EVENTS_NAMESPACE = "events"
+
+
+class Subscription:
+    """
+    Bounded queue of the events of one connected client. When a slow client lets the queue fill up, the oldest events
+    are dropped and the client is told to resync once it catches up, such that a single client never holds up the
+    delivery to the others or grows the memory of the process.
+    """
+    def __init__(self, owner_id: int, loop: asyncio.AbstractEventLoop, max_queued: int):
+        """
+        Sets class attributes.
+
+        :param owner_id: id of the owner whose events are delivered
+        :param loop: event loop of the client's connection, events are handed over to this loop
+        :param max_queued: maximum number of queued events
+        """
+        self.owner_id = owner_id
+        self.loop = loop
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max_queued)
+        self.dropped = 0
+
+    def put(self, event: dict[str, Any]) -> None:
+        """
+        Queues an event, dropping the oldest event if the queue is full. Must be called from the subscription's loop.
+
+        :param event: the event
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> dict[str, Any] | None:
+        """
+        Waits for the next event. After events have been dropped, a resync event is returned first.
+
+        :param timeout: maximum number of seconds to wait
+        :return: the event, None if no event arrived in time
+        """
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"event": "resync", "dropped": dropped}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroadcaster:
+    """
+    Delivers change events to the connected clients of an owner. Events are published on the pub/sub channel of the
+    cache backend, such that clients connected to any worker receive them when the backend is shared between workers.
+    Without a backend, events only reach the clients of the publishing process.
+    """
+    def __init__(self, backend: CacheBackend | None = None, max_queued: int = 100):
+        """
+        Sets class attributes.
+
+        :param backend: Optional cache backend carrying the events between workers
+        :param max_queued: maximum number of queued events per client
+        """
+        self.backend = backend
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscriptions: dict[int, set[Subscription]] = {}
+        if backend is not None:
+            backend.subscribe(self._handle_message)
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        """
+        Registers a client for the events of an owner. Must be called from the event loop serving the client.
+
+        :param owner_id: id of the owner
+        :return: the subscription of the client
+        """
+        subscription = Subscription(owner_id=owner_id, loop=asyncio.get_running_loop(), max_queued=self.max_queued)
+        with self._lock:
+            self._subscriptions.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Removes a client, e.g. after it disconnected.
+
+        :param subscription: the subscription of the client
+        """
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.owner_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.owner_id, None)
+
+    def subscribers(self, owner_id: int) -> int:
+        """
+        Counts the connected clients of an owner in this process.
+
+        :param owner_id: id of the owner
+        :return: the number of clients
+        """
+        with self._lock:
+            return len(self._subscriptions.get(owner_id, ()))
+
+    def publish(self, owner_id: int, event: dict[str, Any]) -> None:
+        """
+        Sends an event to all clients of an owner, on all workers sharing the cache backend.
+
+        :param owner_id: id of the owner
+        :param event: the JSON serialisable event
+        """
+        if self.backend is None:
+            self.deliver(owner_id=owner_id, event=event)
+        else:
+            self.backend.publish(f"{EVENTS_NAMESPACE}:{owner_id}:{json.dumps(event, default=str)}")
+
+    def deliver(self, owner_id: int, event: dict[str, Any]) -> None:
+        """
+        Queues an event for the clients of an owner connected to this process. Safe to call from any thread.
+
+        :param owner_id: id of the owner
+        :param event: the event
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(owner_id, ()))
+        for subscription in subscriptions:
+            if not subscription.loop.is_closed():
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def _handle_message(self, message: str) -> None:
+        """
+        Delivers the events published by any worker.
+
+        :param message: the pub/sub message, formatted as 'events:<owner id>:<JSON event>'
+        """
+        namespace, _, rest = message.partition(":")
+        owner_id, _, event = rest.partition(":")
+        if namespace == EVENTS_NAMESPACE and owner_id.isdigit():
+            self.deliver(owner_id=int(owner_id), event=json.loads(event))
+
+
+def format_sse(event: dict[str, Any] | None) -> str:
+    """
+    Formats an event as a Server-Sent Events message, or a heartbeat comment if there is no event.
+
+    :param event: the event, its 'event' field is used as the SSE event type
+    :return: the SSE message
+    """
+    if event is None:
+        return ": heartbeat\n\n"
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def event_stream(subscription: Subscription, is_disconnected: Callable[[], Awaitable[bool]],
+                       heartbeat_seconds: float, on_close: Callable[[], None] | None = None) -> AsyncIterator[str]:
+    """
+    Streams the events of a subscription as SSE messages until the client disconnects. A heartbeat is sent whenever
+    no event arrives within the heartbeat interval, which keeps proxies from closing idle connections and lets the
+    server notice disconnected clients.
+
+    :param subscription: the subscription of the client
+    :param is_disconnected: coroutine function verifying whether the client disconnected
+    :param heartbeat_seconds: maximum number of seconds between two messages
+    :param on_close: Optional callback called when the stream ends, e.g. to unsubscribe the client
+    :return: the SSE messages
+    """
+    try:
+        yield format_sse({"event": "connected"})
+        while not await is_disconnected():
+            yield format_sse(await subscription.get(timeout=heartbeat_seconds))
+    finally:
+        if on_close is not None:
+            on_close()
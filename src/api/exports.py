@@ -0,0 +1,129 @@
+import io
+import csv
+import json
+import zlib
+import datetime
+import tempfile
+
+from typing import Any, Iterable, Iterator
+from collections.abc import Mapping
+
+import polars as pl
+
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv",
+                      "ndjson": "application/x-ndjson",
+                      "parquet": "application/vnd.apache.parquet"}
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def csv_chunks(batches: Iterable[list[Mapping[str, Any]]], columns: list[str]) -> Iterator[bytes]:
+    """
+    Serialises batches of rows to CSV, one chunk per batch, preceded by the header.
+
+    :param batches: batches of rows, each row mapping the columns to the values
+    :param columns: the columns to write, in order
+    :return: the CSV chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(batches: Iterable[list[Mapping[str, Any]]]) -> Iterator[bytes]:
+    """
+    Serialises batches of rows to newline delimited JSON, one chunk per batch.
+
+    :param batches: batches of rows, each row mapping the columns to the values
+    :return: the NDJSON chunks
+    """
+    for batch in batches:
+        yield "".join(f"{json.dumps(dict(row), default=str)}\n" for row in batch).encode()
+
+
+def frame_from_rows(rows: list[Mapping[str, Any]], schema: dict[str, pl.DataType]) -> pl.DataFrame:
+    """
+    Converts rows to a DataFrame with a fixed schema, such that the batches of an export share the same column types
+    regardless of their values. Dates returned as ISO strings by the DB driver are parsed.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :param schema: the type of each column, in order
+    :return: the DataFrame
+    """
+    date_columns = [column for column, dtype in schema.items() if dtype == pl.Date]
+    data = {column: [row.get(column) for row in rows] for column in schema}
+    for column in date_columns:
+        data[column] = [datetime.date.fromisoformat(value) if isinstance(value, str) else value
+                        for value in data[column]]
+    return pl.DataFrame(data, schema=schema)
+
+
+def parquet_chunks(batches: Iterable[list[Mapping[str, Any]]], schema: dict[str, pl.DataType],
+                   row_group_size: int = 1000) -> Iterator[bytes]:
+    """
+    Serialises batches of rows to a single Parquet file. Each batch is spilled to a temporary part file, after which
+    polars streams the parts into the final file, so only a batch is held in memory. As the Parquet metadata follows
+    the data, the file is sent once all batches are written.
+
+    :param batches: batches of rows, each row mapping the columns to the values
+    :param schema: the type of each column, in order
+    :param row_group_size: maximum number of rows per row group of the file
+    :return: the chunks of the Parquet file
+    """
+    with tempfile.TemporaryDirectory(prefix="cellar_export_") as directory:
+        parts = 0
+        for batch in batches:
+            frame_from_rows(rows=batch, schema=schema).write_parquet(f"{directory}/part_{parts:08d}.parquet")
+            parts += 1
+        if not parts:
+            pl.DataFrame(schema=schema).write_parquet(f"{directory}/part_{parts:08d}.parquet")
+
+        pl.scan_parquet(f"{directory}/part_*.parquet").sink_parquet(f"{directory}/export.parquet",
+                                                                    row_group_size=row_group_size)
+        with open(f"{directory}/export.parquet", "rb") as file:
+            while chunk := file.read(FILE_CHUNK_SIZE):
+                yield chunk
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks with gzip, without holding more than a chunk in memory.
+
+    :param chunks: the uncompressed chunks
+    :param level: compression level from 1 (fastest) to 9 (smallest)
+    :return: the gzip compressed chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(batches: Iterable[list[Mapping[str, Any]]], export_format: str, schema: dict[str, pl.DataType],
+                  gzip: bool = False) -> Iterator[bytes]:
+    """
+    Serialises batches of rows to an export format.
+
+    :param batches: batches of rows, each row mapping the columns to the values
+    :param export_format: one of the keys of EXPORT_MEDIA_TYPES
+    :param schema: the type of each column, in order
+    :param gzip: whether to compress the export with gzip
+    :return: the chunks of the export
+    """
+    if export_format == "csv":
+        chunks = csv_chunks(batches=batches, columns=list(schema))
+    elif export_format == "ndjson":
+        chunks = ndjson_chunks(batches=batches)
+    elif export_format == "parquet":
+        chunks = parquet_chunks(batches=batches, schema=schema)
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    return gzip_chunks(chunks) if gzip else chunks
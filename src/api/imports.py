@@ -0,0 +1,274 @@
+import os
+
+from typing import Any, Callable, ContextManager
+
+import polars as pl
+
+from db.jdbc_interface import JdbcDbConn
+
+from .jobs import ImportJobs
+from .autocomplete import fold
+from .models.insert_data_models import CURRENT_YEAR
+from .constants import WINE_CATALOGUE_CACHE, WINE_NAME_INDEX, SEARCH_INDEX
+from .wine_info import parse_grapes, structured_value
+from .db_initialisation import rebuild_owner_summary, rebuild_drink_window
+from .routers.cellar_funcs import get_owner_storages, change_log_query
+
+
+# Columns of an import file: the fields of the CellarInModel with the wine and geographic info flattened
+IMPORT_COLUMNS = ["name", "vintage", "grapes", "type", "drink_from", "drink_before", "alcohol_vol_perc", "country",
+                  "region", "producer", "additional_info", "quality_signature", "storage_unit", "bottle_size_cl",
+                  "quantity"]
+REQUIRED_IMPORT_COLUMNS = ["name", "type", "drink_before", "country", "storage_unit", "quantity"]
+IMPORT_FORMATS = ("csv", "parquet")
+
+
+def scan_import_file(file_path: str, file_format: str) -> pl.LazyFrame:
+    """
+    Lazily reads an import file, with all columns as text and the line number of each row in the 'row' column.
+
+    :param file_path: path to the CSV or Parquet file
+    :param file_format: one of IMPORT_FORMATS
+    :return: the lazy frame of the file
+    """
+    if file_format == "csv":
+        frame = pl.scan_csv(file_path, infer_schema=False)
+    elif file_format == "parquet":
+        frame = pl.scan_parquet(file_path).select(pl.all().cast(pl.Utf8))
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+    columns = frame.collect_schema().names()
+    if missing := [column for column in REQUIRED_IMPORT_COLUMNS if column not in columns]:
+        raise ValueError(f"The import file misses the required column(s): {', '.join(missing)}")
+    return (frame
+            .with_columns(pl.lit(None, dtype=pl.Utf8).alias(column)
+                          for column in IMPORT_COLUMNS if column not in columns)
+            .select(IMPORT_COLUMNS)
+            .with_row_index("row", offset=1))
+
+
+def validate_import_chunk(chunk: pl.DataFrame, storage_ids: set[int]) -> tuple[pl.DataFrame, list[dict[str, Any]]]:
+    """
+    Parses a chunk of an import file and validates all rows at once against the rules of the CellarInModel. Omitted
+    optional fields get the defaults of the model.
+
+    :param chunk: rows of the import file as returned by `scan_import_file`
+    :param storage_ids: ids of the storage units of the importing owner
+    :return: the valid rows with typed columns, and the invalid rows formatted to the ImportRowErrorModel schema
+    """
+    raw = chunk.select(pl.col("row"), *(pl.col(column).str.strip_chars().alias(column) for column in IMPORT_COLUMNS))
+    vintage = pl.col("vintage").str.to_integer(strict=False)
+    alcohol_vol_perc = pl.col("alcohol_vol_perc").cast(pl.Float64, strict=False)
+    bottle_size_cl = pl.col("bottle_size_cl").cast(pl.Float64, strict=False)
+    parsed = raw.with_columns(
+        pl.when(pl.col("vintage").is_null()).then(CURRENT_YEAR).otherwise(vintage).alias("vintage"),
+        pl.col("drink_from").str.to_date("%Y-%m-%d", strict=False).alias("parsed_drink_from"),
+        pl.col("drink_before").str.to_date("%Y-%m-%d", strict=False),
+        pl.when(pl.col("alcohol_vol_perc").is_null()).then(13.5).otherwise(alcohol_vol_perc)
+        .alias("alcohol_vol_perc"),
+        pl.when(pl.col("bottle_size_cl").is_null()).then(75.).otherwise(bottle_size_cl).alias("bottle_size_cl"),
+        pl.col("storage_unit").str.to_integer(strict=False),
+        pl.col("quantity").str.to_integer(strict=False),
+        *(pl.col(column).fill_null("None") for column in ("grapes", "region", "producer", "additional_info",
+                                                          "quality_signature")))
+
+    rules = [("name is required and can have at most 200 characters",
+              pl.col("name").is_null() | (pl.col("name").str.len_chars() > 200)),
+             ("vintage should be an integer between 1 and 2999",
+              pl.col("vintage").is_null() | (pl.col("vintage") <= 0) | (pl.col("vintage") >= 3000)),
+             ("type is required and can have at most 20 characters",
+              pl.col("type").is_null() | (pl.col("type").str.len_chars() > 20)),
+             ("drink_from should be a date formatted as YYYY-MM-DD",
+              pl.col("drink_from").is_not_null() & pl.col("parsed_drink_from").is_null()),
+             ("drink_before is required as a date formatted as YYYY-MM-DD", pl.col("drink_before").is_null()),
+             ("alcohol_vol_perc should be a number between 0 and 100",
+              pl.col("alcohol_vol_perc").is_null() | (pl.col("alcohol_vol_perc") <= 0) |
+              (pl.col("alcohol_vol_perc") >= 100)),
+             ("country is required", pl.col("country").is_null()),
+             ("quality_signature can have at most 200 characters",
+              pl.col("quality_signature").str.len_chars() > 200),
+             ("storage_unit should be the id of one of your storage units",
+              pl.col("storage_unit").is_null() |
+              ~pl.col("storage_unit").is_in(pl.Series(sorted(storage_ids), dtype=pl.Int64))),
+             ("bottle_size_cl should be a positive number",
+              pl.col("bottle_size_cl").is_null() | (pl.col("bottle_size_cl") <= 0)),
+             ("quantity should be a positive integer", pl.col("quantity").is_null() | (pl.col("quantity") <= 0))]
+    validated = parsed.with_columns(
+        pl.concat_list([pl.when(invalid).then(pl.lit(message)) for message, invalid in rules])
+        .list.drop_nulls().alias("errors"))
+
+    invalid = validated.filter(pl.col("errors").list.len() > 0)
+    valid = (validated
+             .filter(pl.col("errors").list.len() == 0)
+             .with_columns(pl.coalesce("parsed_drink_from", pl.date(pl.col("vintage"), 1, 1)).alias("drink_from"))
+             .drop("parsed_drink_from", "errors"))
+    return valid, invalid.select("row", "errors").to_dicts()
+
+
+def wine_key(name: str, vintage: int) -> tuple[str, int]:
+    """
+    Constructs the key of a wine that matches names regardless of case, accents and repeated whitespace, like the
+    collation of the wines table matches them.
+
+    :param name: name of the wine
+    :param vintage: vintage of the wine
+    :return: the folded name and the vintage
+    """
+    return fold(name), vintage
+
+
+def get_wine_ids(db_conn: JdbcDbConn, wines: list[tuple[str, int]]) -> dict[tuple[str, int], int]:
+    """
+    Retrieves the ids of wines in a single query. The DB matches the names case-insensitively, so the stored name of a
+    wine may differ from the requested one: the ids are keyed by `wine_key` instead of the exact name.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param wines: the names and vintages of the wines
+    :return: the ids of the wines that exist, by the `wine_key` of their name and vintage
+    """
+    names = sorted({name for name, _ in wines})
+    params = {f"name_{i}": name for i, name in enumerate(names)}
+    rows = db_conn.execute_query_select(query=f"SELECT id, name, vintage FROM cellar.wines "
+                                              f"WHERE name IN ({', '.join(f'%({param})s' for param in params)})",
+                                        params=params)
+    wanted = {wine_key(name, vintage) for name, vintage in wines}
+    return {key: wine_id for wine_id, name, vintage in rows if (key := wine_key(name, vintage)) in wanted}
+
+
+def import_wines(db_conn: JdbcDbConn, bottles: pl.DataFrame) -> dict[tuple[str, int], int]:
+    """
+    Adds the wines of validated import rows that are not in the wines table yet, with a multi-row insert for the
+    wines and one for their grapes. Wines that already exist are not updated. Rows of which the names only differ in
+    case, accents or whitespace are the same wine, the first of these rows is used to add it.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param bottles: validated import rows
+    :return: the ids of all wines of the rows, by the `wine_key` of their name and vintage
+    """
+    wines = {}
+    for wine in bottles.unique(subset=["name", "vintage"], keep="first", maintain_order=True).to_dicts():
+        wines.setdefault(wine_key(wine["name"], wine["vintage"]), wine)
+    wine_ids = get_wine_ids(db_conn=db_conn, wines=list(zip(bottles["name"], bottles["vintage"])))
+    new_wines = [wine for key, wine in wines.items() if key not in wine_ids]
+    if new_wines:
+        records = [{"name": wine["name"], "vintage": wine["vintage"], "grapes": wine["grapes"], "type": wine["type"],
+                    "drink_from": wine["drink_from"], "drink_before": wine["drink_before"],
+                    "alcohol_vol_perc": wine["alcohol_vol_perc"],
+                    "geographic_info": ",\t".join(f"{key}: {wine[key]}" for key in ("country", "region", "producer",
+                                                                                      "additional_info")),
+                    "quality_signature": wine["quality_signature"], "country": structured_value(wine["country"]),
+                    "region": structured_value(wine["region"]), "producer": structured_value(wine["producer"])}
+                   for wine in new_wines]
+        db_conn.create_records(records, table="cellar.wines")
+        wine_ids.update(get_wine_ids(db_conn=db_conn, wines=[(wine["name"], wine["vintage"]) for wine in new_wines]))
+        db_conn.create_records([{"wine_id": wine_ids[wine_key(wine["name"], wine["vintage"])], "grape": grape}
+                                for wine in new_wines for grape in parse_grapes(wine["grapes"])],
+                               table="cellar.wine_grapes")
+
+        for record in records:
+            wine_id = wine_ids[wine_key(record["name"], record["vintage"])]
+            if WINE_NAME_INDEX.loaded:
+                WINE_NAME_INDEX.add(wine_id=wine_id, name=record["name"], vintage=record["vintage"])
+            if SEARCH_INDEX.loaded:
+                SEARCH_INDEX.add_wine(wine_id=wine_id, name=record["name"], vintage=record["vintage"],
+                                      grapes=record["grapes"], geographic_info=record["geographic_info"],
+                                      quality_signature=record["quality_signature"])
+        new_ids = [wine_ids[wine_key(record["name"], record["vintage"])] for record in records]
+        WINE_NAME_INDEX.publish(new_ids)
+        SEARCH_INDEX.publish_wines(new_ids)
+    for key, wine in wines.items():
+        WINE_CATALOGUE_CACHE.add(wine_id=wine_ids[key], name=wine["name"], vintage=wine["vintage"])
+    return wine_ids
+
+
+def import_bottles(db_conn: JdbcDbConn, owner_id: int, bottles: pl.DataFrame) -> None:
+    """
+    Adds validated import rows to the cellar of an owner. Rows of the same wine, storage unit and bottle size are
+    merged, and added to the quantity of an existing entry if there is one. New entries are added with a multi-row
+    insert, the quantities of existing entries and the change log are updated within a single transaction.
+
+    The owner summary and drink window tables are not maintained per row, rebuild them after the import.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of the importing owner
+    :param bottles: validated import rows
+    """
+    if bottles.is_empty():
+        return
+    wine_ids = import_wines(db_conn=db_conn, bottles=bottles)
+    ids = pl.DataFrame([(name_key, vintage, wine_id) for (name_key, vintage), wine_id in wine_ids.items()],
+                       schema={"name_key": pl.Utf8, "vintage": pl.Int64, "wine_id": pl.Int64}, orient="row")
+    entries = (bottles
+               .with_columns(pl.col("name").map_elements(fold, return_dtype=pl.Utf8).alias("name_key"))
+               .join(ids, on=["name_key", "vintage"], how="left", maintain_order="left")
+               .group_by("wine_id", "storage_unit", "bottle_size_cl", maintain_order=True)
+               .agg(pl.col("quantity").sum(), pl.col("drink_from").first(), pl.col("drink_before").first()))
+
+    params = {f"wine_id_{i}": wine_id for i, wine_id in enumerate(entries["wine_id"].unique())}
+    wine_conditions = (f"owner_id = %(owner_id)s "
+                       f"AND wine_id IN ({', '.join(f'%({param})s' for param in params)})")
+    params["owner_id"] = owner_id
+    existing = {(wine_id, storage_unit, float(bottle_size_cl)): cellar_id
+                for cellar_id, wine_id, storage_unit, bottle_size_cl in db_conn.execute_query_select(
+                    query=f"SELECT id, wine_id, storage_unit, bottle_size_cl FROM cellar.cellar "
+                          f"WHERE {wine_conditions}",
+                    params=params)}
+
+    new_entries, queries, query_params = [], [], []
+    for entry in entries.to_dicts():
+        cellar_id = existing.get((entry["wine_id"], entry["storage_unit"], entry["bottle_size_cl"]))
+        if cellar_id is None:
+            new_entries.append({"wine_id": entry["wine_id"], "storage_unit": entry["storage_unit"],
+                                "owner_id": owner_id, "bottle_size_cl": entry["bottle_size_cl"],
+                                "quantity": entry["quantity"], "drink_from": entry["drink_from"],
+                                "drink_before": entry["drink_before"]})
+        else:
+            queries.append("UPDATE cellar.cellar SET quantity = quantity + %(quantity)s WHERE id = %(cellar_id)s")
+            query_params.append({"quantity": entry["quantity"], "cellar_id": cellar_id})
+    db_conn.create_records(new_entries, table="cellar.cellar")
+    queries.append(change_log_query(entity="cellar", operation="upsert", conditions=wine_conditions))
+    query_params.append(params)
+    db_conn.execute_query(queries, params=query_params)
+
+
+def run_import_job(jobs: ImportJobs, job_id: str, owner_id: int, file_path: str, file_format: str,
+                   connect: Callable[[], ContextManager[JdbcDbConn]], chunk_size: int = 5000,
+                   on_change: Callable[[], None] | None = None) -> None:
+    """
+    Imports an uploaded file into the cellar of an owner chunk by chunk, reporting the progress and the invalid rows
+    to the job registry. Chunks are committed as they are processed, so a failing job keeps the rows imported before
+    the failure. The uploaded file is removed afterwards.
+
+    :param jobs: the job registry
+    :param job_id: id of the job
+    :param owner_id: id of the importing owner
+    :param file_path: path to the uploaded file
+    :param file_format: one of IMPORT_FORMATS
+    :param connect: factory of a context manager yielding a DB connection for the job
+    :param chunk_size: number of rows processed at once
+    :param on_change: Optional callback called once bottles have been imported, e.g. to invalidate caches
+    """
+    jobs.update(job_id, status="running")
+    try:
+        with connect() as db_conn:
+            try:
+                storage_ids = set(get_owner_storages(db_conn=db_conn, owner_id=owner_id).values())
+                for chunk in scan_import_file(file_path=file_path, file_format=file_format).collect_batches(
+                        chunk_size=chunk_size):
+                    bottles, errors = validate_import_chunk(chunk=chunk, storage_ids=storage_ids)
+                    import_bottles(db_conn=db_conn, owner_id=owner_id, bottles=bottles)
+                    jobs.add_progress(job_id, processed=chunk.height, imported=bottles.height, errors=errors)
+                jobs.update(job_id, status="done")
+            except Exception as e:
+                jobs.update(job_id, status="failed", detail=str(e))
+            finally:
+                if jobs.get(job_id, owner_id=owner_id)["rows_imported"]:
+                    rebuild_owner_summary(db_conn=db_conn, owner_id=owner_id)
+                    rebuild_drink_window(db_conn=db_conn, owner_id=owner_id)
+                    if on_change is not None:
+                        on_change()
+    except Exception as e:
+        jobs.update(job_id, status="failed", detail=str(e))
+    finally:
+        os.remove(file_path)
@@ -0,0 +1,81 @@
+import uuid
+import threading
+
+from typing import Any
+from collections import OrderedDict
+
+
+class ImportJobs:
+    """
+    Process-local registry of the bulk import jobs and their progress. Jobs run in the background of the worker that
+    accepted the upload, so their progress can only be retrieved from that worker. The registry is bounded: once it is
+    full, the oldest finished jobs are dropped.
+    """
+    def __init__(self, max_jobs: int = 100, max_reported_errors: int = 1000):
+        """
+        Sets class attributes.
+
+        :param max_jobs: maximum number of jobs kept in the registry
+        :param max_reported_errors: maximum number of invalid rows reported per job, further rows are only counted
+        """
+        self.max_jobs = max_jobs
+        self.max_reported_errors = max_reported_errors
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+    def create(self, owner_id: int, file_name: str | None) -> dict[str, Any]:
+        """
+        Registers a new job.
+
+        :param owner_id: id of the owner importing the file
+        :param file_name: name of the uploaded file
+        :return: the job, formatted to the ImportJobModel schema
+        """
+        job = {"job_id": uuid.uuid4().hex, "owner_id": owner_id, "file_name": file_name, "status": "queued",
+               "rows_processed": 0, "rows_imported": 0, "rows_failed": 0, "errors": [], "detail": None}
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            finished = [job_id for job_id, other in self._jobs.items() if other["status"] in ("done", "failed")]
+            for job_id in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+                del self._jobs[job_id]
+            return dict(job)
+
+    def get(self, job_id: str, owner_id: int) -> dict[str, Any] | None:
+        """
+        Retrieves a job of an owner.
+
+        :param job_id: id of the job
+        :param owner_id: id of the owner, jobs of other owners are not returned
+        :return: a copy of the job, None if the owner has no job with this id
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["owner_id"] != owner_id:
+                return None
+            return {**job, "errors": list(job["errors"])}
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """
+        Sets fields of a job, e.g. its status.
+
+        :param job_id: id of the job
+        :param fields: the fields to set
+        """
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def add_progress(self, job_id: str, processed: int, imported: int, errors: list[dict[str, Any]]) -> None:
+        """
+        Adds the result of a processed chunk to the progress of a job.
+
+        :param job_id: id of the job
+        :param processed: number of rows processed in the chunk
+        :param imported: number of rows imported from the chunk
+        :param errors: the invalid rows of the chunk, formatted to the ImportRowErrorModel schema
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            job["rows_processed"] += processed
+            job["rows_imported"] += imported
+            job["rows_failed"] += len(errors)
+            job["errors"].extend(errors[:max(self.max_reported_errors - len(job["errors"]), 0)])
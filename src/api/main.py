@@ -13,12 +13,16 @@ from fastapi.openapi.docs import get_swagger_ui_html
 from starlette.responses import RedirectResponse, Response
 from fastapi import FastAPI, Depends, HTTPException, Request
 
+from db.mariadb_jdbc import JdbcMariaDB
 from db.jdbc_interface import JdbcDbConn
 
 from .auth_utils import BasicAuth
+from .rate_limit import RateLimitMiddleware
 from .db_initialisation import db_setup
 from .routers import users_router, cellar_router, cellar_views_router
-from .constants import ACCESS_TOKEN_EXPIRATION_MIN, OPENAPI_URL, SRC, DB_CREDS, DB_CONN, SETUP_DB
+from .constants import (ACCESS_TOKEN_EXPIRATION_MIN, OPENAPI_URL, SRC, DB_CREDS, DB_CONN, SETUP_DB,
+                        WINE_CATALOGUE_CACHE, WARM_WINE_CATALOGUE_CACHE, RATE_LIMITS, RATE_LIMIT_BACKEND, JWT_KEY,
+                        ALGORITHM)
 from .authentication import get_current_active_user, authenticate_user, create_access_token
 
 from .get_request_body_with_explode import get_request_body_with_explode
@@ -37,12 +41,18 @@ with open(f'{SRC}env.yml', 'r') as file:
     env = yaml.safe_load(file)
 if SETUP_DB:
     db_setup(db_creds=DB_CREDS, restarted=False)
+if WARM_WINE_CATALOGUE_CACHE:
+    with JdbcMariaDB(**DB_CREDS.dict()) as db:
+        WINE_CATALOGUE_CACHE.warm(db_conn=db)
 basic_auth = BasicAuth(auto_error=False)
 
 app.include_router(users_router.router)
 app.include_router(cellar_router.router)
 app.include_router(cellar_views_router.router)
 
+# Added before the CORS middleware, such that limited responses carry the CORS headers as well
+app.add_middleware(RateLimitMiddleware, backend=RATE_LIMIT_BACKEND, limits=RATE_LIMITS, jwt_key=JWT_KEY,
+                   algorithm=ALGORITHM)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -0,0 +1,109 @@
+"""
+Management commands for the cellar DB. Run them from the root of the repository, e.g.:
+
+    PYTHONPATH=src python -m api.manage rebuild-summary --verify
+"""
+import argparse
+
+from db.mariadb_jdbc import JdbcMariaDB
+
+from .constants import DB_CREDS, CHANGE_LOG_RETENTION_DAYS, SNAPSHOT_BATCH_SIZE, CACHE_BACKEND
+from .cache_backends import InProcessCacheBackend
+from .db_initialisation import (upgrade_database, rebuild_owner_summary, verify_owner_summary, rebuild_drink_window,
+                                backfill_structured_wine_info, compact_changes)
+from .snapshots import snapshot_database, restore_database
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    :param argv: Optional list of arguments, defaults to the arguments the script was called with
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(prog="api.manage", description="Management commands for the cellar DB.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summary = commands.add_parser("rebuild-summary",
+                                  help="Recompute the owner summary tables from the cellar table.")
+    summary.add_argument("--owner-id", type=int, default=None, help="Only rebuild the summary of this owner.")
+    summary.add_argument("--verify", action="store_true", help="Verify the consistency after rebuilding.")
+    summary.add_argument("--verify-only", action="store_true", help="Only verify, do not rebuild.")
+
+    drink_window = commands.add_parser("rebuild-drink-window",
+                                       help="Recompute the drinkable years per bottle from the cellar table.")
+    drink_window.add_argument("--owner-id", type=int, default=None,
+                              help="Only rebuild the drink window of this owner.")
+
+    commands.add_parser("migrate-wine-info",
+                        help="Fill the structured geographic and grape data of the wines from their text fields.")
+
+    changes = commands.add_parser("compact-changes",
+                                  help="Remove superseded changes and old deletes from the change log.")
+    changes.add_argument("--retention-days", type=int, default=CHANGE_LOG_RETENTION_DAYS,
+                         help="Number of days deletes are kept in the change log.")
+
+    snapshot = commands.add_parser("snapshot",
+                                   help="Write a consistent snapshot of all tables to a directory of Parquet files.")
+    snapshot.add_argument("directory", help="Directory of the snapshot, must not exist yet.")
+    snapshot.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH_SIZE,
+                          help="Number of rows per Parquet part file.")
+
+    restore = commands.add_parser("restore",
+                                  help="Replace the content of all tables in a snapshot by the snapshotted rows.")
+    restore.add_argument("directory", help="Directory of the snapshot.")
+    restore.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH_SIZE,
+                         help="Number of rows inserted per batch.")
+    restore.add_argument("--api-stopped", action="store_true",
+                         help="Confirm the API is stopped, required without a shared cache backend.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs a management command.
+
+    :param argv: Optional list of arguments, defaults to the arguments the script was called with
+    :return: exit code of the command
+    """
+    args = parse_args(argv)
+    with JdbcMariaDB(**DB_CREDS.dict()) as db:
+        if args.command == "rebuild-summary":
+            if not args.verify_only:
+                # Creates the summary tables for DBs that were set up before they existed
+                upgrade_database(db_conn=db)
+                rebuild_owner_summary(db_conn=db, owner_id=args.owner_id)
+                print("Owner summary has been rebuilt")
+            if args.verify or args.verify_only:
+                if inconsistent := verify_owner_summary(db_conn=db):
+                    print(f"Owner summary is inconsistent for owner(s): {inconsistent}")
+                    return 1
+                print("Owner summary is consistent")
+        elif args.command == "rebuild-drink-window":
+            upgrade_database(db_conn=db)
+            rebuild_drink_window(db_conn=db, owner_id=args.owner_id)
+            print("Drink window has been rebuilt")
+        elif args.command == "migrate-wine-info":
+            upgrade_database(db_conn=db)
+            backfill_structured_wine_info(db_conn=db)
+            print("Structured wine info has been backfilled")
+        elif args.command == "compact-changes":
+            upgrade_database(db_conn=db)
+            compact_changes(db_conn=db, retention_days=args.retention_days)
+            print("Change log has been compacted")
+        elif args.command == "snapshot":
+            manifest = snapshot_database(db_conn=db, directory=args.directory, batch_size=args.batch_size)
+            print(f"Snapshot of {sum(manifest['tables'].values())} rows has been written to {args.directory}")
+        elif args.command == "restore":
+            # Without a shared backend the caches of running workers cannot be cleared and would serve stale data
+            if isinstance(CACHE_BACKEND, InProcessCacheBackend) and not args.api_stopped:
+                print("No shared cache backend is configured, so the caches of running API workers cannot be "
+                      "cleared after the restore. Stop the API and rerun with --api-stopped.")
+                return 1
+            restored = restore_database(db_conn=db, directory=args.directory, batch_size=args.batch_size)
+            print(f"{sum(restored.values())} rows have been restored from {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
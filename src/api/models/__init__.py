@@ -1,3 +1,3 @@
-from .setup_models import DbConnModel
+from .setup_models import DbConnModel, SnapshotModel, DbAdmissionStatsModel
 from .owners_models import *
 from .insert_data_models import *
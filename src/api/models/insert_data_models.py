@@ -18,7 +18,8 @@ class StorageOutModel(StorageInModel):
 class GeographicInfoModel(BaseModel):
     country: str = Field(description="Country of origin.")
     region: str | None = Field(description="Origin region.", default='None')
-    additional_info: str | None = Field(description="Extra information e.g., producer, specific vineyard(s).",
+    producer: str | None = Field(description="Producer of the wine (beer).", default='None')
+    additional_info: str | None = Field(description="Extra information e.g., specific vineyard(s).",
                                         default='None')
 
 
@@ -88,3 +89,100 @@ class RatingInDbModel(RatingModel):
     id: int = Field(ge=0)
     rater_id: int = Field(ge=0)
     wine_id: int = Field(ge=0)
+
+
+class WineRatingsModel(BaseModel):
+    ratings: dict[int, list[RatingInDbModel]] = Field(description="Ratings per requested wine id, wines without "
+                                                                  "ratings are included with an empty list.")
+    missing_wine_ids: list[int] = Field(description="Requested wine ids that are not in the DB.")
+
+
+class DashboardModel(BaseModel):
+    storages: list[StorageOutModel] | None = None
+    bottles: list[CellarOutModel] | None = None
+    recent_ratings: list[RatingInDbModel] | None = None
+    drink_now: list[CellarOutModel] | None = Field(default=None, description="Bottles within their drinking window "
+                                                                             "this year.")
+
+
+class CellarStatsModel(BaseModel):
+    total_bottles: int = Field(ge=0)
+    total_litres: float = Field(ge=0)
+    drinkable_now: int = Field(ge=0, description="Number of bottles within their drinking window today.")
+    bottles_per_type: dict[str, int]
+    bottles_per_vintage: dict[int, int]
+    bottles_per_storage_unit: dict[int, int]
+
+
+class DrinkWindowForecastModel(BaseModel):
+    year: int = Field(gt=0, lt=3000)
+    entering: int = Field(ge=0, description="Bottles for which this is the first year of their drinking window.")
+    in_window: int = Field(ge=0, description="Bottles that are drinkable in this year.")
+    leaving: int = Field(ge=0, description="Bottles for which this is the last year of their drinking window.")
+
+
+class TypeVintageSummaryModel(BaseModel):
+    type: str = Field(max_length=20)
+    vintage: int = Field(gt=0, lt=3000)
+    bottles: int = Field(ge=0)
+    litres: float = Field(ge=0)
+
+
+class OwnerSummaryModel(BaseModel):
+    bottles: int = Field(ge=0)
+    litres: float = Field(ge=0)
+    per_type_vintage: list[TypeVintageSummaryModel]
+
+
+class SearchResultModel(BaseModel):
+    wine_id: int = Field(ge=0)
+    name: str | None = Field(max_length=200)
+    vintage: int | None = Field(gt=0, lt=3000)
+    score: float = Field(ge=0, description="Relevance of the wine for the search terms, higher is more relevant.")
+    rating_ids: list[int] = Field(description="Your ratings of the wine with tasting notes matching the search terms.")
+
+
+class WineSuggestionModel(BaseModel):
+    wine_id: int = Field(ge=0)
+    name: str = Field(max_length=200)
+    vintage: int = Field(gt=0, lt=3000)
+
+
+class CatalogueCacheStatsModel(BaseModel):
+    hits: int = Field(ge=0)
+    misses: int = Field(ge=0)
+    hit_ratio: float = Field(ge=0, le=1)
+    cached_names: int = Field(ge=0, description="Number of cached (name, vintage) to id mappings.")
+    cached_ids: int = Field(ge=0, description="Number of wine ids cached as existing.")
+
+
+class ChangeModel(BaseModel):
+    version: int = Field(ge=0, description="Version of the change log at which the change was made.")
+    entity: str = Field(max_length=20, description="The changed entity: storage, cellar, rating or owner.")
+    entity_id: int = Field(ge=0)
+    operation: str = Field(max_length=10, description="upsert if the entity was added or changed, delete if removed.")
+    data: dict | None = Field(description="The current data of an upserted entity, empty for deletes.")
+
+
+class ChangesModel(BaseModel):
+    version: int = Field(ge=0, description="Version to pass as 'since' to retrieve the next changes.")
+    full_resync: bool = Field(description="Whether changes after 'since' were compacted, such that all data has to "
+                                          "be reloaded and syncing continues from 'version'.")
+    has_more: bool = Field(description="Whether more changes are available after 'version'.")
+    changes: list[ChangeModel]
+
+
+class ImportRowErrorModel(BaseModel):
+    row: int = Field(ge=1, description="Number of the row in the file, the header excluded.")
+    errors: list[str]
+
+
+class ImportJobModel(BaseModel):
+    job_id: str
+    file_name: str | None
+    status: str = Field(description="queued, running, done or failed.")
+    rows_processed: int = Field(ge=0)
+    rows_imported: int = Field(ge=0)
+    rows_failed: int = Field(ge=0)
+    errors: list[ImportRowErrorModel] = Field(description="The invalid rows, which are not imported.")
+    detail: str | None = Field(description="The reason a failed job stopped.")
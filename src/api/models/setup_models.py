@@ -1,3 +1,5 @@
+import datetime
+
 from pydantic import BaseModel, Field
 
 
@@ -5,3 +7,21 @@ class DbConnModel(BaseModel):
     user: str
     password: str
     database: str = Field(default='')
+
+
+class SnapshotModel(BaseModel):
+    name: str
+    created_at: datetime.datetime
+    tables: dict[str, int] = Field(description="Number of rows per table")
+
+
+class DbAdmissionStatsModel(BaseModel):
+    max_concurrency: int = Field(ge=0, description="Maximum number of requests using the DB concurrently.")
+    active: int = Field(ge=0, description="Number of admitted requests currently using the DB.")
+    queue_length: int = Field(ge=0, description="Number of requests waiting for their admission.")
+    admitted: int = Field(ge=0)
+    queued: int = Field(ge=0, description="Number of requests that had to wait for their admission.")
+    shed_timeout: int = Field(ge=0, description="Number of requests answered with a 503 after waiting too long.")
+    shed_queue_full: int = Field(ge=0, description="Number of requests answered with a 503 as the queue was full.")
+    average_wait_seconds: float = Field(ge=0, description="Average wait of the queued requests.")
+    max_wait_seconds: float = Field(ge=0)
@@ -0,0 +1,310 @@
+import math
+import time
+import threading
+
+from typing import Any
+from abc import ABCMeta, abstractmethod
+
+import jwt
+
+from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+from fastapi.security.utils import get_authorization_scheme_param
+
+from .cache_backends import InMemoryRedis, redis_client_from_url
+
+
+# Token bucket on a Redis hash holding the tokens left and the time they were counted. The time is taken from the
+# Redis server, such that the buckets refill alike for all workers.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_second = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or capacity
+local at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * refill_per_second)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / refill_per_second * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+def refill(tokens: float, elapsed: float, capacity: float, refill_per_second: float) -> float:
+    """
+    Computes the tokens in a bucket after a period without requests.
+
+    :param tokens: the tokens left at the start of the period
+    :param elapsed: duration of the period, in seconds
+    :param capacity: maximum number of tokens in the bucket
+    :param refill_per_second: number of tokens added per second
+    :return: the tokens at the end of the period
+    """
+    return min(capacity, tokens + max(elapsed, 0.) * refill_per_second)
+
+
+class RateLimitBackend(metaclass=ABCMeta):
+    """
+    Interface for the storage of the token buckets of the rate limits.
+    """
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.) -> tuple[bool, float]:
+        """
+        Takes tokens from a bucket, a new bucket starts full.
+
+        :param key: the key of the bucket
+        :param capacity: maximum number of tokens in the bucket
+        :param refill_per_second: number of tokens added per second
+        :param cost: number of tokens to take
+        :return: whether the tokens were taken, and the tokens left in the bucket
+        """
+        pass
+
+    async def take_async(self, key: str, capacity: float, refill_per_second: float,
+                         cost: float = 1.) -> tuple[bool, float]:
+        """
+        Takes tokens from a bucket like `take`, from a coroutine. The take runs on a worker thread by default, such that
+        a round trip to an external backend does not block the event loop.
+
+        :param key: the key of the bucket
+        :param capacity: maximum number of tokens in the bucket
+        :param refill_per_second: number of tokens added per second
+        :param cost: number of tokens to take
+        :return: whether the tokens were taken, and the tokens left in the bucket
+        """
+        return await run_in_threadpool(self.take, key, capacity, refill_per_second, cost)
+
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        Drops all buckets, such that all clients start with full buckets.
+        """
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Rate limit backend keeping the buckets in the memory of the process, each worker limits the requests it serves.
+    The number of buckets is bounded: once it is reached, the buckets that refilled completely are dropped.
+    """
+    def __init__(self, max_keys: int = 100_000):
+        """
+        Sets class attributes.
+
+        :param max_keys: maximum number of buckets kept in memory
+        """
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float, float, float]] = {}
+
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.) -> tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else refill(bucket[0], now - bucket[1], capacity, refill_per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            if bucket is None and len(self._buckets) >= self.max_keys:
+                self._drop_full_buckets(now)
+            self._buckets[key] = (tokens, now, capacity, refill_per_second)
+            return allowed, tokens
+
+    async def take_async(self, key: str, capacity: float, refill_per_second: float,
+                         cost: float = 1.) -> tuple[bool, float]:
+        # Taking from an in-memory bucket does not block, so it skips the worker thread
+        return self.take(key, capacity, refill_per_second, cost)
+
+    def _drop_full_buckets(self, now: float) -> None:
+        """
+        Drops the buckets that refilled completely, as they hold no state a new bucket would not. Drops all buckets if
+        none refilled.
+
+        :param now: the current monotonic time
+        """
+        full = [key for key, (tokens, at, capacity, refill_per_second) in self._buckets.items()
+                if refill(tokens, now - at, capacity, refill_per_second) >= capacity]
+        for key in full:
+            del self._buckets[key]
+        if not full:
+            self._buckets.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Rate limit backend keeping the buckets in a service speaking the Redis protocol, such that all workers share the
+    limits. Each take is a single atomic script call.
+    """
+    def __init__(self, client: Any, key_prefix: str = "cellar:rate_limit:"):
+        """
+        Sets class attributes.
+
+        :param client: Redis client, e.g. `redis.Redis` or the `InMemoryRedis` stand-in
+        :param key_prefix: prefix of all keys written by the backend
+        """
+        self.client = client
+        self.key_prefix = key_prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.) -> tuple[bool, float]:
+        allowed, tokens = self._script(keys=[f"{self.key_prefix}{key}"], args=[capacity, refill_per_second, cost])
+        return bool(int(allowed)), float(tokens)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.key_prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+_IN_MEMORY_BUCKET_LOCK = threading.Lock()
+
+
+def _token_bucket_in_memory(client: InMemoryRedis, keys: list[str], args: list[float]) -> list[Any]:
+    """
+    Equivalent of TOKEN_BUCKET_SCRIPT on the InMemoryRedis stand-in, the bucket is stored as "<tokens> <time>".
+    """
+    capacity, refill_per_second, cost = (float(arg) for arg in args)
+    with _IN_MEMORY_BUCKET_LOCK:
+        now = time.time()
+        bucket = client.get(keys[0])
+        tokens, at = (float(value) for value in bucket.split()) if bucket else (capacity, now)
+        tokens = refill(tokens, now - at, capacity, refill_per_second)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        client.set(keys[0], f"{tokens} {now}", px=math.ceil((capacity - tokens) / refill_per_second * 1000) + 1000)
+    return [int(allowed), str(tokens)]
+
+
+InMemoryRedis.scripts[TOKEN_BUCKET_SCRIPT] = _token_bucket_in_memory
+
+
+def rate_limit_backend_from_url(url: str | None) -> RateLimitBackend:
+    """
+    Constructs the rate limit backend configured by a URL, like the cache backend: no URL for the in-memory backend,
+    'memory://' for the Redis backend on the in-memory stand-in and 'redis://...' for a Redis service, which requires
+    the redis package. The Redis client is shared with a cache backend on the same URL.
+
+    :param url: Optional URL of the rate limit backend
+    :return: the rate limit backend
+    """
+    if not url:
+        return InMemoryRateLimitBackend()
+    return RedisRateLimitBackend(client=redis_client_from_url(url))
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware limiting the requests per client with a token bucket per router. Clients are identified by the
+    subject of their JWT, i.e. their username, from the Authorization header or cookie. Requests without a valid token
+    are limited per client address. Responses carry the RateLimit-Limit, RateLimit-Remaining and RateLimit-Reset
+    headers, limited requests get a 429 with a Retry-After header.
+    """
+    def __init__(self, app: ASGIApp, backend: RateLimitBackend, limits: dict[str, dict[str, float]], jwt_key: str,
+                 algorithm: str, max_cached_tokens: int = 10_000):
+        """
+        Sets class attributes.
+
+        :param app: the ASGI app
+        :param backend: storage of the token buckets
+        :param limits: capacity and refill_per_second of the bucket of each router, keyed by the router prefix without
+            slash, e.g. {"cellar_views": {"capacity": 120, "refill_per_second": 10}}. Other paths are not limited.
+        :param jwt_key: key the JWTs are signed with
+        :param algorithm: algorithm the JWTs are signed with
+        :param max_cached_tokens: maximum number of decoded tokens kept, such that a token is verified only once
+        """
+        self.app = app
+        self.backend = backend
+        self.limits = limits
+        self.jwt_key = jwt_key
+        self.algorithm = algorithm
+        self.max_cached_tokens = max_cached_tokens
+        self._subjects: dict[str, tuple[str, float]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        router = scope["path"].split("/", 2)[1]
+        limit = self.limits.get(router)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        capacity, refill_per_second = limit["capacity"], limit["refill_per_second"]
+        allowed, tokens = await self.backend.take_async(key=f"{router}:{self.client_key(scope)}", capacity=capacity,
+                                                        refill_per_second=refill_per_second)
+        headers = {"RateLimit-Limit": str(int(capacity)), "RateLimit-Remaining": str(int(tokens)),
+                   "RateLimit-Reset": str(math.ceil((capacity - tokens) / refill_per_second))}
+        if not allowed:
+            headers["Retry-After"] = str(math.ceil((1 - tokens) / refill_per_second))
+            response = JSONResponse(content={"detail": "Too many requests, retry later"}, status_code=429,
+                                    headers=headers)
+            return await response(scope, receive, send)
+
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *raw_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def client_key(self, scope: Scope) -> str:
+        """
+        Identifies the client of a request.
+
+        :param scope: the ASGI scope of the request
+        :return: "user:<JWT subject>" for a valid token, "address:<client host>" otherwise
+        """
+        token = authorization = cookie = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+            elif name == b"cookie":
+                cookie = value.decode("latin-1")
+        if authorization is None and cookie is not None:
+            authorization = cookie_parser(cookie).get("Authorization")
+        if authorization is not None:
+            scheme, token = get_authorization_scheme_param(authorization)
+            token = token if scheme.lower() == "bearer" else None
+        subject = self.subject(token) if token else None
+        if subject is not None:
+            return f"user:{subject}"
+        client = scope.get("client")
+        return f"address:{client[0] if client else ''}"
+
+    def subject(self, token: str) -> str | None:
+        """
+        Retrieves the subject of a JWT, decoding and verifying the token only on its first use.
+
+        :param token: the encoded JWT
+        :return: the subject, None if the token is invalid or expired
+        """
+        cached = self._subjects.get(token)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        try:
+            payload = jwt.decode(jwt=token, key=self.jwt_key, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return None
+        subject = payload.get("sub")
+        if subject is None:
+            return None
+        if len(self._subjects) >= self.max_cached_tokens:
+            self._subjects.clear()
+        self._subjects[token] = (subject, payload.get("exp", math.inf))
+        return subject
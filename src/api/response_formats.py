@@ -0,0 +1,154 @@
+import io
+import json
+import decimal
+
+from typing import Any
+from collections.abc import Mapping
+
+import polars as pl
+
+from fastapi import Response
+
+from .exports import frame_from_rows
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+BINARY_MEDIA_TYPES = (ARROW_STREAM_MEDIA_TYPE, MSGPACK_MEDIA_TYPE)
+# Documents the binary representations of the list endpoints in the OpenAPI schema
+BINARY_RESPONSES = {200: {"content": {media_type: {} for media_type in BINARY_MEDIA_TYPES},
+                          "description": "JSON by default, an Arrow IPC stream or MessagePack when requested in the "
+                                         "Accept header."}}
+
+
+def json_default(value: Any) -> Any:
+    """
+    Converts the values the JSON encoders cannot serialise themselves, e.g. the decimals returned for DECIMAL columns
+    and the rows of select results.
+
+    :param value: the value
+    :return: a JSON serialisable equivalent of the value
+    """
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def json_bytes(rows: list[dict[str, Any]] | dict[str, Any]) -> bytes:
+    """
+    Serialises rows straight to JSON, with orjson when it is installed and the standard library otherwise.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :return: the JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(rows, default=json_default)
+    return json.dumps(rows, default=json_default, separators=(",", ":")).encode()
+
+
+class TrustedJSONResponse(Response):
+    """
+    JSON response of rows that already match the response model of the endpoint, e.g. rows selected from the DB with
+    the columns of the model. Returning it from an endpoint skips FastAPI's validation of every row into the response
+    model and its re-encoding with `jsonable_encoder`, while the response model still documents the endpoint.
+    """
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
+
+
+def available_media_types() -> list[str]:
+    """
+    Lists the media types the list endpoints can be served in, in order of preference. MessagePack is only available
+    when the msgpack package is installed.
+
+    :return: the media types
+    """
+    return [JSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE] + ([MSGPACK_MEDIA_TYPE] if msgpack is not None else [])
+
+
+def negotiate_media_type(accept: str | None) -> str:
+    """
+    Picks the media type of a response from the Accept header of a request, using the quality values of RFC 9110.
+    Wildcards and media types that are not available fall back to JSON, as the API always served JSON before.
+
+    :param accept: value of the Accept header
+    :return: the available media type with the highest quality
+    """
+    available = available_media_types()
+    best, best_quality = JSON_MEDIA_TYPE, 0.
+    for media_range in (accept or "").split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.
+        if media_type.lower() in available and quality > best_quality:
+            best, best_quality = media_type.lower(), quality
+    return best
+
+
+def arrow_stream_bytes(rows: list[dict[str, Any]], schema: dict[str, pl.DataType]) -> bytes:
+    """
+    Serialises rows to the Arrow IPC streaming format, with a fixed schema such that consumers can rely on the column
+    types.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :param schema: the type of each column, in order
+    :return: the Arrow IPC stream
+    """
+    buffer = io.BytesIO()
+    frame_from_rows(rows=rows, schema=schema).write_ipc_stream(buffer)
+    return buffer.getvalue()
+
+
+def msgpack_bytes(rows: list[dict[str, Any]]) -> bytes:
+    """
+    Serialises rows to MessagePack. Dates and other values without a MessagePack type are sent as strings, like in the
+    JSON responses.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :return: the MessagePack array of maps
+    """
+    if msgpack is None:
+        raise ImportError("The msgpack package is required for MessagePack responses: pip install msgpack")
+    return msgpack.packb(rows, default=json_default)
+
+
+def binary_response(rows: list[dict[str, Any]], media_type: str, schema: dict[str, pl.DataType],
+                    headers: dict[str, str] | None = None) -> Response:
+    """
+    Serialises the rows of a list endpoint directly to a binary media type, without validating each row into a model.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :param media_type: one of BINARY_MEDIA_TYPES
+    :param schema: the type of each column, in order
+    :param headers: Optional headers of the response, e.g. its ETag
+    :return: the response
+    """
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        content = arrow_stream_bytes(rows=rows, schema=schema)
+    elif media_type == MSGPACK_MEDIA_TYPE:
+        content = msgpack_bytes(rows=rows)
+    else:
+        raise ValueError(f"Unsupported binary media type: {media_type}")
+    return Response(content=content, media_type=media_type, headers=headers)
@@ -1,19 +1,97 @@
-from typing import Any
+import asyncio
+import datetime
+
+from typing import Any, Callable, ContextManager, Iterator
+
+import polars as pl
 
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from mysql.connector.errors import DataError
 
 from db.jdbc_interface import JdbcDbConn
 
+from ..admission import DbAdmission
+from ..dependencies import admit
+from ..wine_info import drink_window_years, parse_grapes, structured_value
+from ..constants import (SEARCH_INDEX, WINE_NAME_INDEX, WINE_CATALOGUE_CACHE, STORAGE_CACHE,
+                         CHANGE_LOG_ENTITIES, DRINK_WINDOW_MAX_YEARS)
 from ..models import WinesModel, CellarInModel, GeographicInfoModel, RatingModel, ConsumedBottleModel, CellarOutModel
 
 
+CELLAR_OUT_QUERY = ("SELECT w.name AS name, w.vintage AS vintage, "
+                    "       c.id AS cellar_id, "
+                    "       c.storage_unit AS storage_unit, c.quantity AS quantity,"
+                    "       c.bottle_size_cl AS bottle_size_cl,"
+                    "       c.wine_id AS wine_id, c.owner_id AS owner_id,"
+                    "       c.drink_from AS drink_from, c.drink_before AS drink_before "
+                    "FROM cellar.cellar AS c "
+                    "LEFT JOIN cellar.wines AS w "
+                    "    ON w.id = c.wine_id ")
+# Column types of the cellar exports, in the order of the columns of CELLAR_OUT_QUERY
+CELLAR_EXPORT_SCHEMA = {"name": pl.Utf8, "vintage": pl.Int64, "cellar_id": pl.Int64, "storage_unit": pl.Int64,
+                        "quantity": pl.Int64, "bottle_size_cl": pl.Float64, "wine_id": pl.Int64, "owner_id": pl.Int64,
+                        "drink_from": pl.Date, "drink_before": pl.Date}
+STORAGE_OUT_SCHEMA = {"id": pl.Int64, "owner_id": pl.Int64, "location": pl.Utf8, "description": pl.Utf8}
+RATING_OUT_SCHEMA = {"id": pl.Int64, "rater_id": pl.Int64, "wine_id": pl.Int64, "rating": pl.Int64,
+                     "drinking_date": pl.Date, "comments": pl.Utf8}
+DASHBOARD_SECTIONS = ("storages", "bottles", "recent_ratings", "drink_now")
+
+
 def unpack_geo_info(geographic_info: GeographicInfoModel) -> str:
     """Unpacks the data in a GeographicInfoModel instance and returns it as a string"""
     return ",\t".join(f"{k}: {v}" for k, v in geographic_info.dict().items())
 
 
-async def get_storage_id(db_conn: JdbcDbConn, current_user_id: int, location: str, description: str) -> int:
+def union_select(column: str, values: list[Any] | range, param_prefix: str) -> tuple[str, dict[str, Any]]:
+    """
+    Constructs a subquery that selects the provided values as rows of a single column, such that the values can be
+    joined on within an insert query.
+
+    :param column: name of the selected column
+    :param values: the values to select
+    :param param_prefix: prefix of the query params holding the values
+    :return: the subquery and its params
+    """
+    params = {f"{param_prefix}_{i}": value for i, value in enumerate(values)}
+    return " UNION ALL ".join(f"SELECT %({param})s AS {column}" for param in params), params
+
+
+def storage_key(location: str | None, description: str | None) -> tuple[str, str]:
+    """
+    Constructs the key a storage unit is looked up on. Like the collation of the storages table, the key ignores case
+    and trailing spaces.
+
+    :param location: storage unit location
+    :param description: storage unit description
+    :return: the normalised location and description
+    """
+    return (location or "").casefold().rstrip(), (description or "").casefold().rstrip()
+
+
+def get_owner_storages(db_conn: JdbcDbConn, owner_id: int) -> dict[tuple[str, str], int]:
+    """
+    Retrieves all storage units of an owner. An owner has only a few storage units that rarely change, so they are
+    cached per owner until the owner adds or deletes a storage unit.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: db id of the owner
+    :return: the storage ids by their `storage_key`
+    """
+    storages = STORAGE_CACHE.get(owner_id)
+    if storages is None:
+        rows = db_conn.execute_query_select(query="SELECT id, location, description FROM cellar.storages "
+                                                  "WHERE owner_id = %(owner_id)s "
+                                                  "ORDER BY id",
+                                            params={"owner_id": owner_id})
+        storages = {}
+        for storage_id, location, description in rows:
+            storages.setdefault(storage_key(location, description), storage_id)
+        STORAGE_CACHE.set(owner_id, storages)
+    return storages
+
+
+async def get_storage_id(db_conn: JdbcDbConn, current_user_id: int, location: str, description: str) -> tuple[int]:
     """
     Retrieves the storage ID for a specific storage for a specific user.
 
@@ -21,17 +99,12 @@ async def get_storage_id(db_conn: JdbcDbConn, current_user_id: int, location: st
     :param current_user_id: db id of the current user
     :param location: storage unit location
     :param description: storage unit description
-    :return: the storage id
-    """
-    storage_id = db_conn.execute_query_select(query="SELECT id FROM cellar.storages "
-                                                    "WHERE location = %(location)s "
-                                                    "  AND description = %(description)s "
-                                                    "  AND owner_id = %(owner_id)s",
-                                              params={"location": location, "description": description,
-                                                      "owner_id": current_user_id})
+    :return: the storage id, as the single field of a row
+    """
+    storages = get_owner_storages(db_conn=db_conn, owner_id=current_user_id)
     try:
-        return storage_id[0]
-    except IndexError:
+        return (storages[storage_key(location, description)], )
+    except KeyError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Storage unit is not found.")
 
 
@@ -44,14 +117,7 @@ async def verify_storage_exists_for_user(db_conn: JdbcDbConn, storage_id: int, u
     :param user_id: id of user
     :return: True if the storage unit exists for the user, False if not
     """
-    info = db_conn.execute_query_select(query="SELECT location, description "
-                                              "FROM cellar.storages "
-                                              "WHERE id = %(storage_id)s AND owner_id = %(user_id)s",
-                                        params={"storage_id": storage_id, "user_id": user_id})
-    if len(info):
-        return True
-    else:
-        return False
+    return storage_id in get_owner_storages(db_conn=db_conn, owner_id=user_id).values()
 
 
 async def verify_empty_storage_unit(db_conn: JdbcDbConn, storage_id: int) -> bool:
@@ -84,11 +150,14 @@ async def verify_wine_in_db(db_conn: JdbcDbConn, name: str, vintage: int) -> boo
     :param vintage: year of production/harvest
     :return: True if the wine exists in the wines table, False if not
     """
-    wine = db_conn.execute_query_select(query="SELECT * FROM cellar.wines "
+    if WINE_CATALOGUE_CACHE.get_id(name=name, vintage=vintage) is not None:
+        return True
+    wine = db_conn.execute_query_select(query="SELECT id FROM cellar.wines "
                                               "WHERE name = %(name)s "
                                               "AND vintage = %(vintage)s",
                                         params={"name": name, "vintage": vintage})
     if wine:
+        WINE_CATALOGUE_CACHE.add(wine_id=wine[0][0], name=name, vintage=vintage)
         return True
     else:
         return False
@@ -96,23 +165,48 @@ async def verify_wine_in_db(db_conn: JdbcDbConn, name: str, vintage: int) -> boo
 
 async def add_wine_to_db(db_conn: JdbcDbConn, wine_info: WinesModel) -> str:
     """
-    Adds a wine to the DB wine table
+    Adds a wine to the DB wine table. The geographic info is stored both as text and in the indexed country, region
+    and producer columns, the grapes are stored both as text and in the wine_grapes table.
 
     :param db_conn: MariaDB instance to connect to the DB
     :param wine_info: name of the wine (beer)
     :return: True if the wine exists in the wines table, False if not
     """
-    db_conn.execute_query("INSERT INTO cellar.wines (name, vintage, grapes, type, drink_from, drink_before, "
-                          "                          alcohol_vol_perc, geographic_info, quality_signature) "
-                          "VALUES "
-                          "(%(name)s, %(vintage)s, %(grapes)s, %(type)s, %(drink_from)s, %(drink_before)s, "
-                          "%(alcohol_vol_perc)s, %(geographic_info)s, %(quality_signature)s)",
-                          params={"name": wine_info.name, "vintage": wine_info.vintage, "grapes": wine_info.grapes,
-                                  "type": wine_info.type, "drink_from": wine_info.drink_from,
-                                  "drink_before": wine_info.drink_before,
-                                  "alcohol_vol_perc": wine_info.alcohol_vol_perc,
-                                  "geographic_info": unpack_geo_info(wine_info.geographic_info),
-                                  "quality_signature": wine_info.quality_signature})
+    params = {"name": wine_info.name, "vintage": wine_info.vintage, "grapes": wine_info.grapes,
+              "type": wine_info.type, "drink_from": wine_info.drink_from, "drink_before": wine_info.drink_before,
+              "alcohol_vol_perc": wine_info.alcohol_vol_perc,
+              "geographic_info": unpack_geo_info(wine_info.geographic_info),
+              "quality_signature": wine_info.quality_signature,
+              "country": structured_value(wine_info.geographic_info.country),
+              "region": structured_value(wine_info.geographic_info.region),
+              "producer": structured_value(wine_info.geographic_info.producer)}
+    queries = ["INSERT INTO cellar.wines (name, vintage, grapes, type, drink_from, drink_before, "
+               "                          alcohol_vol_perc, geographic_info, quality_signature, "
+               "                          country, region, producer) "
+               "VALUES "
+               "(%(name)s, %(vintage)s, %(grapes)s, %(type)s, %(drink_from)s, %(drink_before)s, "
+               "%(alcohol_vol_perc)s, %(geographic_info)s, %(quality_signature)s, "
+               "%(country)s, %(region)s, %(producer)s)"]
+    if grapes := parse_grapes(wine_info.grapes):
+        grape_rows, grape_params = union_select(column="grape", values=grapes, param_prefix="grape")
+        queries.append("INSERT INTO cellar.wine_grapes (wine_id, grape) "
+                       "SELECT w.id, g.grape "
+                       "FROM cellar.wines AS w "
+                       f"CROSS JOIN ({grape_rows}) AS g "
+                       "WHERE w.name = %(name)s AND w.vintage = %(vintage)s")
+        params.update(grape_params)
+    db_conn.execute_query(queries, params=len(queries) * [params])
+
+    # Resolving the id caches it in the catalogue cache, such that the caller does not query it again
+    wine_id = await get_bottle_id(db_conn=db_conn, name=wine_info.name, vintage=wine_info.vintage)
+    if WINE_NAME_INDEX.loaded:
+        WINE_NAME_INDEX.add(wine_id=wine_id, name=wine_info.name, vintage=wine_info.vintage)
+    if SEARCH_INDEX.loaded:
+        SEARCH_INDEX.add_wine(wine_id=wine_id, name=wine_info.name, vintage=wine_info.vintage,
+                              grapes=wine_info.grapes, geographic_info=params["geographic_info"],
+                              quality_signature=wine_info.quality_signature)
+    WINE_NAME_INDEX.publish([wine_id])
+    SEARCH_INDEX.publish_wines([wine_id])
     return "Wine has successfully been added to the DB wines table"
 
 
@@ -125,15 +219,19 @@ async def get_bottle_id(db_conn: JdbcDbConn, name: str, vintage: int) -> int:
     :param vintage: vintage of the wine
     :return: the id of the wine, raises a 404 error if the requested wine is not found in the db
     """
+    if (wine_id := WINE_CATALOGUE_CACHE.get_id(name=name, vintage=vintage)) is not None:
+        return wine_id
     wine = db_conn.execute_query_select(query="SELECT id FROM cellar.wines "
                                               "WHERE name = %(name)s "
                                               "AND vintage = %(vintage)s",
                                         params={"name": name, "vintage": vintage})
     try:
-        return wine[0][0]
+        wine_id = wine[0][0]
     except IndexError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"The requested wine is not found.")
+    WINE_CATALOGUE_CACHE.add(wine_id=wine_id, name=name, vintage=vintage)
+    return wine_id
 
 
 async def verify_bottle_exists_in_storage_unit(db_conn: JdbcDbConn, wine_id: int, storage_unit: int, bottle_size: float
@@ -159,10 +257,69 @@ async def verify_bottle_exists_in_storage_unit(db_conn: JdbcDbConn, wine_id: int
         return False
 
 
+def drink_window_insert_query(conditions: str, years: range) -> tuple[str, dict[str, int]] | None:
+    """
+    Constructs the query that adds the drinkable years of the cellar entries matching the conditions to the drink
+    window table.
+
+    :param conditions: where conditions selecting the added cellar entries
+    :param years: the drinkable years of the cellar entries
+    :return: the insert query and its year params, None if there are no drinkable years
+    """
+    if not len(years):
+        return None
+    drink_years, year_params = union_select(column="drink_year", values=years, param_prefix="drink_year")
+    return ("INSERT INTO cellar.drink_window (owner_id, drink_year, cellar_id) "
+            "SELECT c.owner_id, y.drink_year, c.id "
+            "FROM cellar.cellar AS c "
+            f"CROSS JOIN ({drink_years}) AS y "
+            f"WHERE {conditions}"), year_params
+
+
+def owner_summary_delta_queries(conditions: str) -> list[str]:
+    """
+    Constructs the queries that apply a change in the number of bottles to the owner summary tables. The change is
+    read from the 'delta' query param and applied for every cellar entry that matches the conditions, such that the
+    summaries can be maintained within the same transaction as the write to the cellar table.
+
+    :param conditions: where conditions selecting the changed cellar entries
+    :return: the delta queries for both the owner and the owner/type/vintage summary tables
+    """
+    return [("INSERT INTO cellar.owner_summary (owner_id, bottles, volume_cl) "
+             "SELECT c.owner_id, %(delta)s, %(delta)s * c.bottle_size_cl "
+             "FROM cellar.cellar AS c "
+             f"WHERE {conditions} "
+             "ON DUPLICATE KEY UPDATE bottles = bottles + VALUES(bottles), volume_cl = volume_cl + VALUES(volume_cl)"),
+            ("INSERT INTO cellar.owner_type_vintage_summary (owner_id, type, vintage, bottles, volume_cl) "
+             "SELECT c.owner_id, w.type, w.vintage, %(delta)s, %(delta)s * c.bottle_size_cl "
+             "FROM cellar.cellar AS c "
+             "JOIN cellar.wines AS w ON w.id = c.wine_id "
+             f"WHERE {conditions} "
+             "ON DUPLICATE KEY UPDATE bottles = bottles + VALUES(bottles), volume_cl = volume_cl + VALUES(volume_cl)")]
+
+
+def change_log_query(entity: str, operation: str, conditions: str) -> str:
+    """
+    Constructs an insert query for the change log, recording a change of all entities matching the conditions. Add it
+    to the transaction of the write itself; for deletes, add it before the delete query.
+
+    :param entity: the changed entity, one of the keys of CHANGE_LOG_ENTITIES
+    :param operation: 'upsert' for inserts and updates, 'delete' for deletes
+    :param conditions: where conditions selecting the changed entities from the table of the entity
+    :return: the insert query
+    """
+    table, owner_column = CHANGE_LOG_ENTITIES[entity]
+    return ("INSERT INTO cellar.changes (owner_id, entity, entity_id, operation) "
+            f"SELECT {owner_column}, '{entity}', id, '{operation}' "
+            f"FROM cellar.{table} "
+            f"WHERE {conditions}")
+
+
 async def update_quantity_in_cellar(db_conn: JdbcDbConn, wine_id: int, bottle_data: CellarInModel | ConsumedBottleModel,
                                     add: bool) -> None:
     """
     Updates the quantity of stored bottles in the cellar table. If the quantity is updated to 0, the entry is removed.
+    The owner summary tables and the change log are updated within the same transaction.
 
     :param db_conn: MariaDB instance to connect to the DB
     :param wine_id: id of the wine from the wines table
@@ -173,18 +330,26 @@ async def update_quantity_in_cellar(db_conn: JdbcDbConn, wine_id: int, bottle_da
     params = {"quantity": str(bottle_data.quantity),
               "wine_id": str(wine_id),
               "storage_unit": str(bottle_data.storage_unit),
-              "bottle_size_cl": str(bottle_data.bottle_size_cl)}
+              "bottle_size_cl": str(bottle_data.bottle_size_cl),
+              "delta": bottle_data.quantity if add else -bottle_data.quantity}
     query_conditions = ("wine_id = %(wine_id)s "
                         "AND storage_unit = %(storage_unit)s "
                         "AND bottle_size_cl = %(bottle_size_cl)s")
+    # Update the quantity by adding or subtracting the desired value, apply the same change to the owner summary and
+    # the change log and remove the record matching the bottle, including its drinkable years, if quantity is brought
+    # back to zero
+    queries = [f"UPDATE cellar.cellar SET quantity = quantity {quantity_operator} %(quantity)s "
+               f"WHERE {query_conditions}",
+               *owner_summary_delta_queries(conditions=query_conditions),
+               change_log_query(entity="cellar", operation="upsert",
+                                conditions=f"quantity > 0 AND {query_conditions}"),
+               change_log_query(entity="cellar", operation="delete",
+                                conditions=f"quantity = 0 AND {query_conditions}"),
+               f"DELETE FROM cellar.drink_window WHERE cellar_id IN "
+               f"(SELECT id FROM cellar.cellar WHERE quantity = 0 AND {query_conditions})",
+               f"DELETE FROM cellar.cellar WHERE quantity = 0 AND {query_conditions}"]
     try:
-        # Update the quantity by adding or subtracting the desired value
-        db_conn.execute_query(f"UPDATE cellar.cellar SET quantity = quantity {quantity_operator} %(quantity)s "
-                              f"WHERE {query_conditions}",
-                              params=params)
-        # Remove record matching the bottle if quantity is brought back to zero
-        db_conn.execute_query(f"DELETE FROM cellar.cellar WHERE quantity = 0 AND {query_conditions}",
-                              params=params)
+        db_conn.execute_query(queries, params=len(queries) * [params])
 
     except DataError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
@@ -208,15 +373,28 @@ async def add_bottle_to_cellar(db_conn: JdbcDbConn, wine_id: int, owner_id: int,
         # Update the quantity by adding the new value
         await update_quantity_in_cellar(db_conn=db_conn, wine_id=wine_id, bottle_data=wine_data, add=True)
     else:
-        # Insert the data as a new entry to the DB
-        db_conn.execute_query("INSERT INTO cellar.cellar (wine_id, storage_unit, owner_id, bottle_size_cl, "
-                              "                           quantity, drink_from, drink_before) "
-                              "VALUES (%(wine_id)s, %(storage_unit)s, %(owner_id)s, %(bottle_size_cl)s, "
-                              "        %(quantity)s, %(drink_from)s, %(drink_before)s)",
-                              params={"wine_id": wine_id, "storage_unit": wine_data.storage_unit, "owner_id": owner_id,
-                                      "bottle_size_cl": wine_data.bottle_size_cl, "quantity": wine_data.quantity,
-                                      "drink_from": wine_data.wine_info.drink_from,
-                                      "drink_before": wine_data.wine_info.drink_before})
+        # Insert the data as a new entry to the DB and add it to the owner summary, the change log and the drink window
+        # table within the same transaction
+        params = {"wine_id": wine_id, "storage_unit": wine_data.storage_unit, "owner_id": owner_id,
+                  "bottle_size_cl": wine_data.bottle_size_cl, "quantity": wine_data.quantity,
+                  "drink_from": wine_data.wine_info.drink_from, "drink_before": wine_data.wine_info.drink_before,
+                  "delta": wine_data.quantity}
+        query_conditions = ("wine_id = %(wine_id)s "
+                            "AND storage_unit = %(storage_unit)s "
+                            "AND bottle_size_cl = %(bottle_size_cl)s")
+        queries = ["INSERT INTO cellar.cellar (wine_id, storage_unit, owner_id, bottle_size_cl, "
+                   "                           quantity, drink_from, drink_before) "
+                   "VALUES (%(wine_id)s, %(storage_unit)s, %(owner_id)s, %(bottle_size_cl)s, "
+                   "        %(quantity)s, %(drink_from)s, %(drink_before)s)",
+                   *owner_summary_delta_queries(conditions=query_conditions),
+                   change_log_query(entity="cellar", operation="upsert", conditions=query_conditions)]
+        if drink_window := drink_window_insert_query(conditions=query_conditions,
+                                                     years=drink_window_years(wine_data.wine_info.drink_from,
+                                                                              wine_data.wine_info.drink_before)):
+            query, year_params = drink_window
+            queries.append(query)
+            params.update(year_params)
+        db_conn.execute_query(queries, params=len(queries) * [params])
 
 
 async def wine_in_db(db_conn: JdbcDbConn, wine_id: int) -> bool:
@@ -227,14 +405,52 @@ async def wine_in_db(db_conn: JdbcDbConn, wine_id: int) -> bool:
     :param wine_id: id of the wine from the wines table
     :return: True if the provided wine id is known, False if not
     """
-    wine = db_conn.execute_query_select(query="SELECT * FROM cellar.wines WHERE id = %(wine_id)s",
+    if WINE_CATALOGUE_CACHE.contains_id(wine_id=wine_id):
+        return True
+    wine = db_conn.execute_query_select(query="SELECT id, name, vintage FROM cellar.wines WHERE id = %(wine_id)s",
                                         params={"wine_id": wine_id})
     if len(wine):
+        WINE_CATALOGUE_CACHE.add(*wine[0])
         return True
     else:
         return False
 
 
+def get_wine_ratings(db_conn: JdbcDbConn, wine_ids: list[int], rater_id: int | None = None) -> dict[str, Any]:
+    """
+    Retrieves the ratings of multiple wines with a single query. The ratings are joined onto the requested wines, such
+    that the same query reveals which of the wines do not exist, instead of verifying each wine separately.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param wine_ids: ids of the wines from the wines table
+    :param rater_id: Optional id of the rater, only the ratings of this rater are retrieved if provided
+    :return: the ratings per existing wine and the ids of the wines that are not in the DB, formatted to the
+             WineRatingsModel schema
+    """
+    wine_ids = list(dict.fromkeys(wine_ids))
+    params = {f"wine_id_{i}": wine_id for i, wine_id in enumerate(wine_ids)}
+    ids = ", ".join(f"%({param})s" for param in params)
+    rater_cond = ""
+    if rater_id is not None:
+        params["rater_id"] = rater_id
+        rater_cond = "AND r.rater_id = %(rater_id)s "
+    rows = db_conn.execute_query_select(query="SELECT w.id AS requested_wine_id, r.id, r.rater_id, r.wine_id, "
+                                              "       r.rating, r.drinking_date, r.comments "
+                                              "FROM cellar.wines AS w "
+                                              f"LEFT JOIN cellar.ratings AS r ON r.wine_id = w.id {rater_cond}"
+                                              f"WHERE w.id IN ({ids}) "
+                                              "ORDER BY w.id, r.id",
+                                        params=params, get_fields=True)
+    ratings = {}
+    for row in rows:
+        wine_ratings = ratings.setdefault(row["requested_wine_id"], [])
+        # Wines without (matching) ratings are joined onto a row of NULLs
+        if row["id"] is not None:
+            wine_ratings.append({column: row[column] for column in row if column != "requested_wine_id"})
+    return {"ratings": {wine_id: ratings[wine_id] for wine_id in wine_ids if wine_id in ratings},
+            "missing_wine_ids": [wine_id for wine_id in wine_ids if wine_id not in ratings]}
+
+
 async def rating_in_db(db_conn: JdbcDbConn, rating_id: int, user_id: int) -> bool:
     """
     Verifies whether a wine exists in the DB based on the id of both the rating and the rater i.e., bottle owner
@@ -263,34 +479,363 @@ async def add_rating_to_db(db_conn: JdbcDbConn, user_id: int, wine_id: int, rati
     :param rating: rating data
     :return: True if the provided wine id is known, False if not
     """
-    db_conn.execute_query("INSERT INTO cellar.ratings (rater_id, wine_id, rating, drinking_date, comments) "
-                          "VALUES (%(rater_id)s, %(wine_id)s, %(rating)s, %(drinking_date)s, %(comments)s)",
-                          params={"rater_id": user_id, "wine_id": wine_id, "rating": rating.rating,
-                                  "drinking_date": rating.drinking_date, "comments": rating.comments})
+    params = {"rater_id": user_id, "wine_id": wine_id, "rating": rating.rating,
+              "drinking_date": rating.drinking_date, "comments": rating.comments}
+    queries = ["INSERT INTO cellar.ratings (rater_id, wine_id, rating, drinking_date, comments) "
+               "VALUES (%(rater_id)s, %(wine_id)s, %(rating)s, %(drinking_date)s, %(comments)s)",
+               change_log_query(entity="rating", operation="upsert",
+                                conditions="id = (SELECT MAX(id) FROM cellar.ratings WHERE rater_id = %(rater_id)s)")]
+    db_conn.execute_query(queries, params=len(queries) * [params])
+    if SEARCH_INDEX.loaded:
+        rating_id = db_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.ratings "
+                                                       "WHERE rater_id = %(rater_id)s AND wine_id = %(wine_id)s",
+                                                 params={"rater_id": user_id, "wine_id": wine_id})[0][0]
+        SEARCH_INDEX.add_rating(rating_id=rating_id, rater_id=user_id, wine_id=wine_id, comments=rating.comments)
+    SEARCH_INDEX.publish_ratings(rater_id=user_id)
+
+
+def search_wines(db_conn: JdbcDbConn, owner_id: int, query: str) -> list[dict[str, Any]]:
+    """
+    Searches the wines in the cellar of an owner and the wines the owner rated in the search index. The index is
+    loaded from the DB on the first search.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of user/bottle owner
+    :param query: the search terms
+    :return: the matching wines ordered by relevance, formatted to the SearchResultModel schema
+    """
+    SEARCH_INDEX.ensure_loaded(db_conn=db_conn)
+    owner_wines = db_conn.execute_query_select(query="SELECT DISTINCT wine_id FROM cellar.cellar "
+                                                     "WHERE owner_id = %(owner_id)s",
+                                               params={"owner_id": owner_id})
+    return SEARCH_INDEX.search(query=query, owner_id=owner_id, owner_wines={wine[0] for wine in owner_wines})
+
+
+def suggest_wines(db_conn: JdbcDbConn, prefix: str, limit: int) -> list[dict[str, Any]]:
+    """
+    Suggests wines from the catalogue whose name starts with a prefix. The suggestions are served from the wine name
+    index, which is loaded from the DB on the first lookup only.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param prefix: the start of the wine name
+    :param limit: maximum number of suggestions
+    :return: the matching wines, formatted to the WineSuggestionModel schema
+    """
+    WINE_NAME_INDEX.ensure_loaded(db_conn=db_conn)
+    return WINE_NAME_INDEX.suggest(prefix=prefix, limit=limit)
+
+
+def get_changes(db_conn: JdbcDbConn, owner_id: int, since: int, limit: int,
+                lag_seconds: float = 0) -> dict[str, Any]:
+    """
+    Retrieves the changes of an owner's data after a version of the change log. Only the latest change of each entity
+    is returned, upserts include the current data of the entity and deletes are returned as tombstones without data.
+    If tombstones after the requested version have been compacted, the client has to reload all its data instead.
 
+    The ids of the change log are assigned when a change is written, not when its transaction commits, so a change
+    can become visible after a change with a higher id. Only changes older than the lag are returned, such that the
+    returned version never passes a change that is still to be committed.
 
-def get_cellar_out_data(db_conn: JdbcDbConn, params: dict[str, Any] | None = None, where: str | None = None
-                        ) -> list[CellarOutModel.schema_json()]:
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of user/bottle owner
+    :param since: the last version of the change log the client has processed, 0 for all changes
+    :param limit: maximum number of changes to return, the remaining changes are returned by the next call
+    :param lag_seconds: minimum age of the returned changes, should exceed the duration of the longest transaction
+    :return: the changes, formatted to the ChangesModel schema
+    """
+    params = {"owner_id": owner_id, "since": since, "limit": limit}
+    pruned_through = db_conn.execute_query_select(query="SELECT pruned_through FROM cellar.changes_compaction "
+                                                        "WHERE id = 1")
+    if pruned_through and since < pruned_through[0][0]:
+        version = db_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes")[0][0]
+        # Continuing from the pruned id, as a restore leaves a gap between the last change and the pruned id
+        return {"version": max(version or since, pruned_through[0][0]), "full_resync": True, "has_more": False,
+                "changes": []}
+
+    settled = ""
+    if lag_seconds:
+        params["cutoff"] = datetime.datetime.now() - datetime.timedelta(seconds=lag_seconds)
+        settled = "AND changed_at <= %(cutoff)s "
+    changes = db_conn.execute_query_select(query="SELECT id AS version, entity, entity_id, operation "
+                                                 "FROM cellar.changes "
+                                                 f"WHERE owner_id = %(owner_id)s AND id > %(since)s {settled}"
+                                                 "  AND id IN (SELECT MAX(id) FROM cellar.changes "
+                                                 "             WHERE owner_id = %(owner_id)s AND id > %(since)s "
+                                                 "             GROUP BY entity, entity_id) "
+                                                 "ORDER BY id "
+                                                 "LIMIT %(limit)s",
+                                           params=params, get_fields=True)
+
+    # Retrieve the current data of the upserted entities with a single query per entity
+    data = {}
+    for entity in CHANGE_LOG_ENTITIES:
+        entity_ids = [change["entity_id"] for change in changes
+                      if change["entity"] == entity and change["operation"] == "upsert"]
+        if entity_ids:
+            data[entity] = {row["id"]: row for row in get_change_data(db_conn=db_conn, entity=entity,
+                                                                       entity_ids=entity_ids)}
+    changes = [{**change, "data": data.get(change["entity"], {}).get(change["entity_id"])} for change in changes]
+    return {"version": changes[-1]["version"] if changes else since, "full_resync": False,
+            "has_more": len(changes) == limit, "changes": changes}
+
+
+def get_change_data(db_conn: JdbcDbConn, entity: str, entity_ids: list[int]) -> list[dict[str, Any]]:
     """
-    Retrieves data from the cellar table. Additional where conditions and query parameters can be added to complete the
-    query
+    Retrieves the current data of changed entities, in the format the views return them.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param entity: the changed entity, one of the keys of CHANGE_LOG_ENTITIES
+    :param entity_ids: ids of the changed entities
+    :return: the rows of the entities, with their id in the 'id' field
+    """
+    params = {f"entity_id_{i}": entity_id for i, entity_id in enumerate(entity_ids)}
+    ids = ", ".join(f"%({param})s" for param in params)
+    if entity == "cellar":
+        rows = get_cellar_out_data(db_conn=db_conn, params=params, where=f"WHERE c.id IN ({ids})")
+        return [{"id": row["cellar_id"], **row} for row in rows]
+    columns = {"storage": "*", "rating": "*", "owner": "id, name, username, scopes, is_admin, enabled"}[entity]
+    table, _ = CHANGE_LOG_ENTITIES[entity]
+    return db_conn.execute_query_select(query=f"SELECT {columns} FROM cellar.{table} WHERE id IN ({ids})",
+                                        params=params, get_fields=True)
+
+
+def iter_cellar_out_data(db_conn: JdbcDbConn, owner_id: int,
+                         batch_size: int = 1000) -> Iterator[list[CellarOutModel.schema_json()]]:
+    """
+    Retrieves all entries of an owner from the cellar table in batches, such that the cellar can be streamed to a
+    client without loading it in memory at once.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of user/bottle owner
+    :param batch_size: number of entries per batch
+    :return: batches of entries from the cellar DB, formatted tot the CellarOutModel schema
+    """
+    yield from db_conn.execute_query_select_batches(query=f"{CELLAR_OUT_QUERY}"
+                                                          f"WHERE c.owner_id = %(owner_id)s "
+                                                          f"ORDER BY c.id",
+                                                    params={"owner_id": owner_id}, batch_size=batch_size)
+
+
+def get_cellar_out_data(db_conn: JdbcDbConn, params: dict[str, Any] | None = None, where: str | None = None,
+                        join: str | None = None) -> list[CellarOutModel.schema_json()]:
+    """
+    Retrieves data from the cellar table. Additional joins, where conditions and query parameters can be added to
+    complete the query
 
     :param db_conn: MariaDB instance to connect to the DB
     :param params: additional params to complete the query
     :param where: optional space for where statements to complement the query
+    :param join: optional space for join statements to complement the query
     :return: a list of entries from the cellar DB, formatted tot the CellarOutModel schema
     """
-    query = ("SELECT w.name AS name, w.vintage AS vintage, "
-             "       c.id AS cellar_id, "
-             "       c.storage_unit AS storage_unit, c.quantity AS quantity,"
-             "       c.bottle_size_cl AS bottle_size_cl,"
-             "       c.wine_id AS wine_id, c.owner_id AS owner_id,"
-             "       c.drink_from AS drink_from, c.drink_before AS drink_before "
-             "FROM cellar.cellar AS c "
-             "LEFT JOIN cellar.wines AS w "
-             "    ON w.id = c.wine_id ")
+    query = CELLAR_OUT_QUERY
+    if join:
+        query += join
     if where:
         query += where
     else:
         params = None
     return db_conn.execute_query_select(query=query, params=params, get_fields=True)
+
+
+def get_drinkable_bottles(db_conn: JdbcDbConn, owner_id: int, drink_year: int,
+                          beverage_type: str | None = None) -> list[dict[str, Any]]:
+    """
+    Retrieves the bottles of an owner that are within their drinking window in a year.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: db id of the owner
+    :param drink_year: the year in which the bottles should be drinkable
+    :param beverage_type: Optional type of the wines, e.g. 'red'
+    :return: a list of entries from the cellar DB, formatted to the CellarOutModel schema
+    """
+    params = {"drink_year": drink_year, "user_id": owner_id}
+    if drink_year <= datetime.date.today().year + DRINK_WINDOW_MAX_YEARS // 2:
+        # The drinkable years of each bottle are stored in the drink_window table, which turns the range conditions on
+        # the drinking window into a primary key lookup on owner and year
+        drink_window_join = 'JOIN cellar.drink_window AS dw ON dw.cellar_id = c.id '
+        where = 'WHERE dw.owner_id = %(user_id)s AND dw.drink_year = %(drink_year)s '
+    else:
+        # The table is cut off a number of years after a bottle was stored, years that far ahead are rarely requested
+        # and are looked up on the dates of the drinking window instead
+        drink_window_join = ''
+        params["year_start"] = datetime.date(drink_year, 1, 1)
+        where = ('WHERE c.owner_id = %(user_id)s '
+                 'AND c.drink_from <= %(year_start)s AND c.drink_before >= %(year_start)s ')
+    if beverage_type is not None:
+        params["bev_type"] = beverage_type
+        where += 'AND w.type = %(bev_type)s'
+    return get_cellar_out_data(db_conn=db_conn, params=params, where=where, join=drink_window_join)
+
+
+def get_dashboard_section(db_conn: JdbcDbConn, owner_id: int, section: str,
+                          recent_ratings: int = 10) -> list[dict[str, Any]]:
+    """
+    Retrieves one section of the dashboard of an owner.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: db id of the owner
+    :param section: one of DASHBOARD_SECTIONS
+    :param recent_ratings: number of most recent ratings in the 'recent_ratings' section
+    :return: the rows of the section
+    """
+    if section == "storages":
+        return db_conn.execute_query_select(query="SELECT * FROM cellar.storages WHERE owner_id = %(owner_id)s",
+                                            params={"owner_id": owner_id}, get_fields=True)
+    if section == "bottles":
+        return get_cellar_out_data(db_conn=db_conn, params={"user_id": owner_id},
+                                   where="WHERE c.owner_id = %(user_id)s")
+    if section == "recent_ratings":
+        return db_conn.execute_query_select(query="SELECT * FROM cellar.ratings WHERE rater_id = %(owner_id)s "
+                                                  "ORDER BY drinking_date DESC, id DESC LIMIT %(limit)s",
+                                            params={"owner_id": owner_id, "limit": recent_ratings}, get_fields=True)
+    if section == "drink_now":
+        return get_drinkable_bottles(db_conn=db_conn, owner_id=owner_id, drink_year=datetime.date.today().year)
+    raise ValueError(f"Unknown dashboard section: {section}")
+
+
+async def get_dashboard(connect: Callable[[], ContextManager[JdbcDbConn]], owner_id: int, sections: list[str],
+                        recent_ratings: int = 10, admission: DbAdmission | None = None) -> dict[str, Any]:
+    """
+    Retrieves the sections of the dashboard of an owner concurrently, each section on its own DB connection and in
+    its own worker thread, such that the response takes as long as the slowest section instead of all of them.
+
+    :param connect: factory of a context manager yielding a DB connection
+    :param owner_id: db id of the owner
+    :param sections: the requested sections, a subset of DASHBOARD_SECTIONS
+    :param recent_ratings: number of most recent ratings in the 'recent_ratings' section
+    :param admission: Optional admission controller of the DB connections, each section is admitted as a read
+    :return: the rows per section, None for the sections that were not requested, formatted to the DashboardModel
+             schema
+    """
+    def load(section: str) -> list[dict[str, Any]]:
+        with connect() as db_conn:
+            return get_dashboard_section(db_conn=db_conn, owner_id=owner_id, section=section,
+                                         recent_ratings=recent_ratings)
+
+    async def load_admitted(section: str) -> list[dict[str, Any]]:
+        # Every section checks out its own connection, so every section has to be admitted
+        if admission is None:
+            return await run_in_threadpool(load, section)
+        await admit(admission, "read")
+        try:
+            return await run_in_threadpool(load, section)
+        finally:
+            admission.release()
+
+    sections = list(dict.fromkeys(sections))
+    results = await asyncio.gather(*(load_admitted(section) for section in sections))
+    return {section: None for section in DASHBOARD_SECTIONS} | dict(zip(sections, results))
+
+
+def get_cellar_stats(db_conn: JdbcDbConn, owner_id: int) -> dict[str, Any]:
+    """
+    Aggregates the cellar of an owner in the DB, such that only the totals are sent over the wire instead of every
+    single bottle.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of user/bottle owner
+    :return: the aggregated cellar data, formatted to the CellarStatsModel schema
+    """
+    params = {"owner_id": owner_id, "today": datetime.date.today()}
+    totals = db_conn.execute_query_select(query="SELECT SUM(c.quantity) AS total_bottles, "
+                                                "       SUM(c.bottle_size_cl * c.quantity) AS total_cl, "
+                                                "       SUM(CASE WHEN c.drink_from <= %(today)s "
+                                                "                 AND c.drink_before >= %(today)s "
+                                                "            THEN c.quantity ELSE 0 END) AS drinkable_now "
+                                                "FROM cellar.cellar AS c "
+                                                "WHERE c.owner_id = %(owner_id)s",
+                                          params=params, get_fields=True)[0]
+    per_type = db_conn.execute_query_select(query="SELECT w.type, SUM(c.quantity) "
+                                                  "FROM cellar.cellar AS c "
+                                                  "JOIN cellar.wines AS w ON w.id = c.wine_id "
+                                                  "WHERE c.owner_id = %(owner_id)s "
+                                                  "GROUP BY w.type",
+                                            params=params)
+    per_vintage = db_conn.execute_query_select(query="SELECT w.vintage, SUM(c.quantity) "
+                                                     "FROM cellar.cellar AS c "
+                                                     "JOIN cellar.wines AS w ON w.id = c.wine_id "
+                                                     "WHERE c.owner_id = %(owner_id)s "
+                                                     "GROUP BY w.vintage",
+                                               params=params)
+    per_storage_unit = db_conn.execute_query_select(query="SELECT c.storage_unit, SUM(c.quantity) "
+                                                          "FROM cellar.cellar AS c "
+                                                          "WHERE c.owner_id = %(owner_id)s "
+                                                          "GROUP BY c.storage_unit",
+                                                    params=params)
+    return {"total_bottles": totals["total_bottles"] or 0,
+            "total_litres": (totals["total_cl"] or 0) / 100,
+            "drinkable_now": totals["drinkable_now"] or 0,
+            "bottles_per_type": {bev_type: bottles for bev_type, bottles in per_type},
+            "bottles_per_vintage": {vintage: bottles for vintage, bottles in per_vintage},
+            "bottles_per_storage_unit": {storage_unit: bottles for storage_unit, bottles in per_storage_unit}}
+
+
+def get_drink_window_forecast(db_conn: JdbcDbConn, owner_id: int, from_year: int, to_year: int) -> list[dict[str, int]]:
+    """
+    Forecasts, per year, how many bottles of an owner enter, are in and leave their drinking window. The cellar is
+    loaded once and all years are computed with prefix sums over the window boundaries instead of looping over the
+    bottles. Similar to the '/drink_in_window' endpoint, a bottle counts as drinkable in a year when its window
+    covers the first of January of that year.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of user/bottle owner
+    :param from_year: first year of the forecast
+    :param to_year: last year of the forecast (inclusive)
+    :return: one entry per year, formatted to the DrinkWindowForecastModel schema
+    """
+    rows = db_conn.execute_query_select(query="SELECT drink_from, drink_before, quantity FROM cellar.cellar "
+                                              "WHERE owner_id = %(owner_id)s",
+                                        params={"owner_id": owner_id})
+    years = pl.DataFrame({"year": pl.int_range(from_year, to_year + 1, eager=True)})
+    if not rows:
+        return years.with_columns(entering=0, in_window=0, leaving=0).to_dicts()
+
+    # Dates are parsed from their ISO format such that both date objects and date strings are supported
+    bottles = (pl.DataFrame(rows, schema=["drink_from", "drink_before", "quantity"], orient="row")
+               .drop_nulls()
+               .with_columns(pl.col("drink_from", "drink_before").cast(pl.String).str.to_date(),
+                             pl.col("quantity").cast(pl.Int64))
+               .select(first=(pl.col("drink_from").dt.year()
+                              + (pl.col("drink_from").dt.ordinal_day() > 1).cast(pl.Int32)),
+                       last=pl.col("drink_before").dt.year(),
+                       quantity=pl.col("quantity"))
+               .filter(pl.col("first") <= pl.col("last")))
+
+    def per_year(year_col: pl.Expr, name: str) -> pl.DataFrame:
+        return (bottles.group_by(year_col.cast(pl.Int64).alias("year"))
+                .agg(pl.col("quantity").sum().alias(name)))
+
+    # Windows that started before the forecast are counted in its first year, such that the running totals of
+    # started and ended windows are correct from the first forecasted year onwards.
+    forecast = (years
+                .join(per_year(pl.col("first"), "entering"), on="year", how="left")
+                .join(per_year(pl.col("last"), "leaving"), on="year", how="left")
+                .join(per_year(pl.col("first").clip(lower_bound=from_year), "started"), on="year", how="left")
+                .join(per_year((pl.col("last") + 1).clip(lower_bound=from_year), "ended"), on="year", how="left")
+                .fill_null(0)
+                .sort("year")
+                .with_columns(in_window=pl.col("started").cum_sum() - pl.col("ended").cum_sum()))
+    return forecast.select("year", "entering", "in_window", "leaving").to_dicts()
+
+
+def get_owner_summary(db_conn: JdbcDbConn, owner_id: int) -> dict[str, Any]:
+    """
+    Retrieves the precomputed summary of an owner's cellar. Both summary tables are read by their primary key, such
+    that the costs do not grow with the size of the cellar.
+
+    :param db_conn: MariaDB instance to connect to the DB
+    :param owner_id: id of user/bottle owner
+    :return: the summary of the owner, formatted to the OwnerSummaryModel schema
+    """
+    totals = db_conn.execute_query_select(query="SELECT bottles, volume_cl FROM cellar.owner_summary "
+                                                "WHERE owner_id = %(owner_id)s",
+                                          params={"owner_id": owner_id}, get_fields=True)
+    per_type_vintage = db_conn.execute_query_select(query="SELECT type, vintage, bottles, volume_cl "
+                                                          "FROM cellar.owner_type_vintage_summary "
+                                                          "WHERE owner_id = %(owner_id)s AND bottles > 0",
+                                                    params={"owner_id": owner_id}, get_fields=True)
+    totals = totals[0] if totals else {"bottles": 0, "volume_cl": 0}
+    return {"bottles": totals["bottles"], "litres": totals["volume_cl"] / 100,
+            "per_type_vintage": [{"type": entry["type"], "vintage": entry["vintage"], "bottles": entry["bottles"],
+                                  "litres": entry["volume_cl"] / 100} for entry in per_type_vintage]}
@@ -1,23 +1,44 @@
-from typing import Annotated
+import os
+import tempfile
+import contextlib
+
+from typing import Annotated, Literal
 
 from fastapi import HTTPException, status
-from fastapi import APIRouter, Depends, Security, Query
+from fastapi import APIRouter, Depends, Security, Query, BackgroundTasks, UploadFile
 
 from .cellar_funcs import (get_storage_id, verify_storage_exists_for_user, verify_empty_storage_unit, verify_wine_in_db,
                            add_wine_to_db, get_bottle_id, add_bottle_to_cellar, wine_in_db, add_rating_to_db,
-                           update_quantity_in_cellar)
+                           update_quantity_in_cellar, change_log_query)
 
 from db.jdbc_interface import JdbcDbConn
 
-from ..constants import DB_CONN
+from ..constants import (DB_CONN, STATS_CACHE, STORAGE_CACHE, OWNER_VERSIONS, EVENT_BROADCASTER, IMPORT_JOBS,
+                         IMPORT_CHUNK_SIZE)
+from ..imports import run_import_job, IMPORT_FORMATS
+from ..dependencies import DbConnRoute, run_admitted
 from ..authentication import get_current_active_user
-from ..models import OwnerModel, StorageInModel, CellarInModel, RatingModel, ConsumedBottleModel
+from ..models import OwnerModel, StorageInModel, CellarInModel, RatingModel, ConsumedBottleModel, ImportJobModel
 
 
 router = APIRouter(prefix="/cellar",
                    tags=["cellar"],
                    dependencies=[Security(get_current_active_user, scopes=['CELLAR:READ', 'CELLAR:WRITE'])],
-                   responses={404: {"description": "Not Found"}})
+                   responses={404: {"description": "Not Found"}},
+                   route_class=DbConnRoute)
+
+
+def owner_data_changed(owner_id: int, event: str) -> None:
+    """
+    Drops the cached views of an owner, bumps the version of the owner's data and pushes the change to the owner's
+    connected clients, to be called after every committed write.
+
+    :param owner_id: id of the owner that wrote to the DB
+    :param event: name of the change, sent as the type of the pushed event
+    """
+    STATS_CACHE.invalidate(owner_id)
+    version = OWNER_VERSIONS.bump(owner_id)
+    EVENT_BROADCASTER.publish(owner_id=owner_id, event={"event": event, "version": version})
 
 
 @router.post("/storages/add", dependencies=[Security(get_current_active_user)])
@@ -29,10 +50,14 @@ async def post_storage_unit(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
 
     Required scope(s): CELLAR:READ, CELLAR:WRITE
     """
-    db_conn.execute_query(("INSERT INTO cellar.storages (owner_id, location, description) "
-                           "VALUES (%(owner_id)s, %(location)s, %(description)s)"),
-                          params={"owner_id": current_user.id, "location": storage_data.location,
-                                  "description": storage_data.description})
+    params = {"owner_id": current_user.id, "location": storage_data.location, "description": storage_data.description}
+    storage_conditions = "owner_id = %(owner_id)s AND location = %(location)s AND description = %(description)s"
+    queries = ["INSERT INTO cellar.storages (owner_id, location, description) "
+               "VALUES (%(owner_id)s, %(location)s, %(description)s)",
+               change_log_query(entity="storage", operation="upsert", conditions=storage_conditions)]
+    db_conn.execute_query(queries, params=len(queries) * [params])
+    owner_data_changed(owner_id=current_user.id, event="storage_added")
+    STORAGE_CACHE.invalidate(current_user.id)
 
     return "Storage unit has successfully been added to the DB"
 
@@ -55,11 +80,13 @@ async def delete_storage_unit(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
     # Remove the storage unit from DB if it is empty.
     # Note that `verify_empty_storage_unit` raises and error if the storage unit is not empty
     if await verify_empty_storage_unit(db_conn=db_conn, storage_id=storage_id[0]):
-        db_conn.execute_query(("DELETE FROM cellar.storages "
-                               "WHERE location = %(location)s "
-                               "  AND description = %(description)s "
-                               "  AND owner_id = %(owner_id)s"),
-                              params={"location": location, "description": description, "owner_id": current_user.id})
+        params = {"location": location, "description": description, "owner_id": current_user.id}
+        storage_conditions = "location = %(location)s AND description = %(description)s AND owner_id = %(owner_id)s"
+        queries = [change_log_query(entity="storage", operation="delete", conditions=storage_conditions),
+                   f"DELETE FROM cellar.storages WHERE {storage_conditions}"]
+        db_conn.execute_query(queries, params=len(queries) * [params])
+        owner_data_changed(owner_id=current_user.id, event="storage_deleted")
+        STORAGE_CACHE.invalidate(current_user.id)
 
     return "Storage unit has successfully been removed from the DB"
 
@@ -90,6 +117,7 @@ async def add_wine_to_cellar(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
 
     # Insert all info into the cellar table
     await add_bottle_to_cellar(db_conn=db_conn, wine_id=wine_id, owner_id=current_user.id, wine_data=wine_data)
+    owner_data_changed(owner_id=current_user.id, event="bottles_added")
 
     return "Bottle has successfully been added to the DB"
 
@@ -111,6 +139,7 @@ async def add_a_rating(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
                             detail=f"Wine with wine_id: {wine_id} is not found in the DB. Make sure to use an "
                                    f"existing wine ID in order to rate the correct wine")
     await add_rating_to_db(db_conn=db_conn, user_id=current_user.id, wine_id=wine_id, rating=rating)
+    owner_data_changed(owner_id=current_user.id, event="rating_added")
     return "Rating has successfully been added to the DB"
 
 
@@ -136,6 +165,7 @@ async def remove_consumed_from_stock(db_conn: Annotated[JdbcDbConn, Depends(DB_C
         await add_rating_to_db(db_conn=db_conn, user_id=current_user.id, wine_id=bottle_data.wine_id, rating=rating)
 
     await update_quantity_in_cellar(db_conn=db_conn, wine_id=bottle_data.wine_id, bottle_data=bottle_data, add=False)
+    owner_data_changed(owner_id=current_user.id, event="bottles_consumed")
     return "Consumed bottle is updated in the DB"
 
 
@@ -150,9 +180,64 @@ async def move_bottle_to_other_storage(db_conn: Annotated[JdbcDbConn, Depends(DB
     Required scope(s): CELLAR:READ, CELLAR:WRITE
     """
     if await verify_storage_exists_for_user(db_conn=db_conn, storage_id=new_storage_unit, user_id=current_user.id):
-        db_conn.execute_query("UPDATE cellar.cellar SET storage_unit = %(storage_unit)s WHERE id = %(cellar_id)s",
-                              params={"storage_unit": new_storage_unit, "cellar_id": cellar_id})
+        params = {"storage_unit": new_storage_unit, "cellar_id": cellar_id}
+        queries = ["UPDATE cellar.cellar SET storage_unit = %(storage_unit)s WHERE id = %(cellar_id)s",
+                   change_log_query(entity="cellar", operation="upsert", conditions="id = %(cellar_id)s")]
+        db_conn.execute_query(queries, params=len(queries) * [params])
+        owner_data_changed(owner_id=current_user.id, event="bottle_moved")
         return f"Bottle has successfully been transferred to storage unit {new_storage_unit}"
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Storage unit is not found for your particular user.")
+
+
+@router.post("/import", response_model=ImportJobModel, status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[Security(get_current_active_user)])
+async def import_bottles_file(background_tasks: BackgroundTasks,
+                              current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                              file: UploadFile,
+                              file_format: Annotated[Literal["csv", "parquet"] | None,
+                                                     Query(alias="format")] = None) -> ImportJobModel:
+    """
+    Import bottles to your cellar from a CSV or Parquet file. The file has a row per bottle entry with the columns
+    name, vintage, grapes, type, drink_from, drink_before, alcohol_vol_perc, country, region, producer,
+    additional_info, quality_signature, storage_unit, bottle_size_cl and quantity, of which name, type, drink_before,
+    country, storage_unit and quantity are required. Dates are formatted as YYYY-MM-DD. The format is derived from the
+    file extension unless it is provided.
+
+    The file is imported in the background. Track the progress and the rows that could not be imported with the
+    returned job id on the '/import/{job_id}' endpoint.
+
+    Required scope(s): CELLAR:READ, CELLAR:WRITE
+    """
+    file_format = file_format or os.path.splitext(file.filename or "")[1].lstrip(".").lower()
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unsupported import format. Use one of: {', '.join(IMPORT_FORMATS)}")
+
+    # Keep a copy of the upload for the job, as the uploaded file is closed once the request is handled
+    with tempfile.NamedTemporaryFile(prefix="cellar_import_", suffix=f".{file_format}", delete=False) as upload:
+        while chunk := await file.read(1024 * 1024):
+            upload.write(chunk)
+    job = IMPORT_JOBS.create(owner_id=current_user.id, file_name=file.filename)
+    # The job uses a pooled connection, so it passes the admission controller as a write
+    background_tasks.add_task(run_admitted, DB_CONN.admission, "write", run_import_job, jobs=IMPORT_JOBS,
+                              job_id=job["job_id"], owner_id=current_user.id, file_path=upload.name,
+                              file_format=file_format, connect=contextlib.contextmanager(DB_CONN.__call__),
+                              chunk_size=IMPORT_CHUNK_SIZE,
+                              on_change=lambda: owner_data_changed(owner_id=current_user.id, event="bottles_imported"))
+    return job
+
+
+@router.get("/import/{job_id}", response_model=ImportJobModel, dependencies=[Security(get_current_active_user)])
+async def get_import_job(current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                         job_id: str) -> ImportJobModel:
+    """
+    Get the progress of an import of your bottles and the rows that could not be imported.
+
+    Required scope(s): CELLAR:READ, CELLAR:WRITE
+    """
+    job = IMPORT_JOBS.get(job_id=job_id, owner_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Import job {job_id} is not found")
+    return job
@@ -1,21 +1,99 @@
-from typing import Annotated
+import contextlib
+
+from typing import Annotated, Any, Literal
 from datetime import datetime
 
 from fastapi import HTTPException, status
-from fastapi import APIRouter, Depends, Security
+from fastapi import APIRouter, Depends, Security, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi_pagination import Page, paginate
 
 from db.jdbc_interface import JdbcDbConn
 
-from .cellar_funcs import wine_in_db, get_cellar_out_data
-from ..constants import DB_CONN
+from .cellar_funcs import (wine_in_db, get_cellar_out_data, get_cellar_stats, get_drink_window_forecast,
+                           get_owner_summary, search_wines, suggest_wines, get_changes,
+                           iter_cellar_out_data, get_wine_ratings, get_drinkable_bottles, get_dashboard,
+                           CELLAR_EXPORT_SCHEMA, STORAGE_OUT_SCHEMA, RATING_OUT_SCHEMA, DASHBOARD_SECTIONS)
+from ..constants import (DB_CONN, STATS_CACHE, OWNER_VERSIONS, DRINK_WINDOW_FORECAST_YEARS,
+                         DRINK_WINDOW_FORECAST_MAX_YEARS, CHANGE_LOG_MAX_PAGE_SIZE, EVENT_BROADCASTER,
+                         CHANGE_LOG_SAFETY_LAG_SECONDS, EVENTS_HEARTBEAT_SECONDS, EXPORT_BATCH_SIZE,
+                         RATINGS_MAX_WINE_IDS, DASHBOARD_RECENT_RATINGS)
+from ..cache import seconds_until_midnight
+from ..events import event_stream
+from ..wine_info import parse_grapes
+from ..exports import export_chunks, EXPORT_MEDIA_TYPES
+from ..response_formats import (negotiate_media_type, binary_response, TrustedJSONResponse, JSON_MEDIA_TYPE,
+                               BINARY_RESPONSES)
+from ..dependencies import DbConnRoute
 from ..authentication import get_current_active_user
-from ..models import OwnerModel, StorageOutModel, RatingInDbModel, CellarOutModel
+from ..models import (OwnerModel, StorageOutModel, RatingInDbModel, CellarOutModel, CellarStatsModel,
+                      DrinkWindowForecastModel, OwnerSummaryModel, SearchResultModel, WineSuggestionModel,
+                      ChangesModel, WineRatingsModel, DashboardModel)
 
 
 router = APIRouter(prefix="/cellar_views",
                    tags=["cellar_views"],
                    dependencies=[Security(get_current_active_user, scopes=['CELLAR:READ'])],
-                   responses={404: {"description": "Not Found"}})
+                   responses={404: {"description": "Not Found"}},
+                   route_class=DbConnRoute)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Verifies whether an If-None-Match header matches an ETag, using the weak comparison of RFC 9110.
+
+    :param if_none_match: value of the If-None-Match header
+    :param etag: the current ETag
+    :return: True if the client holds the current version
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+async def owner_etag(request: Request, response: Response,
+                     current_user: Annotated[OwnerModel, Depends(get_current_active_user)]) -> None:
+    """
+    Dependency tagging a response with the version of the owner's cellar data. Requests holding the current version in
+    their If-None-Match header are answered with 304 Not Modified before the endpoint queries the DB.
+    """
+    etag = f'"{OWNER_VERSIONS.get(current_user.id)}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+
+def rows_response(rows: list[dict[str, Any]], response: Response) -> TrustedJSONResponse:
+    """
+    Serves the rows of a list endpoint as JSON straight from the DB rows, skipping the validation of each row into the
+    response model. Only use it for rows selected with the columns of the response model.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :param response: the response of the endpoint, its headers, e.g. the ETag, are copied
+    :return: the JSON response
+    """
+    return TrustedJSONResponse(content=rows, headers=dict(response.headers))
+
+
+def negotiated_response(rows: list[dict[str, Any]], accept: str | None, response: Response,
+                        schema: dict) -> Response:
+    """
+    Serves the rows of a list endpoint in the media type requested in the Accept header. All media types are
+    serialised straight from the rows, skipping the validation of each row into the response model.
+
+    :param rows: the rows, each row mapping the columns to the values
+    :param accept: value of the Accept header
+    :param response: the response of the endpoint, its headers are copied
+    :param schema: the column types of the rows, used for the Arrow schema
+    :return: the serialised response
+    """
+    response.headers["Vary"] = "Accept"
+    media_type = negotiate_media_type(accept)
+    if media_type == JSON_MEDIA_TYPE:
+        return rows_response(rows=rows, response=response)
+    return binary_response(rows=rows, media_type=media_type, schema=schema, headers=dict(response.headers))
 
 
 @router.get("/owners/get_your_id", dependencies=[Security(get_current_active_user)])
@@ -28,24 +106,29 @@ async def get_owners(current_user: Annotated[OwnerModel, Depends(get_current_act
     return current_user.id
 
 
-@router.get("/storages/get", response_model=list[StorageOutModel], dependencies=[Security(get_current_active_user)])
+@router.get("/storages/get", response_model=list[StorageOutModel], responses=BINARY_RESPONSES,
+            dependencies=[Security(get_current_active_user), Depends(owner_etag)])
 async def get_storage_units(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
-                            current_user: Annotated[OwnerModel, Depends(get_current_active_user)]
-                            ) -> list[StorageOutModel]:
+                            current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                            response: Response,
+                            accept: Annotated[str | None, Header()] = None) -> list[StorageOutModel]:
     """
-    Retrieve all your storage units registered within the DB.
+    Retrieve all your storage units registered within the DB. Request 'application/vnd.apache.arrow.stream' or
+    'application/msgpack' in the Accept header for a binary response.
 
     Required scope(s): CELLAR:READ
     """
-    return db_conn.execute_query_select(query="SELECT * FROM cellar.storages WHERE owner_id = %(owner_id)s",
-                                        params={"owner_id": current_user.id},
-                                        get_fields=True)
+    storages = db_conn.execute_query_select(query="SELECT * FROM cellar.storages WHERE owner_id = %(owner_id)s",
+                                            params={"owner_id": current_user.id},
+                                            get_fields=True)
+    return negotiated_response(rows=storages, accept=accept, response=response, schema=STORAGE_OUT_SCHEMA)
 
 
 @router.get("/wine_in_cellar/get_wine_ratings", response_model=list[RatingInDbModel],
             dependencies=[Security(get_current_active_user)])
 async def get_wine_rating(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
                           current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                          response: Response,
                           wine_id: int,
                           only_your_ratings: bool = True) -> list[RatingInDbModel]:
     """
@@ -65,61 +148,118 @@ async def get_wine_rating(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
         # Note that an f-string is used for the rater_id since sql-injection risks are mitigated due to the user id
         # originating from the OwnerModel and thus enforcing the value to be an integer
         query = f"{query} AND rater_id = '{current_user.id}'"
-    return db_conn.execute_query_select(query=query, params={"wine_id": wine_id}, get_fields=True)
+    ratings = db_conn.execute_query_select(query=query, params={"wine_id": wine_id}, get_fields=True)
+    return rows_response(rows=ratings, response=response)
 
 
-@router.get("/wine_in_cellar/get_your_ratings", response_model=list[RatingInDbModel],
+@router.get("/wine_in_cellar/ratings", response_model=WineRatingsModel,
             dependencies=[Security(get_current_active_user)])
+async def get_ratings_of_wines(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                               current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                               wine_ids: Annotated[str, Query(regex=r"^\d+(,\d+)*$",
+                                                              description="Comma separated wine ids, e.g. 1,2,3")],
+                               only_your_ratings: bool = True) -> WineRatingsModel:
+    """
+    Retrieves the ratings of multiple wines/bottles at once, e.g. to render all ratings of a cellar page with a single
+    request. The ratings are grouped per wine id, the wine ids that are not in the DB are reported separately. Make
+    sure to set the 'only_your_ratings' to True if you only want to see your ratings on the wines. If set to False, all
+    ratings will be given.
+
+    Required scope(s): CELLAR:READ
+    """
+    ids = [int(wine_id) for wine_id in wine_ids.split(",")]
+    if len(set(ids)) > RATINGS_MAX_WINE_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {RATINGS_MAX_WINE_IDS} wine ids can be requested at once.")
+    return get_wine_ratings(db_conn=db_conn, wine_ids=ids, rater_id=current_user.id if only_your_ratings else None)
+
+
+@router.get("/wine_in_cellar/get_your_ratings", response_model=list[RatingInDbModel], responses=BINARY_RESPONSES,
+            dependencies=[Security(get_current_active_user), Depends(owner_etag)])
 async def get_your_ratings(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
-                           current_user: Annotated[OwnerModel, Depends(get_current_active_user)]
-                           ) -> list[RatingInDbModel]:
+                           current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                           response: Response,
+                           accept: Annotated[str | None, Header()] = None) -> list[RatingInDbModel]:
     """
-    Retrieves all your ratings for all wines/bottles.
+    Retrieves all your ratings for all wines/bottles. Request 'application/vnd.apache.arrow.stream' or
+    'application/msgpack' in the Accept header for a binary response.
 
     Required scope(s): CELLAR:READ
     """
     # Retrieve the ratings from the DB
-    return db_conn.execute_query_select(query="SELECT * FROM cellar.ratings WHERE rater_id = %(rater_id)s",
-                                        params={"rater_id": current_user.id}, get_fields=True)
+    ratings = db_conn.execute_query_select(query="SELECT * FROM cellar.ratings WHERE rater_id = %(rater_id)s",
+                                           params={"rater_id": current_user.id}, get_fields=True)
+    return negotiated_response(rows=ratings, accept=accept, response=response, schema=RATING_OUT_SCHEMA)
 
 
-@router.get("/wine_in_cellar/get_your_bottles", response_model=list[CellarOutModel],
-            dependencies=[Security(get_current_active_user)])
+@router.get("/wine_in_cellar/get_your_bottles", response_model=list[CellarOutModel], responses=BINARY_RESPONSES,
+            dependencies=[Security(get_current_active_user), Depends(owner_etag)])
 async def get_your_bottles(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
                            current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
-                           storage_unit: int | None = None) -> list[CellarOutModel]:
+                           response: Response,
+                           storage_unit: int | None = None,
+                           accept: Annotated[str | None, Header()] = None) -> list[CellarOutModel]:
     """
     Get an overview of all your bottles stored in your cellar. If the 'storage_unit' id is specified, only the bottles
-    in that specific storage unit are shown.
+    in that specific storage unit are shown. Request 'application/vnd.apache.arrow.stream' or 'application/msgpack' in
+    the Accept header for a binary response.
 
     Required scope(s): CELLAR:READ
     """
     if storage_unit is None:
-        return get_cellar_out_data(db_conn=db_conn, params={"user_id": current_user.id},
-                                   where="WHERE c.owner_id = %(user_id)s")
+        bottles = get_cellar_out_data(db_conn=db_conn, params={"user_id": current_user.id},
+                                      where="WHERE c.owner_id = %(user_id)s")
     else:
-        return get_cellar_out_data(db_conn=db_conn, params={"user_id": current_user.id, "storage_unit": storage_unit},
-                                   where="WHERE c.owner_id = %(user_id)s AND storage_unit = %(storage_unit)s")
+        bottles = get_cellar_out_data(db_conn=db_conn,
+                                      params={"user_id": current_user.id, "storage_unit": storage_unit},
+                                      where="WHERE c.owner_id = %(user_id)s AND storage_unit = %(storage_unit)s")
+    return negotiated_response(rows=bottles, accept=accept, response=response, schema=CELLAR_EXPORT_SCHEMA)
 
 
-@router.get("/wine_in_cellar/get_stock_on_bottle",  response_model=list[CellarOutModel],
+@router.get("/export", response_class=StreamingResponse,
             dependencies=[Security(get_current_active_user)])
+async def export_your_bottles(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                              current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                              export_format: Annotated[Literal["csv", "ndjson", "parquet"],
+                                                       Query(alias="format")] = "csv",
+                              gzip: bool = False) -> StreamingResponse:
+    """
+    Export all your bottles as a CSV, newline delimited JSON or Parquet file, e.g. for backups or spreadsheets. The
+    bottles are streamed from the DB in batches, so exports of large cellars start immediately. Set 'gzip' to compress
+    the download.
+
+    Required scope(s): CELLAR:READ
+    """
+    batches = iter_cellar_out_data(db_conn=db_conn, owner_id=current_user.id, batch_size=EXPORT_BATCH_SIZE)
+    headers = {"Content-Disposition": f'attachment; filename="cellar.{export_format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(export_chunks(batches=batches, export_format=export_format, schema=CELLAR_EXPORT_SCHEMA,
+                                           gzip=gzip),
+                             media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers)
+
+
+@router.get("/wine_in_cellar/get_stock_on_bottle",  response_model=list[CellarOutModel],
+            dependencies=[Security(get_current_active_user), Depends(owner_etag)])
 async def get_stock_on_bottle(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
                               current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                              response: Response,
                               wine_id: int) -> list[CellarOutModel]:
     """
     Get an overview of all your bottles of a specific wine stored in your cellar.
 
     Required scope(s): CELLAR:READ
     """
-    return get_cellar_out_data(db_conn=db_conn, params={"user_id": current_user.id, "wine_id": wine_id},
-                               where="WHERE c.owner_id = %(user_id)s AND wine_id = %(wine_id)s")
+    bottles = get_cellar_out_data(db_conn=db_conn, params={"user_id": current_user.id, "wine_id": wine_id},
+                                  where="WHERE c.owner_id = %(user_id)s AND wine_id = %(wine_id)s")
+    return rows_response(rows=bottles, response=response)
 
 
 @router.get("/wine_in_cellar/drink_in_window", response_model=list[CellarOutModel],
             dependencies=[Security(get_current_active_user)])
 async def get_bottle_open_window(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
                                  current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                                 response: Response,
                                  drink_year: int | None = None,
                                  beverage_type: str | None = None) -> list[CellarOutModel]:
     """
@@ -128,13 +268,181 @@ async def get_bottle_open_window(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)
 
     Required scope(s): CELLAR:READ
     """
-    drink_when_cond = 'c.drink_from <= %(drink_year)s AND c.drink_before >= %(drink_year)s'
-    owner_cond = 'c.owner_id = %(user_id)s'
     drink_year = datetime.now().year if drink_year is None else drink_year
+    bottles = get_drinkable_bottles(db_conn=db_conn, owner_id=current_user.id, drink_year=drink_year,
+                                    beverage_type=beverage_type)
+    return rows_response(rows=bottles, response=response)
+
+
+@router.get("/wine_in_cellar/filter", response_model=list[CellarOutModel],
+            dependencies=[Security(get_current_active_user), Depends(owner_etag)])
+async def filter_your_bottles(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                              current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                              response: Response,
+                              country: str | None = None,
+                              region: str | None = None,
+                              producer: str | None = None,
+                              grape: Annotated[list[str] | None, Query()] = None) -> list[CellarOutModel]:
+    """
+    Retrieve all your bottles from a specific country, region and/or producer. The bottles can be trimmed further to
+    the bottles that contain all specified grapes, e.g. ?region=Piedmont&grape=Nebbiolo.
+
+    Required scope(s): CELLAR:READ
+    """
+    params = {"user_id": current_user.id}
+    where = 'WHERE c.owner_id = %(user_id)s '
+    for column, value in (("country", country), ("region", region), ("producer", producer)):
+        if value is not None:
+            params[column] = value
+            where += f'AND w.{column} = %({column})s '
+
+    # Grapes are stored lower case in the wine_grapes table, one row per wine and grape
+    join = ''
+    for i, grape_name in enumerate(parse_grapes(",".join(grape or []))):
+        params[f"grape_{i}"] = grape_name
+        join += f'JOIN cellar.wine_grapes AS wg_{i} ON wg_{i}.wine_id = c.wine_id AND wg_{i}.grape = %(grape_{i})s '
+    bottles = get_cellar_out_data(db_conn=db_conn, params=params, where=where, join=join)
+    return rows_response(rows=bottles, response=response)
+
+
+@router.get("/dashboard", response_model=DashboardModel, dependencies=[Security(get_current_active_user)])
+async def get_your_dashboard(current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                             sections: Annotated[list[Literal["storages", "bottles", "recent_ratings", "drink_now"]]
+                                                 | None, Query()] = None,
+                             recent_ratings: Annotated[int, Query(gt=0, le=100)] = DASHBOARD_RECENT_RATINGS
+                             ) -> DashboardModel:
+    """
+    Get everything the home screen shows in a single request: your storage units, your bottles, your most recent
+    ratings and the bottles that are drinkable this year. All sections are returned by default, request a subset with
+    e.g. ?sections=storages&sections=drink_now; the other sections are null. The sections are retrieved concurrently.
 
-    params = {"drink_year": datetime(year=drink_year, month=1, day=1), "user_id": current_user.id}
-    where = f'WHERE {drink_when_cond} AND {owner_cond} '
-    if beverage_type is not None:
-        params["bev_type"] = beverage_type
-        where += f'AND w.type = %(bev_type)s'
-    return get_cellar_out_data(db_conn=db_conn, params=params, where=where)
+    Required scope(s): CELLAR:READ
+    """
+    dashboard = await get_dashboard(connect=contextlib.contextmanager(DB_CONN.__call__), owner_id=current_user.id,
+                                    sections=sections or list(DASHBOARD_SECTIONS), recent_ratings=recent_ratings,
+                                    admission=DB_CONN.admission)
+    return TrustedJSONResponse(content=dashboard)
+
+
+@router.get("/search", response_model=Page[SearchResultModel], dependencies=[Security(get_current_active_user)])
+async def search(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                 current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                 q: Annotated[str, Query(min_length=1, max_length=200)]) -> Page[SearchResultModel]:
+    """
+    Search the wines in your cellar and the wines you rated. All search terms have to occur in the name, grapes,
+    geographic info or appellation of a wine, or in your tasting notes of it. The most relevant wines are returned
+    first.
+
+    Required scope(s): CELLAR:READ
+    """
+    return paginate(search_wines(db_conn=db_conn, owner_id=current_user.id, query=q))
+
+
+@router.get("/wines/autocomplete", response_model=list[WineSuggestionModel],
+            dependencies=[Security(get_current_active_user)])
+async def autocomplete_wine_name(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                                 prefix: Annotated[str, Query(min_length=1, max_length=200)],
+                                 limit: Annotated[int, Query(gt=0, le=50)] = 10) -> list[WineSuggestionModel]:
+    """
+    Get suggestions of wines in the DB whose name starts with the provided prefix, ignoring case and accents. Use them
+    to add bottles of an existing wine instead of registering the same wine under a slightly different name.
+
+    Required scope(s): CELLAR:READ
+    """
+    return suggest_wines(db_conn=db_conn, prefix=prefix, limit=limit)
+
+
+@router.get("/stats", response_model=CellarStatsModel, dependencies=[Security(get_current_active_user)])
+async def get_stats(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                    current_user: Annotated[OwnerModel, Depends(get_current_active_user)]) -> CellarStatsModel:
+    """
+    Get the totals of your cellar: bottles per type, vintage and storage unit, the total volume in litres and the
+    number of bottles that are drinkable today. The result is cached until you make changes to your cellar or the day
+    ends.
+
+    Required scope(s): CELLAR:READ
+    """
+    stats = STATS_CACHE.get(current_user.id)
+    if stats is None:
+        # Taken before the stats are computed, such that stats of a day that just ended are not kept for another day
+        ttl_seconds = seconds_until_midnight()
+        stats = get_cellar_stats(db_conn=db_conn, owner_id=current_user.id)
+        STATS_CACHE.set(current_user.id, stats, ttl_seconds=ttl_seconds)
+    return stats
+
+
+@router.get("/drink_window_forecast", response_model=list[DrinkWindowForecastModel],
+            dependencies=[Security(get_current_active_user)])
+async def forecast_drink_window(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                                current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                                from_year: Annotated[int | None, Query(alias="from", gt=0, lt=3000)] = None,
+                                to_year: Annotated[int | None, Query(alias="to", gt=0, lt=3000)] = None
+                                ) -> list[DrinkWindowForecastModel]:
+    """
+    Forecast for each year in a range how many of your bottles enter, are in and leave their drinking window. The range
+    starts at the current year and spans 20 years by default.
+
+    Required scope(s): CELLAR:READ
+    """
+    from_year = datetime.now().year if from_year is None else from_year
+    to_year = from_year + DRINK_WINDOW_FORECAST_YEARS - 1 if to_year is None else to_year
+    if not 0 <= to_year - from_year < DRINK_WINDOW_FORECAST_MAX_YEARS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"The 'to' year should not precede the 'from' year and the forecast can span at "
+                                   f"most {DRINK_WINDOW_FORECAST_MAX_YEARS} years.")
+    return get_drink_window_forecast(db_conn=db_conn, owner_id=current_user.id, from_year=from_year, to_year=to_year)
+
+
+@router.get("/summary", response_model=OwnerSummaryModel,
+            dependencies=[Security(get_current_active_user), Depends(owner_etag)])
+async def get_summary(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                      current_user: Annotated[OwnerModel, Depends(get_current_active_user)]) -> OwnerSummaryModel:
+    """
+    Get the summary of your cellar: the total number of bottles and litres, and a breakdown per type and vintage. The
+    summary is maintained on every change to your cellar, so it is not recomputed on request.
+
+    Required scope(s): CELLAR:READ
+    """
+    return get_owner_summary(db_conn=db_conn, owner_id=current_user.id)
+
+
+@router.get("/changes", response_model=ChangesModel, dependencies=[Security(get_current_active_user)])
+async def get_changes_since(db_conn: Annotated[JdbcDbConn, Depends(DB_CONN)],
+                            current_user: Annotated[OwnerModel, Depends(get_current_active_user)],
+                            since: Annotated[int, Query(ge=0)] = 0,
+                            limit: Annotated[int, Query(gt=0, le=CHANGE_LOG_MAX_PAGE_SIZE)] = 100) -> ChangesModel:
+    """
+    Get the changes to your storage units, bottles, ratings and account after the version you last synced, such that
+    a client only transfers what changed. Each changed entity is returned once with its current data, removed entities
+    are returned as deletes. Pass the returned version as 'since' on the next call, repeat while 'has_more' is set.
+    When 'full_resync' is set, the changes you missed are no longer available and all data has to be reloaded.
+    Changes are returned a few seconds after they were made, such that a change committed late is never skipped.
+
+    The change log is compacted for all users at once: deletes past the retention period are removed, and a restore of
+    the DB replaces the change log. Every client that synced before a removed delete or a restore gets 'full_resync',
+    also when none of the removed changes were its own.
+
+    Required scope(s): CELLAR:READ
+    """
+    return get_changes(db_conn=db_conn, owner_id=current_user.id, since=since, limit=limit,
+                       lag_seconds=CHANGE_LOG_SAFETY_LAG_SECONDS)
+
+
+@router.get("/events", response_class=StreamingResponse, dependencies=[Security(get_current_active_user)])
+async def stream_events(request: Request,
+                        current_user: Annotated[OwnerModel, Depends(get_current_active_user)]) -> StreamingResponse:
+    """
+    Subscribe to the changes of your cellar as Server-Sent Events, such that a dashboard does not have to poll the
+    views. An event is sent after every change to your storage units, bottles and ratings, with the change as event
+    type and the new ETag version of your data. A 'resync' event is sent when the connection fell behind and events
+    were dropped; reload your data or fetch the changes since your last version in that case. A heartbeat comment is
+    sent when there are no events for a while.
+
+    Required scope(s): CELLAR:READ
+    """
+    subscription = EVENT_BROADCASTER.subscribe(owner_id=current_user.id)
+    return StreamingResponse(event_stream(subscription=subscription, is_disconnected=request.is_disconnected,
+                                          heartbeat_seconds=EVENTS_HEARTBEAT_SECONDS,
+                                          on_close=lambda: EVENT_BROADCASTER.unsubscribe(subscription)),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,6 +1,8 @@
+import os
+
 from enum import Enum
 from typing import Annotated, Type
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from fastapi import HTTPException, status
 from fastapi import APIRouter, Depends, Security, Form
@@ -8,17 +10,23 @@ from fastapi.security import OAuth2PasswordRequestForm
 
 from db.jdbc_interface import JdbcDbConn
 
-from ..constants import ACCESS_TOKEN_EXPIRATION_MIN, SCOPES, DB_CONN
+from .cellar_funcs import change_log_query
+from ..constants import (ACCESS_TOKEN_EXPIRATION_MIN, SCOPES, DB_CONN, USER_CACHE, SNAPSHOT_DIR, SNAPSHOT_BATCH_SIZE,
+                         DB_ADMISSION, WINE_CATALOGUE_CACHE)
+from ..dependencies import DbConnRoute
 from ..authentication import (authenticate_user, create_access_token, verify_scopes, get_password_hash,
                               get_current_active_user, get_user)
-from ..models import Token, UpdateOwnerModel, OwnerModel, NewOwnerModel
+from ..models import (Token, UpdateOwnerModel, OwnerModel, NewOwnerModel, SnapshotModel, DbAdmissionStatsModel,
+                      CatalogueCacheStatsModel)
+from ..snapshots import snapshot_database
 
 
 SCOPES_ENUM = Enum('ScopesType', ((s, s) for s in SCOPES.keys()), type=str)
 
 router = APIRouter(prefix="/users",
                    tags=["users"],
-                   responses={404: {"description": "Not Found"}})
+                   responses={404: {"description": "Not Found"}},
+                   route_class=DbConnRoute)
 
 
 @router.post(path='/token', response_model=Token)
@@ -94,13 +102,14 @@ async def add_user(user_db: Annotated[JdbcDbConn, Depends(DB_CONN)],
                                         params={"username": owner_data.username})
     if user:
         raise HTTPException(status_code=400, detail=f"A user with username {owner_data.username} already exists")
-    user_db.execute_query("INSERT INTO cellar.owners (name, username, password, scopes, is_admin, enabled) "
-                          "VALUES (%(name)s, %(username)s, %(password)s, %(scopes)s, %(is_admin)s, "
-                          "        %(enabled)s)",
-                          params={"name": owner_data.name, "username": owner_data.username,
-                                  "password": get_password_hash(password=owner_data.password),
-                                  "scopes": owner_data.scopes, "is_admin": owner_data.is_admin,
-                                  "enabled": owner_data.enabled})
+    params = {"name": owner_data.name, "username": owner_data.username,
+              "password": get_password_hash(password=owner_data.password),
+              "scopes": owner_data.scopes, "is_admin": owner_data.is_admin, "enabled": owner_data.enabled}
+    queries = ["INSERT INTO cellar.owners (name, username, password, scopes, is_admin, enabled) "
+               "VALUES (%(name)s, %(username)s, %(password)s, %(scopes)s, %(is_admin)s, "
+               "        %(enabled)s)",
+               change_log_query(entity="owner", operation="upsert", conditions="username = %(username)s")]
+    user_db.execute_query(queries, params=len(queries) * [params])
     return f"User with username {owner_data.username} has successfully been added to the DB"
 
 
@@ -117,8 +126,10 @@ async def delete_user(user_db: Annotated[JdbcDbConn, Depends(DB_CONN)],
                                         params={"username": delete_username})
     if not user:
         raise HTTPException(status_code=400, detail=f"No users with username {delete_username} exist")
-    user_db.execute_query("DELETE FROM cellar.owners WHERE username = %(username)s",
-                          params={"username": delete_username})
+    queries = [change_log_query(entity="owner", operation="delete", conditions="username = %(username)s"),
+               "DELETE FROM cellar.owners WHERE username = %(username)s"]
+    user_db.execute_query(queries, params=len(queries) * [{"username": delete_username}])
+    USER_CACHE.invalidate(delete_username)
     return f"User with username {delete_username} has successfully been removed from the DB"
 
 
@@ -150,7 +161,50 @@ async def update_user(user_db: Annotated[JdbcDbConn, Depends(DB_CONN)],
             update_fields[k] = v
 
     updated_fields = ", ".join(f"{field} = %({field})s" for field in update_fields)
-    user_db.execute_query(f"UPDATE cellar.owners SET {updated_fields} WHERE username = %(current_username)s",
-                          params={"current_username": current_username, **update_fields})
+    params = {"current_username": current_username, "updated_username": update_fields.get("username", current_username),
+              **update_fields}
+    queries = [f"UPDATE cellar.owners SET {updated_fields} WHERE username = %(current_username)s",
+               change_log_query(entity="owner", operation="upsert", conditions="username = %(updated_username)s")]
+    user_db.execute_query(queries, params=len(queries) * [params])
+    USER_CACHE.invalidate(current_username)
+    if new_data.username is not None:
+        USER_CACHE.invalidate(new_data.username)
 
     return "User information updated successfully."
+
+
+@router.post('/snapshot', response_model=SnapshotModel,
+             dependencies=[Security(get_current_active_user, scopes=['USERS:WRITE'])])
+def snapshot_db(user_db: Annotated[JdbcDbConn, Depends(DB_CONN)]) -> dict:
+    """
+    ADMIN ONLY ENDPOINT
+    Writes a consistent snapshot of every table of the cellar DB to a directory of Parquet files on the server. The
+    snapshot can be restored with the 'restore' management command.
+    Required scope(s): USERS:READ, USERS:WRITE
+    """
+    # Not a coroutine, such that the snapshot is written on a worker thread instead of blocking the event loop
+    name = f"cellar_{datetime.now():%Y%m%dT%H%M%S%f}"
+    return snapshot_database(db_conn=user_db, directory=os.path.join(SNAPSHOT_DIR, name),
+                             batch_size=SNAPSHOT_BATCH_SIZE)
+
+
+@router.get('/db_admission_stats', response_model=DbAdmissionStatsModel,
+            dependencies=[Security(get_current_active_user, scopes=['USERS:READ'])])
+async def get_db_admission_stats() -> DbAdmissionStatsModel:
+    """
+    ADMIN ONLY ENDPOINT
+    Get the queue length, wait times and shed requests of the admission of requests to the DB of this worker.
+    Required scope(s): USERS:READ
+    """
+    return DB_ADMISSION.stats()
+
+
+@router.get('/catalogue_cache_stats', response_model=CatalogueCacheStatsModel,
+            dependencies=[Security(get_current_active_user, scopes=['USERS:READ'])])
+async def get_catalogue_cache_stats() -> CatalogueCacheStatsModel:
+    """
+    ADMIN ONLY ENDPOINT
+    Get the hit and miss statistics of the cache of wine ids used to look up wines by name and vintage or id.
+    Required scope(s): USERS:READ
+    """
+    return WINE_CATALOGUE_CACHE.stats()
@@ -0,0 +1,312 @@
+import re
+import math
+import time
+import uuid
+import threading
+
+from typing import Any
+
+from db.jdbc_interface import JdbcDbConn
+
+from .cache_backends import CacheBackend
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+GEO_KEY_PATTERN = re.compile(r"\b\w+: ")
+IGNORED_TOKENS = {"none"}
+
+
+def tokenize(text: str | None) -> list[str]:
+    """
+    Splits a text into lower case word tokens, dropping the 'None' placeholders of empty fields.
+
+    :param text: the text to tokenize
+    :return: the tokens in order of appearance
+    """
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in IGNORED_TOKENS]
+
+
+def wine_tokens(name: str | None, grapes: str | None, geographic_info: str | None,
+                quality_signature: str | None) -> dict[str, int]:
+    """
+    Counts the tokens of the searchable fields of a wine. The name is weighted more heavily than the other fields,
+    such that wines named after the searched terms rank first.
+
+    :param name: name of the wine
+    :param grapes: grapes of the wine
+    :param geographic_info: geographic info text of the wine, the field names are not indexed
+    :param quality_signature: appellation of the wine
+    :return: the weighted count per token
+    """
+    counts: dict[str, int] = {}
+    fields = ((name, SearchIndex.NAME_WEIGHT), (grapes, 1), (GEO_KEY_PATTERN.sub("", geographic_info or ""), 1),
+              (quality_signature, 1))
+    for text, weight in fields:
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + weight
+    return counts
+
+
+class SearchIndex:
+    """
+    Process-local inverted index over the wines catalogue and the tasting notes of the ratings. The index is loaded
+    from the DB on the first search and is kept up to date by the functions writing wines and ratings, so searches
+    never scan the wines or ratings tables.
+
+    Wine postings are shared by all owners, rating postings are partitioned per rater. A search therefore only visits
+    the ratings of the searching owner, regardless of the size of the ratings table.
+
+    When a cache backend is provided, the writes of the other workers are announced over the backend and their
+    documents are fetched on the next search, and clearing the index, e.g. after a restore of the DB, clears the
+    indexes of all workers. An optional TTL reloads the index periodically, which bounds its age for announcements this
+    process misses, e.g. with an in-process backend.
+    """
+    NAME_WEIGHT = 3
+
+    def __init__(self, backend: CacheBackend | None = None, namespace: str | None = None,
+                 ttl_seconds: float | None = None):
+        """
+        Sets class attributes.
+
+        :param backend: Optional cache backend carrying the writes and clears between workers
+        :param namespace: Name of the index in the invalidation messages, required when a backend is provided
+        :param ttl_seconds: Optional maximum age of the index, the index is only reloaded when cleared if omitted
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self._origin = uuid.uuid4().hex
+        self._lock = threading.RLock()
+        self.loaded = False
+        self._loaded_at = 0.
+        self._wines: dict[int, tuple[str, int]] = {}
+        self._wine_postings: dict[str, dict[int, int]] = {}
+        self._rating_wine: dict[int, int] = {}
+        self._rating_postings: dict[int, dict[str, dict[int, int]]] = {}
+        self._pending_wines: set[int] = set()
+        self._pending_raters: set[int] = set()
+        if backend is not None:
+            backend.subscribe(self._handle_invalidation)
+
+    def load(self, db_conn: JdbcDbConn) -> None:
+        """
+        (Re)builds the index from the wines and ratings tables.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        with self._lock:
+            # Writes announced from here on may be missing from the queried rows, so they are fetched afterwards
+            self._pending_wines.clear()
+            self._pending_raters.clear()
+        wines = db_conn.execute_query_select(query="SELECT id, name, vintage, grapes, geographic_info, "
+                                                   "       quality_signature "
+                                                   "FROM cellar.wines")
+        ratings = db_conn.execute_query_select(query="SELECT id, rater_id, wine_id, comments FROM cellar.ratings")
+        with self._lock:
+            self._clear()
+            for wine in wines:
+                self.add_wine(*wine)
+            for rating in ratings:
+                self.add_rating(*rating)
+            self.loaded = True
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db_conn: JdbcDbConn) -> None:
+        """
+        Loads the index if it has not been loaded yet or is older than the TTL, otherwise adds the wines and ratings
+        the other workers announced since.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        if not self.loaded or self._expired():
+            with self._lock:
+                if not self.loaded or self._expired():
+                    self.load(db_conn=db_conn)
+        elif self._pending_wines or self._pending_raters:
+            self._load_pending(db_conn=db_conn)
+
+    def _expired(self) -> bool:
+        """
+        Whether the index is older than the TTL.
+        """
+        return self.ttl_seconds is not None and time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def _load_pending(self, db_conn: JdbcDbConn) -> None:
+        """
+        Adds the wines and the ratings of the raters announced by other workers.
+
+        :param db_conn: MariaDB instance to connect to the DB
+        """
+        with self._lock:
+            wine_ids, rater_ids = sorted(self._pending_wines), sorted(self._pending_raters)
+            self._pending_wines.clear()
+            self._pending_raters.clear()
+        wines, ratings = [], []
+        if wine_ids:
+            params = {f"wine_{i}": wine_id for i, wine_id in enumerate(wine_ids)}
+            wines = db_conn.execute_query_select(query=f"SELECT id, name, vintage, grapes, geographic_info, "
+                                                       f"       quality_signature "
+                                                       f"FROM cellar.wines "
+                                                       f"WHERE id IN ({', '.join(f'%({key})s' for key in params)})",
+                                                 params=params)
+        if rater_ids:
+            params = {f"rater_{i}": rater_id for i, rater_id in enumerate(rater_ids)}
+            ratings = db_conn.execute_query_select(query=f"SELECT id, rater_id, wine_id, comments "
+                                                         f"FROM cellar.ratings "
+                                                         f"WHERE rater_id IN "
+                                                         f"({', '.join(f'%({key})s' for key in params)})",
+                                                   params=params)
+        with self._lock:
+            for wine in wines:
+                self.add_wine(*wine)
+            for rating in ratings:
+                self.add_rating(*rating)
+
+    def publish_wines(self, wine_ids: list[int]) -> None:
+        """
+        Announces wines written by this worker to the indexes of the other workers.
+
+        :param wine_ids: ids of the written wines
+        """
+        if self.backend is not None and wine_ids:
+            self.backend.publish(f"{self.namespace}:wines:{','.join(map(str, wine_ids))}:{self._origin}")
+
+    def publish_ratings(self, rater_id: int) -> None:
+        """
+        Announces a rating written by this worker to the indexes of the other workers.
+
+        :param rater_id: id of the owner that rated a wine
+        """
+        if self.backend is not None:
+            self.backend.publish(f"{self.namespace}:raters:{rater_id}:{self._origin}")
+
+    def clear(self) -> None:
+        """
+        Drops all indexed documents, the index is reloaded on the next search.
+        """
+        self._clear()
+        if self.backend is not None:
+            self.backend.publish(f"{self.namespace}:*")
+
+    def _clear(self) -> None:
+        """
+        Drops all indexed documents of this process only.
+        """
+        with self._lock:
+            self.loaded = False
+            self._wines.clear()
+            self._wine_postings.clear()
+            self._rating_wine.clear()
+            self._rating_postings.clear()
+
+    def _handle_invalidation(self, message: str) -> None:
+        """
+        Clears the index when any worker cleared its index and records the documents the other workers wrote.
+
+        :param message: the invalidation message, formatted as '<namespace>:*', '<namespace>:wines:<ids>:<origin>' or
+            '<namespace>:raters:<id>:<origin>'
+        """
+        namespace, _, key = message.partition(":")
+        if namespace != self.namespace:
+            return
+        if key == "*":
+            self._clear()
+            return
+        kind, ids, origin = (key.split(":") + ["", ""])[:3]
+        if origin == self._origin:
+            return
+        with self._lock:
+            ids = {int(doc_id) for doc_id in ids.split(",") if doc_id.isdigit()}
+            if kind == "wines":
+                self._pending_wines.update(ids - self._wines.keys())
+            elif kind == "raters":
+                self._pending_raters.update(ids)
+
+    def add_wine(self, wine_id: int, name: str, vintage: int, grapes: str | None = None,
+                 geographic_info: str | None = None, quality_signature: str | None = None) -> None:
+        """
+        Adds a wine to the index.
+
+        :param wine_id: id of the wine
+        :param name: name of the wine
+        :param vintage: vintage of the wine
+        :param grapes: grapes of the wine
+        :param geographic_info: geographic info text of the wine
+        :param quality_signature: appellation of the wine
+        """
+        with self._lock:
+            self._wines[wine_id] = (name, vintage)
+            for token, count in wine_tokens(name, grapes, geographic_info, quality_signature).items():
+                self._wine_postings.setdefault(token, {})[wine_id] = count
+
+    def add_rating(self, rating_id: int, rater_id: int, wine_id: int, comments: str | None) -> None:
+        """
+        Adds the tasting notes of a rating to the index, unless the rating is indexed already.
+
+        :param rating_id: id of the rating
+        :param rater_id: id of the owner that rated the wine
+        :param wine_id: id of the rated wine
+        :param comments: the tasting notes
+        """
+        with self._lock:
+            if rating_id in self._rating_wine:
+                return
+            self._rating_wine[rating_id] = wine_id
+            postings = self._rating_postings.setdefault(rater_id, {})
+            for token in tokenize(comments):
+                token_postings = postings.setdefault(token, {})
+                token_postings[rating_id] = token_postings.get(rating_id, 0) + 1
+
+    def search(self, query: str, owner_id: int, owner_wines: set[int]) -> list[dict[str, Any]]:
+        """
+        Searches the wines matching all terms of a query in their own fields or in the tasting notes of the owner.
+        Matches are ranked on the sum of the TF-IDF weights of the terms.
+
+        :param query: the search terms
+        :param owner_id: id of the searching owner
+        :param owner_wines: ids of the wines in the cellar of the owner, the wines rated by the owner are added
+        :return: the matching wines ordered by descending score, formatted to the SearchResultModel schema
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            rating_postings = self._rating_postings.get(owner_id, {})
+            # The notes are ranked among the ratings of the owner, a wine can be rated more than once
+            ratings = {rating_id for postings in rating_postings.values() for rating_id in postings}
+            scope = owner_wines | {self._rating_wine[rating_id] for rating_id in ratings}
+            n_wines, n_ratings = max(len(self._wines), 1), max(len(ratings), 1)
+
+            scores: dict[int, float] | None = None
+            matched_ratings: dict[int, set[int]] = {}
+            for term in terms:
+                term_scores: dict[int, float] = {}
+                wine_postings = self._wine_postings.get(term, {})
+                if wine_postings:
+                    idf = math.log(1 + n_wines / len(wine_postings))
+                    candidates = scope if len(scope) < len(wine_postings) else wine_postings
+                    for wine_id in candidates:
+                        if wine_id in scope and wine_id in wine_postings:
+                            term_scores[wine_id] = wine_postings[wine_id] * idf
+                notes_postings = rating_postings.get(term, {})
+                if notes_postings:
+                    idf = math.log(1 + n_ratings / len(notes_postings))
+                    for rating_id, count in notes_postings.items():
+                        wine_id = self._rating_wine[rating_id]
+                        term_scores[wine_id] = term_scores.get(wine_id, 0) + count * idf
+                        matched_ratings.setdefault(wine_id, set()).add(rating_id)
+
+                # All terms have to match, so the candidates only shrink with each term
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {wine_id: score + term_scores[wine_id]
+                              for wine_id, score in scores.items() if wine_id in term_scores}
+                if not scores:
+                    return []
+
+            return [{"wine_id": wine_id, "name": self._wines.get(wine_id, (None, None))[0],
+                     "vintage": self._wines.get(wine_id, (None, None))[1], "score": round(score, 4),
+                     "rating_ids": sorted(matched_ratings.get(wine_id, set()))}
+                    for wine_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
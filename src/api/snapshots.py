@@ -0,0 +1,120 @@
+import os
+import re
+import glob
+import json
+import datetime
+
+from typing import Any
+
+import polars as pl
+
+from db.jdbc_interface import JdbcDbConn
+
+from .constants import (SQL, STATS_CACHE, USER_CACHE, STORAGE_CACHE, OWNER_VERSIONS, WINE_CATALOGUE_CACHE,
+                        SEARCH_INDEX, WINE_NAME_INDEX)
+
+
+SNAPSHOT_MANIFEST = "manifest.json"
+
+
+def snapshot_tables(file_path: str = f"{SQL}create_tables.sql") -> list[str]:
+    """
+    Lists the tables of the cellar schema, in the order in which they are created.
+
+    :param file_path: path to the SQL file creating the tables
+    :return: the table names, without schema
+    """
+    with open(file=file_path, mode='r') as sql_file:
+        return re.findall(r"CREATE TABLE IF NOT EXISTS `cellar`\.`(\w+)`", sql_file.read())
+
+
+def snapshot_database(db_conn: JdbcDbConn, directory: str, batch_size: int = 10_000) -> dict[str, Any]:
+    """
+    Writes every table of the cellar schema to a directory of Parquet files. All tables are read within a single
+    consistent-read transaction, such that the snapshot reflects one point in time while the API keeps serving writes.
+    Each table is streamed in batches and every batch is written as a part file of the table's directory, e.g.
+    'cellar/part_00000000.parquet', so only a batch is held in memory. A manifest lists the tables and their row counts.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param directory: the directory of the snapshot, must not exist yet
+    :param batch_size: number of rows per part file
+    :return: the manifest, formatted to the SnapshotModel schema
+    """
+    os.makedirs(directory)
+    manifest = {"name": os.path.basename(os.path.normpath(directory)), "created_at": datetime.datetime.now(),
+                "tables": {}}
+    with db_conn.read_snapshot():
+        for table in snapshot_tables():
+            os.makedirs(os.path.join(directory, table))
+            rows = parts = 0
+            for batch in db_conn.execute_query_select_batches(query=f"SELECT * FROM cellar.{table}",
+                                                              batch_size=batch_size):
+                (pl.DataFrame(batch, infer_schema_length=None)
+                 .write_parquet(os.path.join(directory, table, f"part_{parts:08d}.parquet")))
+                rows += len(batch)
+                parts += 1
+            manifest["tables"][table] = rows
+
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST), 'w') as file:
+        json.dump(manifest, file, default=str, indent=2)
+    return manifest
+
+
+def restore_database(db_conn: JdbcDbConn, directory: str, batch_size: int = 10_000) -> dict[str, int]:
+    """
+    Replaces the content of the tables in a snapshot by the snapshotted rows. The row counts of all part files are
+    verified against the manifest first, then each table is emptied and bulk-loaded with batched multi-row inserts,
+    keeping the ids of the rows. Tables of the schema that are not in the snapshot are left untouched. Afterwards, all
+    clients of the change log are asked for a full resync and all caches and search indexes are cleared. The clears
+    reach the API workers through the cache backend, so with the default in-process backend the API processes have to
+    be stopped during the restore.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param directory: the directory of the snapshot
+    :param batch_size: number of rows inserted per batch
+    :return: the number of restored rows per table
+    """
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST), 'r') as file:
+        manifest = json.load(file)
+    # Only known tables are restored, as their names end up in the queries
+    tables = [table for table in snapshot_tables() if table in manifest["tables"]]
+    parts = {table: sorted(glob.glob(os.path.join(directory, table, "part_*.parquet"))) for table in tables}
+    # All part files are verified before any table is emptied, such that an incomplete snapshot leaves the DB as is
+    for table in tables:
+        rows = sum(pl.scan_parquet(part).select(pl.len()).collect().item() for part in parts[table])
+        if rows != manifest["tables"][table]:
+            raise ValueError(f"Snapshot of table {table} is incomplete: found {rows} of {manifest['tables'][table]} "
+                             f"rows")
+
+    last_change = db_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes")[0][0] or 0
+    restored = {}
+    for table in tables:
+        db_conn.execute_query(f"TRUNCATE TABLE cellar.{table}")
+        restored[table] = 0
+        for part in parts[table]:
+            for chunk in pl.scan_parquet(part).collect_batches(chunk_size=batch_size):
+                db_conn.create_records(chunk.to_dicts(), table=f"cellar.{table}")
+                restored[table] += chunk.height
+
+    force_changes_resync(db_conn=db_conn, last_change=last_change)
+    for cache in (STATS_CACHE, USER_CACHE, STORAGE_CACHE, OWNER_VERSIONS, WINE_CATALOGUE_CACHE, SEARCH_INDEX,
+                  WINE_NAME_INDEX):
+        cache.clear()
+    return restored
+
+
+def force_changes_resync(db_conn: JdbcDbConn, last_change: int) -> None:
+    """
+    Asks every client of the change log for a full resync, after the log was replaced. The ids of new changes continue
+    above all ids handed out before, as a restored log may rewind them, and all cursors up to the last of these ids are
+    marked as pruned.
+
+    :param db_conn: The MariaDB JDBC connection
+    :param last_change: the highest change id before the change log was replaced
+    """
+    restored_change = db_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes")[0][0] or 0
+    pruned_through = max(last_change, restored_change) + 1
+    db_conn.execute_query([f"ALTER TABLE cellar.changes AUTO_INCREMENT = {pruned_through + 1}",
+                           "INSERT INTO cellar.changes_compaction (id, pruned_through) VALUES (1, %(pruned_through)s) "
+                           "ON DUPLICATE KEY UPDATE pruned_through = VALUES(pruned_through)"],
+                          params=[None, {"pruned_through": pruned_through}])
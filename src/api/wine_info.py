@@ -0,0 +1,70 @@
+import re
+import datetime
+
+from .constants import DRINK_WINDOW_MAX_YEARS
+
+
+# Producer labelled in the additional info of wines stored before the producer field existed, e.g. "producer: Vietti"
+LEGACY_PRODUCER_PATTERN = re.compile(r"\bproducer\b\s*[:=]?\s*([^,;]+)", re.IGNORECASE)
+# Length of the grape column of the wine_grapes table
+GRAPE_MAX_LENGTH = 100
+
+
+def parse_geo_info(geographic_info: str | None) -> dict[str, str | None]:
+    """
+    Parses a string constructed by `cellar_funcs.unpack_geo_info` back into the country, region and producer of a
+    wine. Missing fields and fields with a 'None' value are returned as None. Wines stored before the producer field
+    existed kept their producer in the additional info, it is taken from there when it is labelled, e.g.
+    "producer: Vietti".
+
+    :param geographic_info: the string with geographic info as stored in the wines table
+    :return: the country, region and producer
+    """
+    fields = dict(field.partition(": ")[::2] for field in (geographic_info or "").split(",\t"))
+    if "producer" not in fields:
+        legacy_producer = LEGACY_PRODUCER_PATTERN.search(fields.get("additional_info", ""))
+        fields["producer"] = legacy_producer.group(1) if legacy_producer else None
+    return {key: structured_value(fields.get(key)) for key in ("country", "region", "producer")}
+
+
+def parse_grapes(grapes: str | None) -> list[str]:
+    """
+    Parses the free text grapes of a wine into a list of unique, lower case grape names. Grapes are expected to be
+    comma separated, percentages that are part of a grape's description are dropped. Names are cut off at the length
+    of the wine_grapes table, as texts without commas can be of any length.
+
+    :param grapes: the grapes as stored in the wines table
+    :return: the grape names
+    """
+    parsed = []
+    for grape in (grapes or "").split(","):
+        grape = " ".join(re.sub(r"\d+(\.\d+)?\s*%", "", grape).split()).lower()[:GRAPE_MAX_LENGTH].rstrip()
+        if structured_value(grape) and grape not in parsed:
+            parsed.append(grape)
+    return parsed
+
+
+def structured_value(value: str | None) -> str | None:
+    """Normalises the free text placeholders for unknown values ('None' or empty) to None"""
+    if value is None or value.strip() in ("", "None", "none"):
+        return None
+    return value.strip()
+
+
+def drink_window_years(drink_from: datetime.date | str, drink_before: datetime.date | str,
+                       max_years: int = DRINK_WINDOW_MAX_YEARS) -> range:
+    """
+    Determines the years in which a bottle is drinkable. Similar to the '/drink_in_window' endpoint, a bottle counts as
+    drinkable in a year when its drinking window covers the first of January of that year.
+
+    :param drink_from: the date from which the bottle is drinkable, either as date or as ISO formatted string
+    :param drink_before: the last date on which the bottle is drinkable, either as date or as ISO formatted string
+    :param max_years: number of years after the current year the range is cut off at, such that an open-ended window,
+        e.g. up to 9999-12-31, does not span thousands of years
+    :return: the range of drinkable years, empty if the drinking window is invalid
+    """
+    drink_from = datetime.date.fromisoformat(str(drink_from)[:10])
+    drink_before = datetime.date.fromisoformat(str(drink_before)[:10])
+    first_year = drink_from.year if (drink_from.month, drink_from.day) == (1, 1) else drink_from.year + 1
+    last_year = min(drink_before.year, datetime.date.today().year + max_years)
+    return range(first_year, last_year + 1)
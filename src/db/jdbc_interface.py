@@ -1,5 +1,7 @@
-from typing import Any
 from abc import ABCMeta, abstractmethod
+from typing import Any, Iterable, Iterator
+from collections.abc import Mapping
+from contextlib import contextmanager
 
 
 class JdbcDbConn(metaclass=ABCMeta):
@@ -38,7 +40,8 @@ class JdbcDbConn(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def execute_query(self, query: Any, params: dict[str, Any] | list | tuple | None = None) -> None:
+    def execute_query(self, query: Any, params: dict[str, Any] | list | tuple | None = None,
+                      invalidates: Iterable[str] | None = None) -> None:
 
         """
         Executes a single query.
@@ -46,6 +49,7 @@ class JdbcDbConn(metaclass=ABCMeta):
 
         :param query: The query that is executed
         :param params: Optional extra query params
+        :param invalidates: Optional tables written by the query, used to invalidate cached select results
         """
         pass
 
@@ -62,6 +66,28 @@ class JdbcDbConn(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    def execute_query_select_batches(self, query: str, params: dict[str, Any] | list | tuple | None = None,
+                                     batch_size: int = 1000) -> Iterator[list[Mapping[str, Any]]]:
+        """
+        Executes a select query and fetches the result in batches, such that large results never have to fit in
+        memory at once.
+
+        :param query: The executed select query
+        :param params: Optional extra query params
+        :param batch_size: Number of rows fetched per batch
+        :return: The requested data as batches of rows, each row mapping the field names to the values
+        """
+        pass
+
+    @contextmanager
+    def read_snapshot(self) -> Iterator[None]:
+        """
+        Context manager in which all select queries read from the same consistent snapshot of the DB. Connectors of
+        DBs without snapshot support read without one.
+        """
+        yield
+
     @abstractmethod
     def read_table(self, table: str) -> Any:
         pass
@@ -1,5 +1,6 @@
-from typing import Any
+from typing import Any, Iterable, Iterator
 from functools import singledispatchmethod
+from contextlib import contextmanager
 
 import pandas as pd
 import polars as pl
@@ -9,7 +10,24 @@ from sqlalchemy.engine import Engine
 from sqlalchemy.engine.base import Connection
 from mysql.connector.cursor import MySQLCursor
 
+from db.rows import Row, to_rows
 from db.jdbc_interface import JdbcDbConn
+from db.query_cache import QueryCache
+
+
+def mariadb_connection_string(user: str, password: str, database: str, host: str = 'localhost',
+                              port: int = 3306) -> str:
+    """
+    Constructs the sqlalchemy connection string of a MariaDB service.
+
+    :param user: JDBC username
+    :param password: JDBC password
+    :param database: DB schema
+    :param host: Hostname of the DB
+    :param port: Port over which the connection is made
+    :return: the connection string
+    """
+    return f"mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}"
 
 
 class JdbcMariaDB(JdbcDbConn):
@@ -17,7 +35,8 @@ class JdbcMariaDB(JdbcDbConn):
     DB connector class for a JDBC connection to a MariaDB service.
     """
 
-    def __init__(self, user: str, password: str, database: str, host: str = 'localhost', port: int = 3306) -> None:
+    def __init__(self, user: str, password: str, database: str, host: str = 'localhost', port: int = 3306,
+                 query_cache: QueryCache | None = None, engine: Engine | None = None) -> None:
         """
         Sets class attributes for further use.
 
@@ -26,17 +45,22 @@ class JdbcMariaDB(JdbcDbConn):
         :param database: DB schema
         :param host: Hostname of the DB
         :param port: Port over which the connection is made
+        :param query_cache: Optional cache for the results of select queries, shared between connections
+        :param engine: Optional engine shared between connections, such that connections are checked out of its pool
+                       instead of being opened for every instance
         """
         self.user = user
         self.password = password
         self.database = database
         self.host = host
         self.port = port
+        self.query_cache = query_cache
+        self.engine = engine
         self.connection: Connection | None = None
         self.cursor: MySQLCursor | None = None
 
-        self.connection_string = f"mysql+mysqlconnector://" \
-                                 f"{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+        self.connection_string = mariadb_connection_string(user=self.user, password=self.password,
+                                                           database=self.database, host=self.host, port=self.port)
 
     def _initiate_connection(self):
         """
@@ -58,8 +82,10 @@ class JdbcMariaDB(JdbcDbConn):
 
     def engine_connect(self) -> Engine:
         """
-        Constructs a sqlalchemy engine to connect to the DB.
+        Constructs a sqlalchemy engine to connect to the DB, unless an engine is shared between connections.
         """
+        if self.engine is not None:
+            return self.engine
         # Use SQLAlchemy to create a MariaDB engine
         engine = create_engine(self.connection_string)
         return engine
@@ -77,32 +103,58 @@ class JdbcMariaDB(JdbcDbConn):
         raise NotImplementedError(f"Only allows types [list, str] for the 'query' parameter. Got {type(query)}")
 
     @execute_query.register
-    def _(self, query: str, params: dict[str, Any] | list | tuple | None = None) -> None:
+    def _(self, query: str, params: dict[str, Any] | list | tuple | None = None,
+          invalidates: Iterable[str] | None = None) -> None:
         """
         Executes a single query. Uses a transaction to commit the executed query automatically.
         Make sure to provide the query as the first positional argument without a keyword.
 
         :param query: The query that is executed
         :param params: Optional extra query params
+        :param invalidates: Optional tables written by the query, on top of the tables detected from the query
         """
-        with self.connection.begin() as trans:
-            self.cursor.execute(operation=query, params=params)
+        try:
+            with self.connection.begin() as trans:
+                self.cursor.execute(operation=query, params=params)
+        finally:
+            self._invalidate_query_cache(queries=[query], tables=invalidates)
 
     @execute_query.register
-    def _(self, query: list, params: dict[str, Any] | list | tuple | None = None) -> None:
+    def _(self, query: list, params: dict[str, Any] | list | tuple | None = None,
+          invalidates: Iterable[str] | None = None) -> None:
         """
-        Executes multiple queries provided as a list of query strings
+        Executes multiple queries provided as a list of query strings. All queries are executed within a single
+        transaction, such that either all or none of them are committed.
 
         :param query: The list of queries to be executed
         :param params: Optional extra query params
+        :param invalidates: Optional tables written by the queries, on top of the tables detected from the queries
         """
         if params is None:
             params = len(query) * [None]
         if len(params) != len(query):
             raise ValueError("Number of parameters does not match the number of queries.")
 
-        for q, param in zip(query, params):
-            self.execute_query(q, params=param)
+        try:
+            with self.connection.begin() as trans:
+                for q, param in zip(query, params):
+                    self.cursor.execute(operation=q, params=param)
+        finally:
+            self._invalidate_query_cache(queries=query, tables=invalidates)
+
+    def _invalidate_query_cache(self, queries: list[str], tables: Iterable[str] | None = None) -> None:
+        """
+        Invalidates the cached select results reading the tables written by the executed queries.
+
+        :param queries: The executed queries
+        :param tables: Optional tables that are written on top of the tables detected from the queries
+        """
+        if self.query_cache is None:
+            return
+        for query in queries:
+            self.query_cache.invalidate_query(query)
+        if tables:
+            self.query_cache.invalidate_tables(tables)
 
     def execute_query_select(self, query: str, params: dict[str, Any] | list | tuple | None = None,
                              get_fields: bool = False) -> Any:
@@ -111,27 +163,90 @@ class JdbcMariaDB(JdbcDbConn):
 
         :param query: The executed select query
         :param params: Optional extra query params
-        :param get_fields: Denotes whether the field names should be retrieved
+        :param get_fields: Denotes whether the field names should be retrieved, the rows are then returned as read-only
+                           mappings of the field names to the values, sharing a single index of the fields
         :return: The data requested by the query
         """
+        key = None if self.query_cache is None else self.query_cache.key(query, params, get_fields)
+        if key is not None:
+            hit, result = self.query_cache.get(key)
+            if hit:
+                return result
+            # Taken before the query runs, such that a write committing meanwhile turns the cached result stale
+            versions = self.query_cache.versions(key)
+
         self.cursor.execute(operation=query, params=params)
         result = self.cursor.fetchall()
         if get_fields:
-            cols = self.cursor.column_names
-            result = [{col: value for col, value in zip(cols, row)} for row in result]
+            result = to_rows(self.cursor.column_names, result)
+        if key is not None:
+            self.query_cache.set(key, result, versions=versions)
         return result
 
+    def execute_query_select_batches(self, query: str, params: dict[str, Any] | list | tuple | None = None,
+                                     batch_size: int = 1000) -> Iterator[list[Row]]:
+        """
+        Executes a select query and fetches the result in batches. The rows are read from an unbuffered cursor, such
+        that the server streams them as they are fetched instead of the whole result being loaded first. No other
+        queries can be executed on the connection until all batches are fetched. The query cache is bypassed.
+
+        :param query: The executed select query
+        :param params: Optional extra query params
+        :param batch_size: Number of rows fetched per batch
+        :return: The requested data as batches of rows, each row mapping the field names to the values like the rows
+            of `execute_query_select` with `get_fields`
+        """
+        cursor = self.connection.connection.cursor(buffered=False)
+        try:
+            cursor.execute(operation=query, params=params)
+            cols = cursor.column_names
+            while rows := cursor.fetchmany(size=batch_size):
+                yield to_rows(cols, rows)
+        finally:
+            # Drain the rows that were not fetched when the consumer stopped early, the connection cannot be reused
+            # while they are unread
+            while cursor.fetchmany(size=batch_size):
+                pass
+            cursor.close()
+
+    @contextmanager
+    def read_snapshot(self) -> Iterator[None]:
+        """
+        Context manager in which all select queries read from the same consistent snapshot of the DB. Starts a
+        read-only InnoDB transaction with a consistent snapshot, which does not block concurrent writes.
+        """
+        with self.connection.begin() as trans:
+            self.cursor.execute(operation="START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            yield
+
     def read_table(self, table: str) -> Any:
         return self.execute_query_select(query="SELECT * FROM %(table)s", params={'table': table})
 
     @singledispatchmethod
     def create_records(self, data, table: list[str] | str | None) -> None:
-        raise NotImplementedError(f"Only allows types [pd.DataFrame, pl.DataFrame] for the 'data' parameter. "
-                                  f"Got {type(data)}")
+        raise NotImplementedError(f"Only allows types [dict, list, pd.DataFrame, pl.DataFrame] for the 'data' "
+                                  f"parameter. Got {type(data)}")
 
     @create_records.register
     def _(self, data: dict | list, table: str) -> None:
-        raise NotImplementedError("Main priority to add, not implemented yet. Convert to pandas or polars df for now.")
+        """
+        Inserts one or multiple records within a single transaction. The records are sent with `executemany`, which
+        the MySQL connector rewrites into multi-row inserts.
+
+        :param data: A record or list of records, all records mapping the same columns to their values
+        :param table: The table including its schema, e.g. 'cellar.wines'
+        """
+        records = [data] if isinstance(data, dict) else data
+        if not records:
+            return
+        columns = list(records[0])
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join(f'%({column})s' for column in columns)})")
+        try:
+            with self.connection.begin() as trans:
+                self.cursor.executemany(operation=query, seq_params=records)
+        finally:
+            self._invalidate_query_cache(queries=[query])
 
     @create_records.register
     def _(self, data: pd.DataFrame, table: str) -> None:
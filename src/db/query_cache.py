@@ -0,0 +1,182 @@
+import re
+import copy
+import threading
+
+from typing import Any, Iterable
+from collections import OrderedDict
+
+
+TABLE_NAME = r"`?(?:\w+`?\.`?)?(\w+)`?"
+READ_PATTERN = re.compile(rf"\b(?:FROM|JOIN)\s+{TABLE_NAME}", re.IGNORECASE)
+WRITE_PATTERN = re.compile(rf"^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|"
+                           rf"TRUNCATE(?:\s+TABLE)?|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?)\s+{TABLE_NAME}",
+                           re.IGNORECASE)
+DROP_DATABASE_PATTERN = re.compile(r"^\s*DROP\s+(?:DATABASE|SCHEMA)\b", re.IGNORECASE)
+
+
+def normalise_query(query: str) -> str:
+    """
+    Collapses the whitespace of a query, such that differently formatted but identical queries share a cache entry.
+
+    :param query: the query
+    :return: the normalised query
+    """
+    return " ".join(query.split())
+
+
+def tables_read(query: str) -> frozenset[str]:
+    """
+    Detects the tables a query reads from, based on its FROM and JOIN clauses.
+
+    :param query: the query
+    :return: the lower case names of the tables without their schema
+    """
+    return frozenset(table.lower() for table in READ_PATTERN.findall(query))
+
+
+def tables_written(query: str) -> frozenset[str]:
+    """
+    Detects the table a query writes to, based on the statement type.
+
+    :param query: the query
+    :return: the lower case name of the written table without its schema, empty if no written table is detected
+    """
+    return frozenset(table.lower() for table in WRITE_PATTERN.findall(query))
+
+
+class QueryCache:
+    """
+    Size bounded cache of select query results, keyed by the normalised query and its params. Each entry is tagged
+    with the tables the query reads and the version of these tables at the time it was cached. Writing to a table
+    bumps its version, which turns all entries reading that table stale without having to find them.
+
+    The cache only sees the writes of the connections it is passed to, writes by other processes are not detected.
+    """
+    def __init__(self, max_entries: int = 1024):
+        """
+        Sets class attributes.
+
+        :param max_entries: maximum number of cached results, the least recently used result is evicted first
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[tuple[tuple[str, int], ...], Any]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, params: dict[str, Any] | list | tuple | None, get_fields: bool) -> tuple | None:
+        """
+        Constructs the cache key of a select query.
+
+        :param query: the select query
+        :param params: the query params
+        :param get_fields: whether the field names are retrieved
+        :return: the key, None if the params cannot be used as a key
+        """
+        frozen_params = tuple(sorted(params.items())) if isinstance(params, dict) else params
+        if isinstance(frozen_params, list):
+            frozen_params = tuple(frozen_params)
+        key = (normalise_query(query), frozen_params, get_fields)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _snapshot(self, tables: frozenset[str]) -> tuple[tuple[str, int], ...]:
+        """
+        Retrieves the current version of tables, including the generation that is bumped when all tables change.
+
+        :param tables: the table names
+        :return: the versions per table
+        """
+        return (("", self._generation),) + tuple((table, self._versions.get(table, 0)) for table in sorted(tables))
+
+    def versions(self, key: tuple) -> tuple[tuple[str, int], ...]:
+        """
+        Retrieves the current version of the tables a select query reads. Take it before executing the query and pass
+        it to `set`, such that a write committed while the query runs turns the cached result stale.
+
+        :param key: the key of the select query
+        :return: the versions per table
+        """
+        with self._lock:
+            return self._snapshot(tables_read(key[0]))
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        """
+        Retrieves a cached result, if it is not stale.
+
+        :param key: the key of the select query
+        :return: whether a result was found, and a copy of the result
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                snapshot, result = entry
+                if snapshot == self._snapshot(frozenset(table for table, _ in snapshot[1:])):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(result)
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: tuple, result: Any, versions: tuple[tuple[str, int], ...] | None = None) -> None:
+        """
+        Stores the result of a select query, tagged with the version of the tables the query reads.
+
+        :param key: the key of the select query
+        :param result: the result of the query
+        :param versions: the versions of the tables taken with `versions` before the query was executed, the current
+            versions if omitted
+        """
+        with self._lock:
+            versions = self._snapshot(tables_read(key[0])) if versions is None else versions
+            self._entries[key] = (versions, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> None:
+        """
+        Bumps the version of tables, turning all cached results that read them stale.
+
+        :param tables: the names of the written tables, with or without schema
+        """
+        with self._lock:
+            for table in tables:
+                table = table.rsplit(".", 1)[-1].strip("`").lower()
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def invalidate_query(self, query: str) -> None:
+        """
+        Invalidates the tables written by a query. Queries of which the written table cannot be detected, e.g. DDL
+        statements or SQL files, turn all cached results stale.
+
+        :param query: the executed query
+        """
+        if written := tables_written(query):
+            self.invalidate_tables(written)
+        elif not query.lstrip().upper().startswith(("SELECT", "SHOW", "SET")) or DROP_DATABASE_PATTERN.match(query):
+            self.clear()
+
+    def clear(self) -> None:
+        """
+        Turns all cached results stale and drops them.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Retrieves the usage statistics of the cache.
+
+        :return: the hits, misses and number of cached results
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,68 @@
+from typing import Any, Iterable, Iterator, Sequence
+from functools import lru_cache
+from collections.abc import Mapping
+
+
+class Row(Mapping):
+    """
+    Read-only row of a select result, mapping the column names to the values. All rows of a result share a single
+    index of the columns and keep the tuple of values fetched by the cursor, instead of every row being a dict that
+    repeats the column names. Rows can be read like dicts, e.g. `row['id']`, `row.get('id')` and `Model(**row)`, and
+    compare equal to dicts holding the same items. Use `dict(row)` for a mutable copy.
+    """
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: dict[str, int], values: Sequence[Any]):
+        """
+        Sets class attributes.
+
+        :param index: position of each column in the values, shared between the rows of a result
+        :param values: the values of the row, in the order of the columns
+        """
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, column: str) -> Any:
+        return self._values[self._index[column]]
+
+    def __contains__(self, column: object) -> bool:
+        return column in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __repr__(self) -> str:
+        return f"Row({dict(self)!r})"
+
+    def __getstate__(self) -> tuple[dict[str, int], Sequence[Any]]:
+        return self._index, self._values
+
+    def __setstate__(self, state: tuple[dict[str, int], Sequence[Any]]) -> None:
+        self._index, self._values = state
+
+
+@lru_cache(maxsize=1024)
+def column_index(columns: tuple[str, ...]) -> dict[str, int]:
+    """
+    Maps the column names of a result to their position. The index is cached per tuple of columns, such that the
+    results of the same query share it as well.
+
+    :param columns: the column names, in order
+    :return: the position of each column, the last one for duplicate names like a dict of the row would hold
+    """
+    return {column: position for position, column in enumerate(columns)}
+
+
+def to_rows(columns: Sequence[str], values: Iterable[Sequence[Any]]) -> list[Row]:
+    """
+    Wraps the tuples fetched by a cursor into rows that can be read by column name.
+
+    :param columns: the column names of the result, in order
+    :param values: the fetched tuples
+    :return: the rows
+    """
+    index = column_index(tuple(columns))
+    return [Row(index, row) for row in values]
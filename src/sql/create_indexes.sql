@@ -0,0 +1,7 @@
+CREATE INDEX IF NOT EXISTS `ix_wines_country_region` ON `cellar`.`wines` (country, region);
+CREATE INDEX IF NOT EXISTS `ix_wines_region` ON `cellar`.`wines` (region);
+CREATE INDEX IF NOT EXISTS `ix_wines_producer` ON `cellar`.`wines` (producer);
+CREATE INDEX IF NOT EXISTS `ix_wine_grapes_grape` ON `cellar`.`wine_grapes` (grape, wine_id);
+CREATE INDEX IF NOT EXISTS `ix_cellar_owner_wine` ON `cellar`.`cellar` (owner_id, wine_id);
+CREATE INDEX IF NOT EXISTS `ix_changes_owner` ON `cellar`.`changes` (owner_id, id);
+CREATE INDEX IF NOT EXISTS `ix_changes_entity` ON `cellar`.`changes` (owner_id, entity, entity_id);
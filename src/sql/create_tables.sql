@@ -52,6 +52,53 @@ CREATE TABLE IF NOT EXISTS `cellar`.`wines`(
      `alcohol_vol_perc` DECIMAL(3, 1) UNSIGNED,
      `geographic_info` TEXT,
      `quality_signature` VARCHAR(200),
+     `country` VARCHAR(100),
+     `region` VARCHAR(100),
+     `producer` VARCHAR(200),
      unique(`name`, `vintage`),
      PRIMARY KEY (id)
 );
+CREATE TABLE IF NOT EXISTS `cellar`.`owner_summary`(
+     `owner_id` INT UNSIGNED NOT NULL,
+     `bottles` INT NOT NULL DEFAULT 0,
+     `volume_cl` INT NOT NULL DEFAULT 0,
+     PRIMARY KEY (owner_id)
+);
+
+CREATE TABLE IF NOT EXISTS `cellar`.`owner_type_vintage_summary`(
+     `owner_id` INT UNSIGNED NOT NULL,
+     `type` VARCHAR(20) NOT NULL,
+     `vintage` SMALLINT UNSIGNED NOT NULL,
+     `bottles` INT NOT NULL DEFAULT 0,
+     `volume_cl` INT NOT NULL DEFAULT 0,
+     PRIMARY KEY (owner_id, type, vintage)
+);
+
+CREATE TABLE IF NOT EXISTS `cellar`.`drink_window`(
+     `owner_id` INT UNSIGNED NOT NULL,
+     `drink_year` SMALLINT UNSIGNED NOT NULL,
+     `cellar_id` INT UNSIGNED NOT NULL,
+     PRIMARY KEY (owner_id, drink_year, cellar_id)
+);
+
+CREATE TABLE IF NOT EXISTS `cellar`.`wine_grapes`(
+     `wine_id` INT UNSIGNED NOT NULL,
+     `grape` VARCHAR(100) NOT NULL,
+     PRIMARY KEY (wine_id, grape)
+);
+
+CREATE TABLE IF NOT EXISTS `cellar`.`changes`(
+     `id` INTEGER UNSIGNED NOT NULL AUTO_INCREMENT,
+     `owner_id` INT UNSIGNED NOT NULL,
+     `entity` VARCHAR(20) NOT NULL,
+     `entity_id` INT UNSIGNED NOT NULL,
+     `operation` VARCHAR(10) NOT NULL,
+     `changed_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+     PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS `cellar`.`changes_compaction`(
+     `id` TINYINT UNSIGNED NOT NULL,
+     `pruned_through` INT UNSIGNED NOT NULL DEFAULT 0,
+     PRIMARY KEY (id)
+);
@@ -0,0 +1,4 @@
+ALTER TABLE `cellar`.`wines`
+    ADD COLUMN IF NOT EXISTS `country` VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS `region` VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS `producer` VARCHAR(200);
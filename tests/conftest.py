@@ -1,7 +1,9 @@
+import re
 import json
 import copy
 
 from typing import Any
+from contextlib import contextmanager
 
 import pytest
 
@@ -14,6 +16,7 @@ from polyfactory.factories.pydantic_factory import ModelFactory
 from sqlalchemy.exc import IntegrityError
 from mysql.connector.errors import DataError
 
+from db.rows import to_rows
 from api import dependencies, db_initialisation, constants
 from api.models import CellarInModel, ConsumedBottleModel
 
@@ -23,7 +26,9 @@ SQLITE_DB_URL = 'sqlite://'
 @pytest.fixture()
 def test_app(database_service_monkeypatch):
     from api.main import app
+    from api.constants import RATE_LIMIT_BACKEND
     add_pagination(app)
+    RATE_LIMIT_BACKEND.clear()
     client = TestClient(app)
     yield client
 
@@ -186,6 +191,9 @@ def db_monkeypatch(in_memory_db_conn, monkeypatch):
             return query
 
         def _alter_query(self, query: str) -> str:
+            # SQLite has no AUTO_INCREMENT table option, the ids continue above the highest id instead
+            if re.match(r"\s*ALTER TABLE \S+ AUTO_INCREMENT", query):
+                return "SELECT 1"
             query = (query.replace('AUTO_INCREMENT', '')
                      .replace(')s', '')
                      .replace('`', '')
@@ -193,7 +201,10 @@ def db_monkeypatch(in_memory_db_conn, monkeypatch):
                      .replace('%(', ':')
                      .replace('cellar.', '')
                      .replace('NOT NULL', '')
-                     .replace('TRUNCATE TABLE', 'DELETE FROM'))
+                     .replace('TRUNCATE TABLE', 'DELETE FROM')
+                     .replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET'))
+            # MariaDB refers to the values of a conflicting insert with VALUES(col), SQLite with excluded.col
+            query = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', query)
 
             # make sure to insert a unique id when adding a user to the db
             if 'INSERT INTO owners (name' in query:
@@ -212,7 +223,7 @@ def db_monkeypatch(in_memory_db_conn, monkeypatch):
         def _show_query_patch(self, query: str):
             if "tables" in query:
                 if self._tables_exist:
-                    return [1, 2, 3, 4, 5]
+                    return [("cellar", ), ("owners", ), ("storages", ), ("ratings", ), ("wines", )]
                 else:
                     return []
             elif "databases" in query:
@@ -230,11 +241,17 @@ def db_monkeypatch(in_memory_db_conn, monkeypatch):
             cursor = self.conn.execute(self._alter_query(query), params)
             result = cursor.fetchall()
             if get_fields:
-                cols = [key for key in cursor.keys()]
-                result = [{col: value for col, value in zip(cols, row)} for row in result]
+                result = to_rows(list(cursor.keys()), result)
 
             return result
 
+        def execute_query_select_batches(self, query: str, params: dict[str, Any] | list | tuple | None = None,
+                                         batch_size: int = 1000):
+            cursor = self.conn.execute(self._alter_query(query), params or {})
+            cols = [key for key in cursor.keys()]
+            while rows := cursor.fetchmany(batch_size):
+                yield to_rows(cols, rows)
+
         def _single_query(self, query: str, params: dict[str, Any] | list | tuple | None = None):
             if query == "use cellar" or query == "drop schema cellar":
                 return
@@ -265,6 +282,17 @@ def db_monkeypatch(in_memory_db_conn, monkeypatch):
                 for q, param in zip(query, params):
                     self._single_query(query=q, params=param)
 
+        @contextmanager
+        def read_snapshot(self):
+            yield
+
+        def create_records(self, data: dict | list, table: str) -> None:
+            records = [data] if isinstance(data, dict) else data
+            for record in records:
+                self._single_query(query=f"INSERT INTO {table} ({', '.join(record)}) "
+                                         f"VALUES ({', '.join(f'%({column})s' for column in record)})",
+                                   params=record)
+
         def execute_sql_file(self, file_path: str, params: Any | None = None, multi: bool = False) -> None:
             with open(file=file_path, mode='r') as sql_file:
                 queries = sql_file.read().split(';')[:-1]
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from api.admission import DbAdmission
+
+
+@pytest.mark.unit
+def test_admission_within_limit():
+    async def run():
+        admission = DbAdmission(max_concurrency=2)
+        assert await admission.acquire("read") and await admission.acquire("write")
+        assert admission.stats()["active"] == 2
+        admission.release()
+        admission.release()
+        return admission.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 0 and stats["admitted"] == 2 and stats["queued"] == 0
+
+
+@pytest.mark.unit
+def test_admission_queue_order():
+    async def run():
+        admission = DbAdmission(max_concurrency=1, timeout_seconds=1.)
+        admitted = []
+
+        async def request(name: str, kind: str):
+            if await admission.acquire(kind):
+                admitted.append(name)
+                await asyncio.sleep(0)
+                admission.release()
+
+        assert await admission.acquire("read")
+        tasks = [asyncio.create_task(request(name, kind))
+                 for name, kind in (("read_1", "read"), ("write_1", "write"), ("read_2", "read"),
+                                    ("write_2", "write"))]
+        await asyncio.sleep(0)
+        assert admission.queue_length == 4
+        admission.release()
+        await asyncio.gather(*tasks)
+        return admitted, admission.stats()
+
+    admitted, stats = asyncio.run(run())
+    # Writes are admitted before reads, each in order of arrival
+    assert admitted == ["write_1", "write_2", "read_1", "read_2"]
+    assert stats["active"] == 0 and stats["queue_length"] == 0 and stats["queued"] == 4
+
+
+@pytest.mark.unit
+def test_admission_shedding():
+    async def run():
+        admission = DbAdmission(max_concurrency=1, max_queue=1, timeout_seconds=0.01)
+        assert await admission.acquire("write")
+        waiting = asyncio.create_task(admission.acquire("read"))
+        await asyncio.sleep(0)
+        # The queue is full, so the request is shed without waiting
+        assert not await admission.acquire("read")
+        # The waiting request is shed once its timeout expires
+        assert not await waiting
+        admission.release()
+        assert await admission.acquire("read")
+        admission.release()
+        return admission.stats()
+
+    stats = asyncio.run(run())
+    assert stats["shed_queue_full"] == 1 and stats["shed_timeout"] == 1
+    assert stats["active"] == 0 and stats["queue_length"] == 0
+    assert stats["max_wait_seconds"] >= 0.01
@@ -3,6 +3,8 @@ import pytest
 from datetime import timedelta
 
 from api import authentication
+from api.admission import DbAdmission
+from api.dependencies import LazyDbConn
 
 
 @pytest.fixture
@@ -46,6 +48,21 @@ def test_get_user_exists(test_app, db_monkeypatch):
     assert result.id == 0
 
 
+@pytest.mark.unit
+def test_get_user_cached(test_app, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    authentication.USER_CACHE.invalidate('admin')
+    authentication.get_user(username='admin', user_db=db_test_conn)
+    assert authentication.USER_CACHE.get('admin')['username'] == 'admin'
+    assert 'password' not in authentication.USER_CACHE.get('admin')
+
+    class NoDb:
+        def execute_query_select(self, *args, **kwargs):
+            raise AssertionError("cached users are not retrieved from the DB")
+
+    assert authentication.get_user(username='admin', user_db=NoDb()).id == 0
+
+
 @pytest.mark.unit
 def test_get_user_not_exists(test_app, db_monkeypatch):
     db_test_conn = db_monkeypatch
@@ -103,12 +120,32 @@ async def test_get_current_user(scopes, test_app, db_monkeypatch, token_new_user
                                                    user_db=db_conn,
                                                    response=resp)
     result = result.dict()
-    del result['password']
+    assert 'password' not in result
     del cellar_all_user_data['password']
     del result['id']
     assert result == cellar_all_user_data
 
 
+@pytest.mark.asyncio
+async def test_get_current_user_admission(test_app, db_monkeypatch, token_new_user, cellar_all_user_data):
+    token, user_id = token_new_user(data=cellar_all_user_data)
+    user_db = LazyDbConn(connect=lambda: db_monkeypatch, admission=DbAdmission(max_concurrency=0, max_queue=0))
+    authentication.USER_CACHE.invalidate(cellar_all_user_data['username'])
+    # Looking the user up in the DB requires an admission, the request is shed when none is available
+    with pytest.raises(authentication.HTTPException) as error:
+        await authentication.get_current_user(security_scopes=authentication.SecurityScopes(),
+                                              token=token['access_token'], user_db=user_db,
+                                              response=authentication.Response())
+    assert error.value.status_code == 503
+
+    # Cached users do not use the DB, so they need no admission
+    authentication.get_user(username=cellar_all_user_data['username'], user_db=db_monkeypatch)
+    result = await authentication.get_current_user(security_scopes=authentication.SecurityScopes(),
+                                                   token=token['access_token'], user_db=user_db,
+                                                   response=authentication.Response())
+    assert result.id == user_id and not user_db.connected
+
+
 @pytest.mark.asyncio
 async def test_get_current_user_unauthorized_scopes(test_app, db_monkeypatch, token_new_user, cellar_all_user_data):
     security_scopes = authentication.SecurityScopes(scopes=["A"])
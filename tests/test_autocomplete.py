@@ -0,0 +1,76 @@
+import pytest
+
+from api import autocomplete, cache_backends
+
+
+@pytest.mark.unit
+def test_fold():
+    assert autocomplete.fold("  Côte  Rôtie ") == "cote rotie"
+
+
+@pytest.mark.unit
+def test_suggest():
+    index = autocomplete.WineNameIndex()
+    index.add(wine_id=1, name="Barolo Castiglione", vintage=2016)
+    index.add(wine_id=2, name="barbaresco", vintage=2019)
+    index.add(wine_id=3, name="Barolo Castiglione", vintage=2017)
+    index.add(wine_id=4, name="Côte Rôtie", vintage=2015)
+
+    assert [wine["wine_id"] for wine in index.suggest(prefix="BAR")] == [2, 1, 3]
+    assert [wine["wine_id"] for wine in index.suggest(prefix="barolo", limit=1)] == [1]
+    assert index.suggest(prefix="cote r") == [{"wine_id": 4, "name": "Côte Rôtie", "vintage": 2015}]
+    assert index.suggest(prefix="chianti") == []
+
+
+@pytest.mark.unit
+def test_bounded_memory():
+    index = autocomplete.WineNameIndex(max_entries=2)
+    index.add(wine_id=1, name="Barolo", vintage=2016)
+    index.add(wine_id=2, name="Barbaresco", vintage=2016)
+    index.add(wine_id=3, name="Barbera", vintage=2016)
+    assert len(index) == 2
+    # the oldest wine is dropped
+    assert [wine["wine_id"] for wine in index.suggest(prefix="bar")] == [2, 3]
+
+    index.add(wine_id=2, name="Barbaresco", vintage=2016)
+    assert len(index) == 2
+    index.clear()
+    assert len(index) == 0 and not index.loaded
+
+
+class FakeDb:
+    def __init__(self):
+        self.queries = []
+
+    def execute_query_select(self, query: str, params: dict):
+        self.queries.append(params)
+        return [(1, "Barolo", 2016)] if "max_entries" in params else [(3, "Barbera", 2020)]
+
+
+@pytest.mark.unit
+def test_added_wines_between_workers(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(autocomplete.time, 'monotonic', lambda: now[0])
+    backend = cache_backends.InProcessCacheBackend()
+    worker_a = autocomplete.WineNameIndex(backend=backend, namespace="wine_names")
+    worker_b = autocomplete.WineNameIndex(backend=backend, namespace="wine_names", ttl_seconds=10)
+    db = FakeDb()
+    worker_a.ensure_loaded(db_conn=db)
+    worker_b.ensure_loaded(db_conn=db)
+    db.queries.clear()
+
+    # a worker does not fetch the wines it added itself, the other worker fetches those it misses on the next lookup
+    worker_a.publish([1, 3])
+    worker_a.ensure_loaded(db_conn=db)
+    assert not db.queries
+    worker_b.ensure_loaded(db_conn=db)
+    assert db.queries == [{"wine_0": 3}]
+    assert [wine["wine_id"] for wine in worker_b.suggest(prefix="bar")] == [3, 1]
+
+    # the index is reloaded once it is older than the TTL
+    now[0] += 11
+    worker_b.ensure_loaded(db_conn=db)
+    assert "max_entries" in db.queries[-1] and len(worker_b) == 1
+
+    worker_a.clear()
+    assert not worker_b.loaded
@@ -0,0 +1,103 @@
+import pytest
+
+from api import cache, cache_backends
+
+
+@pytest.mark.unit
+def test_owner_cache():
+    owner_cache = cache.OwnerCache()
+    assert owner_cache.get(1) is None
+
+    owner_cache.set(1, {"total_bottles": 6})
+    owner_cache.set(2, {"total_bottles": 1})
+    assert owner_cache.get(1) == {"total_bottles": 6}
+
+    owner_cache.invalidate(1)
+    assert owner_cache.get(1) is None
+    assert owner_cache.get(2) == {"total_bottles": 1}
+
+    owner_cache.clear()
+    assert owner_cache.get(2) is None
+
+
+@pytest.mark.unit
+def test_wine_catalogue_cache():
+    catalogue_cache = cache.WineCatalogueCache(max_entries=2)
+    assert catalogue_cache.get_id(name="Barolo", vintage=2016) is None
+    assert not catalogue_cache.contains_id(1)
+
+    catalogue_cache.add(wine_id=1, name="Barolo", vintage=2016)
+    catalogue_cache.add(wine_id=2)
+    assert catalogue_cache.get_id(name="Barolo", vintage=2016) == 1
+    assert catalogue_cache.contains_id(2)
+    assert catalogue_cache.stats() == {"hits": 2, "misses": 2, "hit_ratio": 0.5, "cached_names": 1, "cached_ids": 2}
+
+    # the least recently used wine is dropped
+    catalogue_cache.contains_id(1)
+    catalogue_cache.add(wine_id=3, name="Barbera", vintage=2020)
+    assert catalogue_cache.contains_id(1) and not catalogue_cache.contains_id(2)
+
+    catalogue_cache.clear()
+    assert catalogue_cache.stats()["cached_ids"] == 0 and catalogue_cache.stats()["hits"] == 0
+
+
+@pytest.mark.unit
+def test_wine_catalogue_cache_warm(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    wines = db_test_conn.execute_query_select(query="SELECT id, name, vintage FROM cellar.wines")
+    catalogue_cache = cache.WineCatalogueCache()
+    catalogue_cache.warm(db_conn=db_test_conn)
+    assert catalogue_cache.stats()["cached_ids"] == len(wines)
+    assert all(catalogue_cache.get_id(name=name, vintage=vintage) == wine_id for wine_id, name, vintage in wines)
+
+
+@pytest.mark.unit
+def test_owner_cache_ttl(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    owner_cache = cache.OwnerCache(ttl_seconds=10)
+    owner_cache.set(1, {("cellar", "rack"): 3})
+
+    now[0] += 10
+    assert owner_cache.get(1) == {("cellar", "rack"): 3}
+    now[0] += 1
+    assert owner_cache.get(1) is None
+
+
+@pytest.mark.unit
+def test_shared_cache_value_ttl(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(cache_backends.time, 'monotonic', lambda: now[0])
+    shared_cache = cache.SharedCache(backend=cache_backends.InProcessCacheBackend(), namespace="stats", ttl_seconds=60)
+    # a value that depends on the date expires before the other values
+    shared_cache.set(1, {"drinkable_now": 3}, ttl_seconds=10)
+    shared_cache.set(2, {"drinkable_now": 1})
+
+    now[0] += 11
+    assert shared_cache.get(1) is None
+    assert shared_cache.get(2) == {"drinkable_now": 1}
+    assert 0 < cache.seconds_until_midnight() <= 24 * 3600
+
+
+@pytest.mark.unit
+def test_owner_versions():
+    owner_versions = cache.OwnerVersions(backend=cache_backends.InProcessCacheBackend())
+    version = owner_versions.get(1)
+    assert owner_versions.get(1) == version
+    assert owner_versions.get(2) != version
+
+    owner_versions.bump(1)
+    assert owner_versions.get(1) != version
+
+
+@pytest.mark.unit
+def test_owner_versions_ttl(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(cache_backends.time, 'monotonic', lambda: now[0])
+    owner_versions = cache.OwnerVersions(backend=cache_backends.InProcessCacheBackend(), ttl_seconds=300)
+    version = owner_versions.get(1)
+
+    now[0] += 300
+    assert owner_versions.get(1) == version
+    now[0] += 1
+    assert owner_versions.get(1) != version
@@ -0,0 +1,105 @@
+import pytest
+
+from api import cache, cache_backends
+from api.search_index import SearchIndex
+from api.autocomplete import WineNameIndex
+
+
+@pytest.fixture(params=["in_process", "redis"])
+def cache_backend(request):
+    if request.param == "in_process":
+        return cache_backends.InProcessCacheBackend()
+    return cache_backends.RedisCacheBackend(client=cache_backends.InMemoryRedis())
+
+
+@pytest.mark.unit
+def test_cache_backend(cache_backend, monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(cache_backends.time, 'monotonic', lambda: now[0])
+    cache_backend.set("stats:1", b"a")
+    cache_backend.set("stats:2", b"b", ttl_seconds=5)
+    cache_backend.set("users:admin", b"c")
+    assert cache_backend.get("stats:1") == b"a" and cache_backend.get("stats:2") == b"b"
+
+    now[0] += 6
+    assert cache_backend.get("stats:2") is None
+    cache_backend.delete_prefix("stats:")
+    assert cache_backend.get("stats:1") is None
+    assert cache_backend.get("users:admin") == b"c"
+    cache_backend.delete("users:admin")
+    assert cache_backend.get("users:admin") is None
+
+    messages = []
+    cache_backend.subscribe(messages.append)
+    cache_backend.publish("stats:1")
+    assert messages == ["stats:1"]
+
+
+@pytest.mark.unit
+def test_shared_cache(cache_backend):
+    shared_cache = cache.SharedCache(backend=cache_backend, namespace="stats")
+    assert shared_cache.get(1) is None
+    shared_cache.set(1, {"bottles_per_vintage": {2016: 3}})
+    shared_cache.set(2, {"total_bottles": 1})
+    # values are serialised as JSON
+    assert shared_cache.get(1) == {"bottles_per_vintage": {"2016": 3}}
+
+    shared_cache.invalidate(1)
+    assert shared_cache.get(1) is None and shared_cache.get(2) == {"total_bottles": 1}
+    shared_cache.clear()
+    assert shared_cache.get(2) is None
+
+
+@pytest.mark.unit
+def test_invalidation_between_workers():
+    # two workers connected to the same Redis service
+    redis = cache_backends.InMemoryRedis()
+    worker_a = cache_backends.RedisCacheBackend(client=redis)
+    worker_b = cache_backends.RedisCacheBackend(client=redis)
+    storages_a = cache.OwnerCache(backend=worker_a, namespace="storages")
+    storages_b = cache.OwnerCache(backend=worker_b, namespace="storages")
+    stats_b = cache.OwnerCache(backend=worker_b, namespace="stats")
+    storages_b.set(1, {"cellar": 3})
+    storages_b.set(2, {"fridge": 4})
+    stats_b.set(1, {"total_bottles": 6})
+
+    storages_a.invalidate(1)
+    assert storages_b.get(1) is None and storages_b.get(2) == {"fridge": 4}
+    assert stats_b.get(1) == {"total_bottles": 6}
+    storages_a.clear()
+    assert storages_b.get(2) is None
+
+    cache.SharedCache(backend=worker_a, namespace="users").set("admin", {"id": 0})
+    assert cache.SharedCache(backend=worker_b, namespace="users").get("admin") == {"id": 0}
+
+
+@pytest.mark.unit
+def test_clear_indexes_between_workers():
+    redis = cache_backends.InMemoryRedis()
+    worker_a = cache_backends.RedisCacheBackend(client=redis)
+    worker_b = cache_backends.RedisCacheBackend(client=redis)
+    catalogue_b = cache.WineCatalogueCache(backend=worker_b, namespace="wines")
+    search_b = SearchIndex(backend=worker_b, namespace="search")
+    names_b = WineNameIndex(backend=worker_b, namespace="wine_names")
+    catalogue_b.add(wine_id=1, name="Barolo", vintage=2016)
+    search_b.add_wine(wine_id=1, name="Barolo", vintage=2016)
+    search_b.loaded = True
+    names_b.add(wine_id=1, name="Barolo", vintage=2016)
+    names_b.loaded = True
+
+    cache.WineCatalogueCache(backend=worker_a, namespace="wines").clear()
+    SearchIndex(backend=worker_a, namespace="search").clear()
+    WineNameIndex(backend=worker_a, namespace="wine_names").clear()
+    assert not catalogue_b.contains_id(1)
+    assert not search_b.loaded and not search_b.search("barolo", owner_id=1, owner_wines={1})
+    assert not names_b.loaded and not names_b.suggest("bar")
+
+
+@pytest.mark.unit
+def test_cache_backend_from_url():
+    assert isinstance(cache_backends.cache_backend_from_url(None), cache_backends.InProcessCacheBackend)
+    backend = cache_backends.cache_backend_from_url("memory://")
+    assert isinstance(backend, cache_backends.RedisCacheBackend)
+    assert isinstance(backend.client, cache_backends.InMemoryRedis)
+    with pytest.raises(ValueError):
+        cache_backends.cache_backend_from_url("memcached://localhost")
@@ -1,9 +1,17 @@
+import json
+import asyncio
+import datetime
+import contextlib
+
 import pytest
 
 from fastapi import HTTPException
 from polyfactory.pytest_plugin import register_fixture
 from polyfactory.factories.pydantic_factory import ModelFactory
 
+from api import db_initialisation
+from api.admission import DbAdmission
+from api.constants import DRINK_WINDOW_MAX_YEARS
 from api.routers import cellar_funcs
 from api.models import GeographicInfoModel, RatingModel, CellarOutModel
 
@@ -22,7 +30,7 @@ class RatingModelFactory(ModelFactory[RatingModel]):
 def test_unpack_geo_info(geographic_info_factory: GeographicInfoFactory):
     geographic_info = geographic_info_factory.build()
     unpacked = (f"country: {geographic_info.country},\tregion: {geographic_info.region},"
-                f"\tadditional_info: {geographic_info.additional_info}")
+                f"\tproducer: {geographic_info.producer},\tadditional_info: {geographic_info.additional_info}")
     assert cellar_funcs.unpack_geo_info(geographic_info=geographic_info) == unpacked
 
 
@@ -40,6 +48,12 @@ async def test_get_storage_id(test_app, token_new_user, cellar_all_user_data, ne
                                                    description=storage_unit_data['description'])
     assert storage_id[0] == get_resp[-1]['id']
 
+    # the lookup ignores case and trailing spaces, like the collation of the storages table
+    storage_id = await cellar_funcs.get_storage_id(db_conn=db_test_conn, current_user_id=user_id,
+                                                   location=f"{storage_unit_data['location'].upper()}  ",
+                                                   description=storage_unit_data['description'].swapcase())
+    assert storage_id[0] == get_resp[-1]['id']
+
 
 @pytest.mark.asyncio
 async def test_get_storage_id_non_existing(test_app, cellar_all_user_data, new_storage_unit,
@@ -69,6 +83,28 @@ async def test_verify_storage_exists(test_app, token_new_user, cellar_all_user_d
                                                              user_id=user_id)
 
 
+@pytest.mark.asyncio
+async def test_verify_storage_exists_cached(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                            fake_storage_unit_x, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    storage_id = get_resp[-1]['id']
+    assert await cellar_funcs.verify_storage_exists_for_user(db_conn=db_test_conn, storage_id=storage_id,
+                                                             user_id=user_id)
+    assert (storage_unit_data['location'], storage_unit_data['description']) in cellar_funcs.STORAGE_CACHE.get(user_id)
+
+    # deleting the storage unit invalidates the cached storage units of the owner
+    test_app.delete(url=f"/cellar/storages/delete?location={storage_unit_data['location']}"
+                        f"&description={storage_unit_data['description']}",
+                    headers={"Authorization": f"Bearer {token['access_token']}"})
+    assert cellar_funcs.STORAGE_CACHE.get(user_id) is None
+    assert not await cellar_funcs.verify_storage_exists_for_user(db_conn=db_test_conn, storage_id=storage_id,
+                                                                 user_id=user_id)
+
+
 @pytest.mark.asyncio
 async def test_verify_storage_exists_non_existing(test_app, cellar_all_user_data, db_monkeypatch, token_new_user):
     db_test_conn = db_monkeypatch
@@ -366,3 +402,172 @@ async def test_get_cellar_out_data(test_app, token_new_user, cellar_all_user_dat
                                                               where="WHERE c.owner_id = %(user_id)s",
                                                               params={"user_id": user_id}
                                                               ))
+
+
+@pytest.mark.asyncio
+async def test_get_cellar_stats(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                fake_storage_unit_x, bottle_cellar_fixture, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    stats_before = cellar_funcs.get_cellar_stats(db_conn=db_test_conn, owner_id=user_id)
+
+    # add bottle
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=6, storage_unit=get_resp[-1]['id'])
+    stats = cellar_funcs.get_cellar_stats(db_conn=db_test_conn, owner_id=user_id)
+
+    assert stats['total_bottles'] == stats_before['total_bottles'] + 6
+    assert stats['total_litres'] == pytest.approx(stats_before['total_litres'] +
+                                                  bottle_info.bottle_size_cl * 6 / 100)
+    assert stats['bottles_per_storage_unit'][get_resp[-1]['id']] == 6
+    assert stats['bottles_per_type'][bottle_info.wine_info.type] >= 6
+    assert stats['bottles_per_vintage'][bottle_info.wine_info.vintage] >= 6
+    assert sum(stats['bottles_per_storage_unit'].values()) == stats['total_bottles']
+
+
+@pytest.mark.asyncio
+async def test_get_drink_window_forecast(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                         fake_storage_unit_x, cellar_in_model_factory, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    forecast_before = cellar_funcs.get_drink_window_forecast(db_conn=db_test_conn, owner_id=user_id,
+                                                             from_year=2600, to_year=2606)
+
+    # add bottles with a window from 2601 up to and including 2604
+    wine_data = cellar_in_model_factory.build()
+    wine_data.storage_unit = get_resp[-1]['id']
+    wine_data.quantity = 4
+    wine_data.wine_info.drink_from = datetime.date(2601, 1, 1)
+    wine_data.wine_info.drink_before = datetime.date(2604, 6, 1)
+    test_app.post(url='/cellar/wine_in_cellar/add',
+                  data=json.dumps(wine_data.dict(), default=str),
+                  headers={"content-type": "application/json",
+                           "Authorization": f"Bearer {token['access_token']}"})
+    forecast = cellar_funcs.get_drink_window_forecast(db_conn=db_test_conn, owner_id=user_id,
+                                                      from_year=2600, to_year=2606)
+    delta = {entry['year']: {k: v - before[k] for k, v in entry.items() if k != 'year'}
+             for entry, before in zip(forecast, forecast_before)}
+
+    assert [entry['year'] for entry in forecast] == list(range(2600, 2607))
+    assert [delta[year]['in_window'] for year in range(2600, 2607)] == [0, 4, 4, 4, 4, 0, 0]
+    assert [delta[year]['entering'] for year in range(2600, 2607)] == [0, 4, 0, 0, 0, 0, 0]
+    assert [delta[year]['leaving'] for year in range(2600, 2607)] == [0, 0, 0, 0, 4, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_owner_summary_maintained(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                        fake_storage_unit_x, bottle_cellar_fixture, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    summary_before = cellar_funcs.get_owner_summary(db_conn=db_test_conn, owner_id=user_id)
+
+    # add bottles through both the insert and the update path
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=6, storage_unit=get_resp[-1]['id'])
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=bottle_info.wine_info.name,
+                                               vintage=bottle_info.wine_info.vintage)
+    await cellar_funcs.add_bottle_to_cellar(db_conn=db_test_conn, wine_id=wine_id, owner_id=user_id,
+                                            wine_data=bottle_info)
+    summary = cellar_funcs.get_owner_summary(db_conn=db_test_conn, owner_id=user_id)
+    per_type_vintage = {(entry['type'], entry['vintage']): entry['bottles'] for entry in summary['per_type_vintage']}
+    assert summary['bottles'] == summary_before['bottles'] + 12
+    assert per_type_vintage[(bottle_info.wine_info.type, bottle_info.wine_info.vintage)] >= 12
+
+    # consume all bottles
+    bottle_info.quantity = 12
+    await cellar_funcs.update_quantity_in_cellar(db_conn=db_test_conn, wine_id=wine_id, bottle_data=bottle_info,
+                                                 add=False)
+    summary = cellar_funcs.get_owner_summary(db_conn=db_test_conn, owner_id=user_id)
+    assert summary['bottles'] == summary_before['bottles']
+    assert summary['litres'] == pytest.approx(summary_before['litres'])
+    assert len(summary['per_type_vintage']) == len(summary_before['per_type_vintage'])
+
+
+@pytest.mark.unit
+def test_get_drinkable_bottles_far_ahead(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    params = {"owner_id": 9995, "drink_from": datetime.date(2020, 1, 1), "drink_before": datetime.date(9999, 12, 31)}
+    db_test_conn.execute_query("INSERT INTO cellar.cellar (wine_id, storage_unit, owner_id, bottle_size_cl, quantity, "
+                               "                           drink_from, drink_before) "
+                               "VALUES (NULL, NULL, %(owner_id)s, 75, 1, %(drink_from)s, %(drink_before)s)",
+                               params=params)
+    db_initialisation.rebuild_drink_window(db_conn=db_test_conn, owner_id=params["owner_id"])
+
+    # an open-ended window is only stored up to a number of years ahead, later years are looked up on the dates
+    last_year = db_test_conn.execute_query_select(query="SELECT MAX(drink_year) FROM cellar.drink_window "
+                                                        "WHERE owner_id = %(owner_id)s", params=params)[0][0]
+    assert last_year == datetime.date.today().year + DRINK_WINDOW_MAX_YEARS
+    for drink_year in (2020, last_year, last_year + 1, 5000):
+        bottles = cellar_funcs.get_drinkable_bottles(db_conn=db_test_conn, owner_id=params["owner_id"],
+                                                     drink_year=drink_year)
+        assert [bottle["owner_id"] for bottle in bottles] == [params["owner_id"]]
+
+    # clean up
+    db_test_conn.execute_query(["DELETE FROM cellar.drink_window WHERE owner_id = %(owner_id)s",
+                                "DELETE FROM cellar.cellar WHERE owner_id = %(owner_id)s"], params=[params, params])
+
+
+@pytest.mark.unit
+def test_get_dashboard_section_unknown(db_monkeypatch):
+    with pytest.raises(ValueError, match="wines"):
+        cellar_funcs.get_dashboard_section(db_conn=db_monkeypatch, owner_id=1, section="wines")
+
+
+@pytest.mark.unit
+def test_get_dashboard_admission(db_monkeypatch):
+    open_connections, max_open = [], []
+
+    @contextlib.contextmanager
+    def connect():
+        open_connections.append(1)
+        max_open.append(len(open_connections))
+        try:
+            yield db_monkeypatch
+        finally:
+            open_connections.pop()
+
+    admission = DbAdmission(max_concurrency=1)
+    dashboard = asyncio.run(cellar_funcs.get_dashboard(connect=connect, owner_id=0, sections=["storages", "bottles"],
+                                                       admission=admission))
+    assert dashboard["storages"] is not None and dashboard["bottles"] is not None
+    # Each section is admitted on its own, so the sections do not exceed the concurrency limit
+    assert max(max_open) == 1
+    assert admission.stats()["admitted"] == 2 and admission.stats()["active"] == 0
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(cellar_funcs.get_dashboard(connect=connect, owner_id=0, sections=["storages"],
+                                               admission=DbAdmission(max_concurrency=0, max_queue=0)))
+    assert error.value.status_code == 503
+
+
+@pytest.mark.unit
+def test_get_changes_safety_lag(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    params = {"owner_id": 9996}
+    last_change = db_test_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes")[0][0] or 0
+    pruned_through = db_test_conn.execute_query_select(query="SELECT pruned_through FROM cellar.changes_compaction")
+    since = max([last_change, *(row[0] for row in pruned_through)])
+    changed_at = datetime.datetime.now() - datetime.timedelta(minutes=1)
+    db_test_conn.execute_query(["INSERT INTO cellar.changes (owner_id, entity, entity_id, operation, changed_at) "
+                                "VALUES (%(owner_id)s, 'cellar', 1, 'delete', %(changed_at)s)",
+                                "INSERT INTO cellar.changes (owner_id, entity, entity_id, operation) "
+                                "VALUES (%(owner_id)s, 'cellar', 2, 'delete')"],
+                               params=[{**params, "changed_at": changed_at}, params])
+
+    # the recent change may still be overtaken by a change committed later, so it is held back for the lag
+    changes = cellar_funcs.get_changes(db_conn=db_test_conn, owner_id=params["owner_id"], since=since, limit=10,
+                                       lag_seconds=30)
+    assert [change["entity_id"] for change in changes["changes"]] == [1]
+    assert changes["version"] == changes["changes"][0]["version"]
+    changes = cellar_funcs.get_changes(db_conn=db_test_conn, owner_id=params["owner_id"], since=since, limit=10)
+    assert [change["entity_id"] for change in changes["changes"]] == [1, 2]
+
+    # clean up
+    db_test_conn.execute_query("DELETE FROM cellar.changes WHERE owner_id = %(owner_id)s", params=params)
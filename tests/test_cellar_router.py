@@ -6,6 +6,7 @@ from fastapi import status
 from polyfactory.pytest_plugin import register_fixture
 from polyfactory.factories.pydantic_factory import ModelFactory
 
+from api import constants
 from api.routers import cellar_funcs
 from api.models import CellarInModel, RatingInDbModel, ConsumedBottleModel
 
@@ -270,3 +271,63 @@ async def test_move_bottle_to_other_storage_no_storage(test_app, token_new_user,
                               headers={"content-type": "application/json",
                                        "Authorization": f"Bearer {token['access_token']}"})
     assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_storage_changes_are_pushed(test_app, token_new_user, cellar_all_user_data, fake_storage_unit_x):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    subscription = constants.EVENT_BROADCASTER.subscribe(owner_id=user_id)
+    try:
+        response = test_app.post(url='/cellar/storages/add',
+                                 data=json.dumps(fake_storage_unit_x()),
+                                 headers={"content-type": "application/json",
+                                          "Authorization": f"Bearer {token['access_token']}"})
+        assert response.status_code == status.HTTP_200_OK
+        event = await subscription.get(timeout=1)
+        assert event == {"event": "storage_added", "version": constants.OWNER_VERSIONS.get(user_id)}
+    finally:
+        constants.EVENT_BROADCASTER.unsubscribe(subscription)
+
+
+@pytest.mark.asyncio
+async def test_import_bottles_file(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                   fake_storage_unit_x):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    post_resp, get_resp = new_storage_unit(storage_unit_data=fake_storage_unit_x(), token=token)
+    storage_id = get_resp[-1]['id']
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    bottles_before = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles', headers=headers).json()
+
+    csv_file = ("name,vintage,grapes,type,drink_before,country,storage_unit,quantity\n"
+                f"imported wine {user_id},2019,\"Syrah 80%, Grenache\",red,2035-01-01,France,{storage_id},2\n"
+                f"imported wine {user_id},2019,Syrah,red,2035-01-01,France,{storage_id},1\n"
+                f"imported wine {user_id},2019,Syrah,red,2035-01-01,France,{storage_id},-1\n")
+    response = test_app.post(url='/cellar/import', headers=headers,
+                             files={"file": ("cellar.csv", csv_file.encode(), "text/csv")})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    # the test client runs the background job before returning the response
+    job = test_app.get(url=f"/cellar/import/{response.json()['job_id']}", headers=headers).json()
+    assert (job['status'], job['rows_processed'], job['rows_imported'], job['rows_failed']) == ('done', 3, 2, 1)
+    assert job['errors'] == [{"row": 3, "errors": ["quantity should be a positive integer"]}]
+
+    bottles = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles', headers=headers).json()
+    imported = [bottle for bottle in bottles if bottle['name'] == f"imported wine {user_id}"]
+    assert len(bottles) == len(bottles_before) + 1
+    assert [(bottle['quantity'], bottle['storage_unit']) for bottle in imported] == [(3, storage_id)]
+    summary = test_app.get(url='/cellar_views/summary', headers=headers).json()
+    assert summary['bottles'] == sum(bottle['quantity'] for bottle in bottles)
+
+
+@pytest.mark.unit
+def test_import_bottles_file_invalid(test_app, token_new_user, cellar_all_user_data):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    response = test_app.post(url='/cellar/import', headers=headers,
+                             files={"file": ("cellar.xlsx", b"", "application/octet-stream")})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = test_app.get(url='/cellar/import/unknown', headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,10 +1,17 @@
+import io
+import json
+import datetime
+
+import polars
 import pytest
 
 from fastapi import status
 from polyfactory.pytest_plugin import register_fixture
 from polyfactory.factories.pydantic_factory import ModelFactory
 
-from api.routers import cellar_funcs
+from api import dependencies
+from api.constants import USER_CACHE
+from api.routers import cellar_funcs, cellar_views_router
 from api.models import CellarOutModel, RatingModel
 
 
@@ -97,6 +104,75 @@ async def test_get_your_ratings(test_app, token_new_user, cellar_all_user_data,
     assert len(response.json()) >= 1
 
 
+@pytest.mark.asyncio
+async def test_get_ratings_of_wines(test_app, token_new_user, cellar_all_user_data, db_monkeypatch, new_storage_unit,
+                                    rating_model_factory: RatingModelFactory, fake_storage_unit_x,
+                                    bottle_cellar_fixture, monkeypatch):
+    db_test_conn = db_monkeypatch
+    token, user_id = token_new_user(data=cellar_all_user_data)
+    post_resp, get_resp = new_storage_unit(storage_unit_data=fake_storage_unit_x(), token=token)
+    wine_ids = []
+    for _ in range(2):
+        resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=1, storage_unit=get_resp[-1]['id'])
+        wine_ids.append(await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=bottle_info.wine_info.name,
+                                                         vintage=bottle_info.wine_info.vintage))
+    await cellar_funcs.add_rating_to_db(db_conn=db_test_conn, user_id=user_id, rating=rating_model_factory.build(),
+                                        wine_id=wine_ids[0])
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    response = test_app.get(url=f'/cellar_views/wine_in_cellar/ratings?wine_ids={wine_ids[0]},999999,'
+                                f'{wine_ids[1]},{wine_ids[0]}', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    ratings = response.json()
+    assert list(ratings['ratings']) == [str(wine_ids[0]), str(wine_ids[1])]
+    assert [(rating['rater_id'], rating['wine_id']) for rating in ratings['ratings'][str(wine_ids[0])]] == \
+           [(user_id, wine_ids[0])]
+    assert ratings['ratings'][str(wine_ids[1])] == []
+    assert ratings['missing_wine_ids'] == [999999]
+    all_ratings = test_app.get(url=f'/cellar_views/wine_in_cellar/ratings?wine_ids={wine_ids[0]}'
+                                   f'&only_your_ratings=false', headers=headers).json()
+    assert len(all_ratings['ratings'][str(wine_ids[0])]) >= 1
+
+    response = test_app.get(url='/cellar_views/wine_in_cellar/ratings?wine_ids=1,a', headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    monkeypatch.setattr(cellar_views_router, 'RATINGS_MAX_WINE_IDS', 1)
+    response = test_app.get(url='/cellar_views/wine_in_cellar/ratings?wine_ids=1,2', headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_get_your_dashboard(test_app, token_new_user, cellar_all_user_data, db_monkeypatch, new_storage_unit,
+                                  rating_model_factory: RatingModelFactory, fake_storage_unit_x,
+                                  bottle_cellar_fixture):
+    db_test_conn = db_monkeypatch
+    token, user_id = token_new_user(data=cellar_all_user_data)
+    post_resp, get_resp = new_storage_unit(storage_unit_data=fake_storage_unit_x(), token=token)
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=2, storage_unit=get_resp[-1]['id'])
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=bottle_info.wine_info.name,
+                                               vintage=bottle_info.wine_info.vintage)
+    for _ in range(3):
+        await cellar_funcs.add_rating_to_db(db_conn=db_test_conn, user_id=user_id, wine_id=wine_id,
+                                            rating=rating_model_factory.build())
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    response = test_app.get(url='/cellar_views/dashboard?recent_ratings=2', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    dashboard = response.json()
+    assert dashboard['storages'] == test_app.get(url='/cellar_views/storages/get', headers=headers).json()
+    assert dashboard['bottles'] == test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles',
+                                                headers=headers).json()
+    assert dashboard['drink_now'] == test_app.get(url='/cellar_views/wine_in_cellar/drink_in_window',
+                                                  headers=headers).json()
+    assert len(dashboard['recent_ratings']) == 2
+    assert {rating['rater_id'] for rating in dashboard['recent_ratings']} == {user_id}
+
+    response = test_app.get(url='/cellar_views/dashboard?sections=storages&sections=storages', headers=headers)
+    assert response.json() == {"storages": dashboard['storages'], "bottles": None, "recent_ratings": None,
+                               "drink_now": None}
+    response = test_app.get(url='/cellar_views/dashboard?sections=wines', headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 @pytest.mark.asyncio
 async def test_get_your_bottles_no_storage_unit(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
                                                 fake_storage_unit_x, bottle_cellar_fixture, db_monkeypatch):
@@ -172,3 +248,374 @@ async def test_get_bottle_open_window(test_app, token_new_user, cellar_all_user_
                                      "Authorization": f"Bearer {token['access_token']}"})
 
     assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_get_stats(test_app, token_new_user, cellar_all_user_data, new_storage_unit, fake_storage_unit_x,
+                         bottle_cellar_fixture):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    stats_before = test_app.get(url='/cellar_views/stats', headers=headers).json()
+
+    # adding a bottle invalidates the cached stats
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=3, storage_unit=get_resp[-1]['id'])
+    response = test_app.get(url='/cellar_views/stats', headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['total_bottles'] == stats_before['total_bottles'] + 3
+    assert response.json()['bottles_per_storage_unit'][str(get_resp[-1]['id'])] == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, n_years", [("", 20), ("?from=2020&to=2029", 10), ("?from=2020&to=2020", 1)])
+async def test_forecast_drink_window(test_app, token_new_user, cellar_all_user_data, query, n_years):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    response = test_app.get(url=f'/cellar_views/drink_window_forecast{query}',
+                            headers={"content-type": "application/json",
+                                     "Authorization": f"Bearer {token['access_token']}"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == n_years
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", ["?from=2030&to=2020", "?from=2000&to=2999"])
+async def test_forecast_drink_window_invalid_range(test_app, token_new_user, cellar_all_user_data, query):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    response = test_app.get(url=f'/cellar_views/drink_window_forecast{query}',
+                            headers={"content-type": "application/json",
+                                     "Authorization": f"Bearer {token['access_token']}"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_get_summary(test_app, token_new_user, cellar_all_user_data, new_storage_unit, fake_storage_unit_x,
+                           bottle_cellar_fixture):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    summary_before = test_app.get(url='/cellar_views/summary', headers=headers).json()
+
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=2, storage_unit=get_resp[-1]['id'])
+    response = test_app.get(url='/cellar_views/summary', headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['bottles'] == summary_before['bottles'] + 2
+    assert response.json()['bottles'] == sum(entry['bottles'] for entry in response.json()['per_type_vintage'])
+
+
+@pytest.mark.asyncio
+async def test_get_bottle_open_window_years(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                            fake_storage_unit_x, cellar_in_model_factory, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    wine_data = cellar_in_model_factory.build()
+    wine_data.storage_unit = get_resp[-1]['id']
+    wine_data.quantity = 2
+    wine_data.wine_info.drink_from = datetime.date(2701, 1, 1)
+    wine_data.wine_info.drink_before = datetime.date(2703, 6, 1)
+    test_app.post(url='/cellar/wine_in_cellar/add', data=json.dumps(wine_data.dict(), default=str), headers=headers)
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=wine_data.wine_info.name,
+                                               vintage=wine_data.wine_info.vintage)
+
+    def drinkable_in(year: int) -> bool:
+        response = test_app.get(url=f'/cellar_views/wine_in_cellar/drink_in_window?drink_year={year}',
+                                headers=headers)
+        return any(bottle['wine_id'] == wine_id for bottle in response.json())
+
+    assert [drinkable_in(year) for year in range(2700, 2705)] == [False, True, True, True, False]
+
+    # consumed bottles are no longer drinkable
+    consumed_bottle_info = {"bottle_data": {"wine_id": wine_id, "storage_unit": wine_data.storage_unit,
+                                            "bottle_size_cl": wine_data.bottle_size_cl, "quantity": 2},
+                            "rating": None}
+    test_app.patch(url='/cellar/wine_in_cellar/consumed?rate_bottle=false',
+                   data=json.dumps(consumed_bottle_info, default=str), headers=headers)
+    assert not drinkable_in(2702)
+
+
+@pytest.mark.asyncio
+async def test_filter_your_bottles(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                   fake_storage_unit_x, cellar_in_model_factory, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    wine_data = cellar_in_model_factory.build()
+    wine_data.storage_unit = get_resp[-1]['id']
+    wine_data.wine_info.grapes = "Nebbiolo 85%, Barbera"
+    wine_data.wine_info.geographic_info.country = "Italy"
+    wine_data.wine_info.geographic_info.region = "Piedmont"
+    test_app.post(url='/cellar/wine_in_cellar/add', data=json.dumps(wine_data.dict(), default=str), headers=headers)
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=wine_data.wine_info.name,
+                                               vintage=wine_data.wine_info.vintage)
+
+    def filtered(query: str) -> list[int]:
+        response = test_app.get(url=f'/cellar_views/wine_in_cellar/filter?{query}', headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return [bottle['wine_id'] for bottle in response.json()]
+
+    assert wine_id in filtered("region=Piedmont&grape=Nebbiolo")
+    assert wine_id in filtered("country=Italy&grape=nebbiolo&grape=Barbera")
+    assert wine_id not in filtered("region=Piedmont&grape=Sangiovese")
+    assert wine_id not in filtered("region=Bordeaux")
+    assert all(bottle['owner_id'] == user_id
+               for bottle in test_app.get(url='/cellar_views/wine_in_cellar/filter', headers=headers).json())
+
+
+@pytest.mark.asyncio
+async def test_search(test_app, token_new_user, cellar_all_user_data, new_storage_unit, fake_storage_unit_x,
+                      cellar_in_model_factory, rating_model_factory, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    # the first search loads the index, the writes below update it incrementally
+    cellar_funcs.SEARCH_INDEX.clear()
+    response = test_app.get(url='/cellar_views/search?q=zwxquartz', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['items'] == []
+
+    wine_data = cellar_in_model_factory.build()
+    wine_data.storage_unit = get_resp[-1]['id']
+    wine_data.wine_info.name = "Zwxquartz Riserva"
+    test_app.post(url='/cellar/wine_in_cellar/add', data=json.dumps(wine_data.dict(), default=str), headers=headers)
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=wine_data.wine_info.name,
+                                               vintage=wine_data.wine_info.vintage)
+    rating_data = rating_model_factory.build()
+    rating_data.comments = "Smoky plumvexta notes"
+    test_app.post(url=f'/cellar/wine_in_cellar/add_rating?wine_id={wine_id}',
+                  data=json.dumps(rating_data.dict(), default=str), headers=headers)
+
+    response = test_app.get(url='/cellar_views/search?q=zwxquartz plumvexta&size=10', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [item['wine_id'] for item in response.json()['items']] == [wine_id]
+    assert len(response.json()['items'][0]['rating_ids']) == 1
+    assert test_app.get(url='/cellar_views/search?q=', headers=headers).status_code == \
+           status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_wine_name(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                      fake_storage_unit_x, cellar_in_model_factory, db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    # the first lookup loads the index, the wine added below is inserted incrementally
+    cellar_funcs.WINE_NAME_INDEX.clear()
+    response = test_app.get(url='/cellar_views/wines/autocomplete?prefix=Qüvrex', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+    wine_data = cellar_in_model_factory.build()
+    wine_data.storage_unit = get_resp[-1]['id']
+    wine_data.wine_info.name = "Qüvrex Grand Cru"
+    test_app.post(url='/cellar/wine_in_cellar/add', data=json.dumps(wine_data.dict(), default=str), headers=headers)
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_test_conn, name=wine_data.wine_info.name,
+                                               vintage=wine_data.wine_info.vintage)
+
+    response = test_app.get(url='/cellar_views/wines/autocomplete?prefix=quvrex g&limit=5', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"wine_id": wine_id, "name": wine_data.wine_info.name,
+                                "vintage": wine_data.wine_info.vintage}]
+    assert test_app.get(url='/cellar_views/wines/autocomplete?prefix=', headers=headers).status_code == \
+           status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_get_catalogue_cache_stats(test_app, token_admin, token_new_user, cellar_all_user_data,
+                                         bottle_cellar_fixture, new_storage_unit, fake_storage_unit_x):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"content-type": "application/json", "Authorization": f"Bearer {token['access_token']}"}
+    admin_headers = {"Authorization": f"Bearer {token_admin['access_token']}"}
+    stats_before = test_app.get(url='/users/catalogue_cache_stats', headers=admin_headers).json()
+
+    # adding the same wine twice, the second add resolves the wine from the cache
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=1, storage_unit=get_resp[-1]['id'])
+    test_app.post(url='/cellar/wine_in_cellar/add', data=json.dumps(bottle_info.dict(), default=str), headers=headers)
+    response = test_app.get(url='/users/catalogue_cache_stats', headers=admin_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['hits'] >= stats_before['hits'] + 2
+    assert response.json()['cached_names'] >= 1
+
+    # the statistics cover the wines of all users, so they are for admins only
+    response = test_app.get(url='/users/catalogue_cache_stats', headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("if_none_match, matches", [(None, False), ('"abc"', True), ('W/"abc"', True), ('*', True),
+                                                    ('"def", "abc"', True), ('"def"', False)])
+def test_etag_matches(if_none_match, matches):
+    assert cellar_views_router.etag_matches(if_none_match, '"abc"') == matches
+
+
+@pytest.mark.asyncio
+async def test_get_your_bottles_conditional(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                            fake_storage_unit_x, bottle_cellar_fixture):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    response = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles', headers=headers)
+    etag = response.headers['ETag']
+
+    response = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles',
+                            headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b''
+    assert response.headers['ETag'] == etag
+
+    # a write bumps the version of the owner's data
+    bottle_cellar_fixture(token=token, add=True, quantity=1, storage_unit=get_resp[-1]['id'])
+    response = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles',
+                            headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['ETag'] != etag
+    assert test_app.get(url='/cellar_views/wine_in_cellar/get_your_ratings',
+                        headers={**headers, "If-None-Match": response.headers['ETag']}).status_code == \
+           status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.asyncio
+async def test_get_changes(test_app, token_new_user, cellar_all_user_data, new_storage_unit, fake_storage_unit_x,
+                           bottle_cellar_fixture, db_monkeypatch, monkeypatch):
+    # changes are returned immediately instead of after the safety lag
+    monkeypatch.setattr(cellar_views_router, "CHANGE_LOG_SAFETY_LAG_SECONDS", 0)
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    # a full resync is requested when deletes after 'since' were compacted, syncing continues from the returned version
+    response = test_app.get(url='/cellar_views/changes?since=0', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    version = response.json()['version']
+
+    # only the entities changed after the synced version are returned, with their current data
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    storage_id = get_resp[-1]['id']
+    resp, bottle_info = bottle_cellar_fixture(token=token, add=True, quantity=2, storage_unit=storage_id)
+    changes = test_app.get(url=f'/cellar_views/changes?since={version}', headers=headers).json()
+    assert not changes['full_resync'] and not changes['has_more']
+    assert [(change['entity'], change['operation']) for change in changes['changes']] == [("storage", "upsert"),
+                                                                                           ("cellar", "upsert")]
+    assert changes['changes'][0]['data']['id'] == storage_id
+    cellar_entry = changes['changes'][1]['data']
+    assert cellar_entry['quantity'] == 2 and cellar_entry['storage_unit'] == storage_id
+    assert changes['version'] > version
+
+    # consuming all bottles leaves a tombstone
+    wine_id = await cellar_funcs.get_bottle_id(db_conn=db_monkeypatch, name=bottle_info.wine_info.name,
+                                               vintage=bottle_info.wine_info.vintage)
+    consumed_bottle_info = {"bottle_data": {"wine_id": wine_id, "storage_unit": storage_id,
+                                            "bottle_size_cl": bottle_info.bottle_size_cl, "quantity": 2},
+                            "rating": None}
+    test_app.patch(url='/cellar/wine_in_cellar/consumed?rate_bottle=false',
+                   data=json.dumps(consumed_bottle_info, default=str),
+                   headers={"content-type": "application/json", **headers})
+    changes = test_app.get(url=f'/cellar_views/changes?since={version}', headers=headers).json()
+    assert changes['changes'][-1] == {"version": changes['version'], "entity": "cellar",
+                                      "entity_id": cellar_entry['cellar_id'], "operation": "delete", "data": None}
+    assert test_app.get(url=f'/cellar_views/changes?since={version}&limit=1', headers=headers).json()['has_more']
+
+
+@pytest.mark.asyncio
+async def test_get_your_bottles_arrow(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                      fake_storage_unit_x, bottle_cellar_fixture):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    bottle_cellar_fixture(token=token, add=True, quantity=2, storage_unit=get_resp[-1]['id'])
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    bottles = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles', headers=headers)
+    assert bottles.headers['vary'] == 'Accept'
+
+    response = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles',
+                            headers={**headers, "Accept": "application/vnd.apache.arrow.stream"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'] == 'application/vnd.apache.arrow.stream'
+    assert response.headers['etag'] == bottles.headers['etag']
+    arrow = polars.read_ipc_stream(io.BytesIO(response.content))
+    assert [(bottle['cellar_id'], str(bottle['drink_before'])) for bottle in arrow.to_dicts()] == \
+           [(bottle['cellar_id'], bottle['drink_before']) for bottle in bottles.json()]
+
+    response = test_app.get(url='/cellar_views/storages/get',
+                            headers={**headers, "Accept": "application/vnd.apache.arrow.stream"})
+    assert polars.read_ipc_stream(io.BytesIO(response.content))['id'].to_list() == [unit['id'] for unit in get_resp]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("export_format", ["csv", "ndjson", "parquet"])
+async def test_export_your_bottles(test_app, token_new_user, cellar_all_user_data, new_storage_unit,
+                                   fake_storage_unit_x, bottle_cellar_fixture, export_format):
+    user_data = cellar_all_user_data
+    token, user_id = token_new_user(data=user_data)
+    storage_unit_data = fake_storage_unit_x()
+    post_resp, get_resp = new_storage_unit(storage_unit_data=storage_unit_data, token=token)
+    bottle_cellar_fixture(token=token, add=True, quantity=3, storage_unit=get_resp[-1]['id'])
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    bottles = test_app.get(url='/cellar_views/wine_in_cellar/get_your_bottles', headers=headers).json()
+
+    response = test_app.get(url=f'/cellar_views/export?format={export_format}&gzip=true', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['content-disposition'] == f'attachment; filename="cellar.{export_format}"'
+    if export_format == "csv":
+        exported = polars.read_csv(io.BytesIO(response.content), try_parse_dates=True).to_dicts()
+    elif export_format == "ndjson":
+        exported = [json.loads(line) for line in response.text.splitlines()]
+    else:
+        exported = polars.read_parquet(io.BytesIO(response.content)).to_dicts()
+    assert [(bottle['cellar_id'], bottle['quantity'], str(bottle['drink_before'])) for bottle in exported] == \
+           [(bottle['cellar_id'], bottle['quantity'], bottle['drink_before']) for bottle in bottles]
+
+
+@pytest.mark.unit
+def test_export_releases_auth_connection(test_app, token_new_user, cellar_all_user_data, monkeypatch):
+    token, user_id = token_new_user(data=cellar_all_user_data)
+    connected, max_connected = set(), []
+    acquire, release = dependencies.LazyDbConn.acquire, dependencies.LazyDbConn.release
+
+    def counting_acquire(self):
+        connected.add(id(self))
+        max_connected.append(len(connected))
+        return acquire(self)
+
+    def counting_release(self):
+        connected.discard(id(self))
+        release(self)
+
+    monkeypatch.setattr(dependencies.LazyDbConn, "acquire", counting_acquire)
+    monkeypatch.setattr(dependencies.LazyDbConn, "release", counting_release)
+    USER_CACHE.invalidate(cellar_all_user_data['username'])
+    response = test_app.get(url='/cellar_views/export?format=csv',
+                            headers={"Authorization": f"Bearer {token['access_token']}"})
+    assert response.status_code == status.HTTP_200_OK
+    # The connection of the authentication is released before the streamed export checks out its own
+    assert max(max_connected) == 1
+    assert not connected
@@ -1,6 +1,6 @@
 import pytest
 
-from api import db_initialisation
+from api import constants, db_initialisation
 
 
 @pytest.fixture
@@ -73,3 +73,124 @@ def test_check_for_admin_user_not_exists(db_monkeypatch):
     db_test_conn.execute_query(query="TRUNCATE TABLE cellar.owners")
     assert not db_initialisation.check_for_admin_user(db_conn=db_test_conn)
     db_initialisation.make_db_admin_user(db_conn=db_test_conn)
+
+
+@pytest.mark.unit
+def test_upgrade_database(db_monkeypatch, monkeypatch):
+    db_test_conn = db_monkeypatch
+    db_test_conn._tables_exist = True
+    sql_files, backfills = [], []
+    monkeypatch.setattr(db_test_conn, 'execute_sql_file', lambda file_path: sql_files.append(file_path))
+    for backfill in ("rebuild_owner_summary", "rebuild_drink_window", "backfill_structured_wine_info"):
+        monkeypatch.setattr(db_initialisation, backfill, lambda db_conn, name=backfill: backfills.append(name))
+
+    # the tables that did not exist yet are filled once from the existing bottles and wines
+    assert db_initialisation.upgrade_database(db_conn=db_test_conn) == ["owner_summary", "owner_type_vintage_summary",
+                                                                        "drink_window", "wine_grapes"]
+    assert backfills == ["rebuild_owner_summary", "rebuild_drink_window", "backfill_structured_wine_info"]
+    assert [file_path.rsplit('/', 1)[-1] for file_path in sql_files] == ["create_tables.sql",
+                                                                        "migrate_structured_wine_info.sql",
+                                                                        "create_indexes.sql"]
+
+
+@pytest.mark.unit
+def test_db_setup_upgrades_existing_db(db_monkeypatch, monkeypatch):
+    upgraded = []
+    monkeypatch.setattr(db_initialisation, 'database_service', lambda restarted: restarted)
+    monkeypatch.setattr(db_initialisation, 'check_for_cellar_db', lambda db_conn: True)
+    monkeypatch.setattr(db_initialisation, 'check_for_admin_user', lambda db_conn: True)
+    monkeypatch.setattr(db_initialisation, 'upgrade_database', lambda db_conn: upgraded.append(db_conn))
+    db_initialisation.db_setup(db_creds=constants.DB_CREDS, restarted=False)
+    assert len(upgraded) == 1
+
+
+@pytest.mark.unit
+def test_rebuild_owner_summary(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    owner_id = 9999
+    if not db_test_conn.execute_query_select(query="SELECT id FROM cellar.wines WHERE name = 'summary_wine'"):
+        db_test_conn.execute_query("INSERT INTO cellar.wines (name, vintage, type) "
+                                   "VALUES ('summary_wine', 1999, 'red')")
+    wine_id = db_test_conn.execute_query_select(query="SELECT id FROM cellar.wines WHERE name = 'summary_wine'")[0][0]
+    # insert bottles while bypassing the summary maintenance
+    db_test_conn.execute_query("INSERT INTO cellar.cellar (wine_id, storage_unit, owner_id, bottle_size_cl, quantity) "
+                               "VALUES (%(wine_id)s, 0, %(owner_id)s, 75, 4)",
+                               params={"wine_id": wine_id, "owner_id": owner_id})
+    assert owner_id in db_initialisation.verify_owner_summary(db_conn=db_test_conn)
+
+    db_initialisation.rebuild_owner_summary(db_conn=db_test_conn, owner_id=owner_id)
+    assert owner_id not in db_initialisation.verify_owner_summary(db_conn=db_test_conn)
+    assert db_test_conn.execute_query_select(query="SELECT bottles, volume_cl FROM cellar.owner_summary "
+                                                   "WHERE owner_id = %(owner_id)s",
+                                             params={"owner_id": owner_id}) == [(4, 300)]
+
+    # clean up and rebuild the summary of all owners
+    db_test_conn.execute_query("DELETE FROM cellar.cellar WHERE owner_id = %(owner_id)s", params={"owner_id": owner_id})
+    db_initialisation.rebuild_owner_summary(db_conn=db_test_conn)
+    assert not db_initialisation.verify_owner_summary(db_conn=db_test_conn)
+
+
+@pytest.mark.unit
+def test_rebuild_drink_window(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    owner_id = 9998
+    # insert a bottle while bypassing the drink window maintenance
+    db_test_conn.execute_query("INSERT INTO cellar.cellar (wine_id, storage_unit, owner_id, bottle_size_cl, quantity, "
+                               "                          drink_from, drink_before) "
+                               "VALUES (0, 0, %(owner_id)s, 75, 1, '2030-01-01', '2032-01-01')",
+                               params={"owner_id": owner_id})
+    db_initialisation.rebuild_drink_window(db_conn=db_test_conn, owner_id=owner_id, batch_size=2)
+    drink_years = db_test_conn.execute_query_select(query="SELECT drink_year FROM cellar.drink_window "
+                                                          "WHERE owner_id = %(owner_id)s ORDER BY drink_year",
+                                                    params={"owner_id": owner_id})
+    assert [year for year, in drink_years] == [2030, 2031, 2032]
+
+    # clean up
+    db_test_conn.execute_query("DELETE FROM cellar.cellar WHERE owner_id = %(owner_id)s", params={"owner_id": owner_id})
+    db_initialisation.rebuild_drink_window(db_conn=db_test_conn, owner_id=owner_id)
+    assert not db_test_conn.execute_query_select(query="SELECT * FROM cellar.drink_window "
+                                                       "WHERE owner_id = %(owner_id)s",
+                                                 params={"owner_id": owner_id})
+
+
+@pytest.mark.unit
+def test_backfill_structured_wine_info(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    params = {"name": "backfill wine", "vintage": 2015, "grapes": "Nebbiolo 100%",
+              "geographic_info": "country: Italy,\tregion: Piedmont,\tproducer: Vietti,\tadditional_info: None"}
+    if not db_test_conn.execute_query_select(query="SELECT id FROM cellar.wines "
+                                                   "WHERE name = %(name)s AND vintage = %(vintage)s", params=params):
+        db_test_conn.execute_query(query="INSERT INTO cellar.wines (name, vintage, grapes, geographic_info) "
+                                         "VALUES (%(name)s, %(vintage)s, %(grapes)s, %(geographic_info)s)",
+                                   params=params)
+    assert db_initialisation.backfill_structured_wine_info(db_conn=db_test_conn, batch_size=2) is None
+
+    wine = db_test_conn.execute_query_select(query="SELECT id, country, region, producer FROM cellar.wines "
+                                                   "WHERE name = %(name)s AND vintage = %(vintage)s", params=params)
+    assert tuple(wine[0][1:]) == ("Italy", "Piedmont", "Vietti")
+    grapes = db_test_conn.execute_query_select(query="SELECT grape FROM cellar.wine_grapes WHERE wine_id = %(wine_id)s",
+                                               params={"wine_id": wine[0][0]})
+    assert [grape[0] for grape in grapes] == ["nebbiolo"]
+
+
+@pytest.mark.unit
+def test_compact_changes(db_monkeypatch):
+    db_test_conn = db_monkeypatch
+    params = {"owner_id": 9997}
+    for entity_id, operation in [(1, "upsert"), (1, "upsert"), (2, "upsert"), (2, "delete")]:
+        db_test_conn.execute_query("INSERT INTO cellar.changes (owner_id, entity, entity_id, operation) "
+                                   "VALUES (%(owner_id)s, 'cellar', %(entity_id)s, %(operation)s)",
+                                   params={**params, "entity_id": entity_id, "operation": operation})
+
+    # a negative retention puts the cutoff in the future, such that all deletes are pruned
+    db_initialisation.compact_changes(db_conn=db_test_conn, retention_days=-1)
+    changes = db_test_conn.execute_query_select(query="SELECT entity_id, operation FROM cellar.changes "
+                                                      "WHERE owner_id = %(owner_id)s", params=params)
+    assert [tuple(change) for change in changes] == [(1, "upsert")]
+    pruned_through = db_test_conn.execute_query_select(query="SELECT pruned_through FROM cellar.changes_compaction")
+    assert pruned_through[0][0] >= db_test_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes "
+                                                                           "WHERE owner_id = %(owner_id)s",
+                                                                     params=params)[0][0]
+
+    # clean up
+    db_test_conn.execute_query("DELETE FROM cellar.changes WHERE owner_id = %(owner_id)s", params=params)
@@ -2,7 +2,7 @@ from typing import Any
 
 import pytest
 
-from db import mariadb_jdbc
+from db import mariadb_jdbc, query_cache
 
 
 @pytest.fixture
@@ -22,19 +22,30 @@ def sqlalchemy_monkeypatch(monkeypatch):
                             def __init__(self):
                                 pass
 
-                            def cursor(self):
+                            def cursor(self, **kwargs):
                                 class MockCursor:
                                     def __init__(self):
                                         self.cursor_init = True
                                         self.column_names = ["a", "b"]
+                                        self.executed = None
+                                        self.executed_many = None
+                                        self.unread = [(1, 2), (3, 4), (5, 6)]
 
-                                    def execute(self, operation: str, params: Any):
+                                    def execute(self, operation: str, params: Any = None):
                                         if operation == "exception":
                                             raise Exception("MOCK EXCEPTION CURSOR EXECUTE")
+                                        self.executed = operation
+
+                                    def executemany(self, operation: str, seq_params: list):
+                                        self.executed_many = (operation, seq_params)
 
                                     def fetchall(self):
                                         return [(1, 2), (3, 4)]
 
+                                    def fetchmany(self, size: int):
+                                        rows, self.unread = self.unread[:size], self.unread[size:]
+                                        return rows
+
                                     def close(self):
                                         self.cursor_init = False
                                 return MockCursor()
@@ -125,6 +136,65 @@ class TestJdbcMariaDB:
             result = db.execute_query_select(query="select test query", get_fields=True)
 
         assert result == [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
+        assert result[0]._index is result[1]._index
+
+    def test_execute_query_select_batches(self):
+        with mariadb_jdbc.JdbcMariaDB(**self.basic_init) as db:
+            batches = list(db.execute_query_select_batches(query="select test query", batch_size=2))
+
+        assert batches == [[{"a": 1, "b": 2}, {"a": 3, "b": 4}], [{"a": 5, "b": 6}]]
+        assert all(isinstance(row, mariadb_jdbc.Row) for batch in batches for row in batch)
+        assert batches[0][0]._index is batches[1][0]._index
+
+    def test_execute_query_select_cached(self):
+        cache = query_cache.QueryCache()
+        with mariadb_jdbc.JdbcMariaDB(**self.basic_init, query_cache=cache) as db:
+            assert db.execute_query_select(query="SELECT * FROM cellar.wines") == [(1, 2), (3, 4)]
+            assert db.execute_query_select(query="SELECT * FROM cellar.wines") == [(1, 2), (3, 4)]
+            assert cache.stats()["hits"] == 1
+
+            db.execute_query(["UPDATE cellar.wines SET name = 'a'", "hello"])
+            db.execute_query_select(query="SELECT * FROM cellar.wines")
+            db.execute_query("hello", invalidates=["cellar.wines"])
+            db.execute_query_select(query="SELECT * FROM cellar.wines")
+        assert cache.stats() == {"hits": 1, "misses": 3, "entries": 1}
+
+    def test_execute_query_select_cached_concurrent_write(self):
+        cache = query_cache.QueryCache()
+        with mariadb_jdbc.JdbcMariaDB(**self.basic_init, query_cache=cache) as db:
+            execute = db.cursor.execute
+
+            def execute_during_write(operation: str, params: Any = None):
+                execute(operation=operation, params=params)
+                # Another connection commits a write after the select ran, but before its result is cached
+                cache.invalidate_tables(["cellar.wines"])
+            db.cursor.execute = execute_during_write
+            db.execute_query_select(query="SELECT * FROM cellar.wines")
+            db.cursor.execute = execute
+            db.execute_query_select(query="SELECT * FROM cellar.wines")
+        assert cache.stats()["hits"] == 0
+
+    def test_execute_query_invalidates_on_failure(self):
+        cache = query_cache.QueryCache()
+        with mariadb_jdbc.JdbcMariaDB(**self.basic_init, query_cache=cache) as db:
+            db.execute_query_select(query="SELECT * FROM cellar.wines")
+            with pytest.raises(Exception):
+                db.execute_query("exception", invalidates=["wines"])
+            db.execute_query_select(query="SELECT * FROM cellar.wines")
+        assert cache.stats()["hits"] == 0
+
+    def test_create_records(self):
+        records = [{"name": "a", "vintage": 2000}, {"name": "b", "vintage": 2001}]
+        with mariadb_jdbc.JdbcMariaDB(**self.basic_init) as db:
+            db.create_records(records, table="cellar.wines")
+            assert db.cursor.executed_many == ("INSERT INTO cellar.wines (name, vintage) "
+                                               "VALUES (%(name)s, %(vintage)s)", records)
+            db.create_records([], table="cellar.wines")
+
+    def test_read_snapshot(self):
+        with mariadb_jdbc.JdbcMariaDB(**self.basic_init) as db:
+            with db.read_snapshot():
+                assert db.cursor.executed == "START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY"
 
     def test_execute_sql_file_multiple_queries(self, tmp_path):
         file_path = tmp_path / "q.sql"
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from api import constants
+from api.admission import DbAdmission
+from api.dependencies import LazyDbConn, DBConnDep, release_db_connections, run_admitted
+
+
+class FakeDb:
+    def __init__(self):
+        self.initiated = 0
+        self.closed = 0
+
+    def _initiate_connection(self):
+        self.initiated += 1
+
+    def _close_connection(self):
+        self.closed += 1
+
+    def execute_query_select(self, query: str):
+        return [(query, )]
+
+
+@pytest.fixture
+def fake_db_handle():
+    created = []
+
+    def connect():
+        created.append(FakeDb())
+        return created[-1]
+
+    return LazyDbConn(connect=connect), created
+
+
+@pytest.mark.unit
+def test_lazy_db_conn(fake_db_handle):
+    handle, created = fake_db_handle
+    assert not handle.connected and not created
+    handle.release()
+
+    assert handle.execute_query_select("q1") == [("q1", )]
+    assert handle.execute_query_select("q2") == [("q2", )]
+    assert handle.connected and len(created) == 1 and created[0].initiated == 1
+
+    handle.release()
+    assert not handle.connected and created[0].closed == 1
+    handle.execute_query_select("q3")
+    assert len(created) == 2
+
+
+@pytest.mark.unit
+def test_db_conn_dep():
+    dependency = DBConnDep(db_creds=constants.DB_CREDS, pool_size=3, max_overflow=1)
+    assert dependency.engine is dependency.engine
+    assert dependency.engine.pool.size() == 3
+
+    generator = dependency()
+    handle = next(generator)
+    assert isinstance(handle, LazyDbConn) and not handle.connected
+    handle.execute_query_select(query="SELECT 1")
+    assert handle.connected
+    with pytest.raises(StopIteration):
+        next(generator)
+    assert not handle.connected
+
+
+@pytest.mark.unit
+def test_release_db_connections(fake_db_handle):
+    handle, created = fake_db_handle
+
+    async def endpoint(db_conn, streaming: bool):
+        db_conn.execute_query_select("q")
+        return StreamingResponse(iter([b""])) if streaming else "done"
+
+    def sync_endpoint(db_conn):
+        db_conn.execute_query_select("q")
+        return "done"
+
+    wrapped = release_db_connections(endpoint)
+    assert asyncio.run(wrapped(db_conn=handle, streaming=False)) == "done"
+    assert not handle.connected
+    # Streaming responses may still query the DB, their connection is released by the dependency
+    asyncio.run(wrapped(db_conn=handle, streaming=True))
+    assert handle.connected
+
+    handle.release()
+    assert asyncio.run(release_db_connections(sync_endpoint)(db_conn=handle)) == "done"
+    assert not handle.connected and len(created) == 3
+
+
+@pytest.mark.unit
+def test_release_db_connections_shed(fake_db_handle):
+    handle, created = fake_db_handle
+    handle.admission = DbAdmission(max_concurrency=0, max_queue=0, retry_after_seconds=3)
+
+    def endpoint(db_conn):
+        return db_conn.execute_query_select("q")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(release_db_connections(endpoint, kind="read")(db_conn=handle))
+    assert error.value.status_code == 503 and error.value.headers == {"Retry-After": "3"}
+    assert not created and handle.admission.stats()["shed_queue_full"] == 1
+
+    handle.admission = DbAdmission(max_concurrency=1)
+    assert asyncio.run(release_db_connections(endpoint, kind="read")(db_conn=handle)) == [("q", )]
+    assert not handle.connected and handle.admission.stats()["active"] == 0
+
+
+@pytest.mark.unit
+def test_release_db_connections_streaming_admission(fake_db_handle):
+    handle, created = fake_db_handle
+    handle.admission = DbAdmission(max_concurrency=1)
+
+    async def endpoint(db_conn):
+        async def rows():
+            yield str(db_conn.execute_query_select("q")).encode()
+        return StreamingResponse(rows())
+
+    async def stream():
+        response = await release_db_connections(endpoint, kind="read")(db_conn=handle)
+        # The stream still queries the DB, so its admission is held until the stream ends
+        assert handle.admission.stats()["active"] == 1
+        chunks = [chunk async for chunk in response.body_iterator]
+        assert not handle.connected and handle.admission.stats()["active"] == 0
+        await response.background()
+        assert handle.admission.stats()["active"] == 0
+        return chunks
+
+    assert asyncio.run(stream()) == [b"[('q',)]"] and len(created) == 1
+
+
+@pytest.mark.unit
+def test_run_admitted():
+    admission = DbAdmission(max_concurrency=1, timeout_seconds=0.01, retry_after_seconds=0)
+
+    def job(value):
+        assert admission.stats()["active"] == 1
+        return value
+
+    async def run():
+        # A background job is not shed but waits until it is admitted
+        assert await admission.acquire("read")
+        task = asyncio.create_task(run_admitted(admission, "write", job, "done"))
+        await asyncio.sleep(0.05)
+        assert not task.done() and admission.stats()["shed_timeout"] >= 1
+        admission.release()
+        return await task
+
+    assert asyncio.run(run()) == "done"
+    assert admission.stats()["active"] == 0
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from api import events, cache_backends
+
+
+@pytest.mark.asyncio
+async def test_event_broadcaster_between_workers():
+    backend = cache_backends.RedisCacheBackend(client=cache_backends.InMemoryRedis())
+    worker_1 = events.EventBroadcaster(backend=backend)
+    worker_2 = events.EventBroadcaster(backend=backend)
+    subscription = worker_2.subscribe(owner_id=1)
+    other_owner = worker_2.subscribe(owner_id=2)
+    assert worker_2.subscribers(owner_id=1) == 1 and worker_1.subscribers(owner_id=1) == 0
+
+    worker_1.publish(owner_id=1, event={"event": "bottles_added", "version": "abc"})
+    assert await subscription.get(timeout=1) == {"event": "bottles_added", "version": "abc"}
+    assert await other_owner.get(timeout=0.01) is None
+
+    worker_2.unsubscribe(subscription)
+    assert worker_2.subscribers(owner_id=1) == 0
+
+
+@pytest.mark.asyncio
+async def test_event_broadcaster_backpressure():
+    broadcaster = events.EventBroadcaster(max_queued=2)
+    subscription = broadcaster.subscribe(owner_id=1)
+    for version in range(4):
+        broadcaster.publish(owner_id=1, event={"event": "bottle_moved", "version": version})
+    await asyncio.sleep(0)
+
+    # the oldest events are dropped and the client is told to resync before receiving the latest events
+    assert await subscription.get(timeout=1) == {"event": "resync", "dropped": 2}
+    assert [(await subscription.get(timeout=1))["version"] for _ in range(2)] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_event_stream():
+    broadcaster = events.EventBroadcaster()
+    subscription = broadcaster.subscribe(owner_id=1)
+    disconnected = iter([False, False, True])
+
+    async def is_disconnected():
+        return next(disconnected)
+
+    stream = events.event_stream(subscription=subscription, is_disconnected=is_disconnected, heartbeat_seconds=0.01,
+                                 on_close=lambda: broadcaster.unsubscribe(subscription))
+    assert await stream.__anext__() == 'event: connected\ndata: {"event": "connected"}\n\n'
+    assert await stream.__anext__() == ": heartbeat\n\n"
+    broadcaster.publish(owner_id=1, event={"event": "storage_added", "version": "abc"})
+    assert await stream.__anext__() == 'event: storage_added\ndata: {"event": "storage_added", "version": "abc"}\n\n'
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert broadcaster.subscribers(owner_id=1) == 0
@@ -0,0 +1,52 @@
+import io
+import gzip
+import json
+import datetime
+
+import polars as pl
+import pytest
+
+from api import exports
+from db.rows import to_rows
+
+
+SCHEMA = {"name": pl.Utf8, "quantity": pl.Int64, "drink_before": pl.Date}
+BATCHES = [[{"name": "Barolo", "quantity": 2, "drink_before": datetime.date(2030, 1, 1)}],
+           [{"name": "Chablis, 1er cru", "quantity": 1, "drink_before": "2026-01-01"}]]
+
+
+@pytest.mark.unit
+def test_csv_chunks():
+    chunks = list(exports.csv_chunks(batches=BATCHES, columns=list(SCHEMA)))
+    assert len(chunks) == 2
+    assert b"".join(chunks) == (b'name,quantity,drink_before\nBarolo,2,2030-01-01\n'
+                                b'"Chablis, 1er cru",1,2026-01-01\n')
+    assert list(exports.csv_chunks(batches=[], columns=list(SCHEMA))) == [b"name,quantity,drink_before\n"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("batches", [BATCHES, [to_rows(list(SCHEMA), [tuple(row.values()) for row in batch])
+                                               for batch in BATCHES]])
+def test_ndjson_chunks(batches):
+    lines = b"".join(exports.ndjson_chunks(batches=batches)).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"name": "Barolo", "quantity": 2, "drink_before": "2030-01-01"},
+                                                    {"name": "Chablis, 1er cru", "quantity": 1,
+                                                     "drink_before": "2026-01-01"}]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("batches", [BATCHES, []])
+def test_parquet_chunks(batches):
+    frame = pl.read_parquet(io.BytesIO(b"".join(exports.parquet_chunks(batches=batches, schema=SCHEMA))))
+    assert frame.schema == SCHEMA
+    assert frame["drink_before"].to_list() == [row["drink_before"] if isinstance(row["drink_before"], datetime.date)
+                                               else datetime.date.fromisoformat(row["drink_before"])
+                                               for batch in batches for row in batch]
+
+
+@pytest.mark.unit
+def test_export_chunks_gzip():
+    compressed = b"".join(exports.export_chunks(batches=BATCHES, export_format="ndjson", schema=SCHEMA, gzip=True))
+    assert gzip.decompress(compressed) == b"".join(exports.ndjson_chunks(batches=BATCHES))
+    with pytest.raises(ValueError):
+        list(exports.export_chunks(batches=BATCHES, export_format="xlsx", schema=SCHEMA))
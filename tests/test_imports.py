@@ -0,0 +1,97 @@
+import datetime
+
+import polars as pl
+import pytest
+
+from api import imports, jobs
+
+
+@pytest.fixture
+def import_file(tmp_path):
+    def write_file(rows: list[dict], file_format: str = "csv") -> str:
+        file_path = str(tmp_path / f"import.{file_format}")
+        frame = pl.DataFrame(rows)
+        frame.write_csv(file_path) if file_format == "csv" else frame.write_parquet(file_path)
+        return file_path
+
+    return write_file
+
+
+def bottle_row(**fields) -> dict:
+    return {"name": "import wine", "vintage": "2018", "type": "red", "drink_before": "2030-01-01",
+            "country": "France", "storage_unit": "1", "quantity": "2", **fields}
+
+
+@pytest.mark.unit
+def test_validate_import_chunk(import_file):
+    file_path = import_file([bottle_row(), bottle_row(vintage="3018", quantity="0", drink_from="2020-13-01"),
+                             bottle_row(storage_unit="2"), bottle_row(vintage=None)])
+    chunk = imports.scan_import_file(file_path=file_path, file_format="csv").collect()
+    valid, errors = imports.validate_import_chunk(chunk=chunk, storage_ids={1})
+
+    assert valid["row"].to_list() == [1, 4]
+    assert valid.row(0, named=True) | {"row": None} == {
+        "row": None, "name": "import wine", "vintage": 2018, "grapes": "None", "type": "red",
+        "drink_from": datetime.date(2018, 1, 1), "drink_before": datetime.date(2030, 1, 1),
+        "alcohol_vol_perc": 13.5, "country": "France", "region": "None", "producer": "None",
+        "additional_info": "None", "quality_signature": "None", "storage_unit": 1, "bottle_size_cl": 75.,
+        "quantity": 2}
+    assert valid["vintage"][1] == imports.CURRENT_YEAR
+    assert errors == [{"row": 2, "errors": ["vintage should be an integer between 1 and 2999",
+                                            "drink_from should be a date formatted as YYYY-MM-DD",
+                                            "quantity should be a positive integer"]},
+                      {"row": 3, "errors": ["storage_unit should be the id of one of your storage units"]}]
+
+
+@pytest.mark.unit
+def test_scan_import_file_missing_columns(import_file):
+    file_path = import_file([{"name": "import wine", "quantity": 1}], file_format="parquet")
+    with pytest.raises(ValueError, match="drink_before, country, storage_unit"):
+        imports.scan_import_file(file_path=file_path, file_format="parquet")
+
+
+@pytest.mark.unit
+def test_import_jobs():
+    registry = jobs.ImportJobs(max_jobs=1, max_reported_errors=1)
+    job = registry.create(owner_id=1, file_name="cellar.csv")
+    assert job["status"] == "queued"
+    assert registry.get(job_id=job["job_id"], owner_id=2) is None
+
+    registry.add_progress(job["job_id"], processed=3, imported=1, errors=[{"row": 1, "errors": ["a"]},
+                                                                         {"row": 2, "errors": ["b"]}])
+    progress = registry.get(job_id=job["job_id"], owner_id=1)
+    assert (progress["rows_processed"], progress["rows_imported"], progress["rows_failed"]) == (3, 1, 2)
+    assert progress["errors"] == [{"row": 1, "errors": ["a"]}]
+
+    # finished jobs are dropped once the registry is full
+    registry.update(job["job_id"], status="done")
+    registry.create(owner_id=1, file_name="cellar.csv")
+    assert registry.get(job_id=job["job_id"], owner_id=1) is None
+
+
+@pytest.mark.unit
+def test_import_wines_matches_names_case_insensitively(import_file):
+    class CollatingDb:
+        """Matches names like the case- and accent-insensitive collation of MariaDB, unlike the SQLite test DB."""
+        def __init__(self):
+            self.wines = [(1, "Barolo", 2018)]
+            self.inserted = []
+
+        def execute_query_select(self, query: str, params: dict):
+            names = {imports.fold(name) for name in params.values()}
+            return [wine for wine in self.wines if imports.fold(wine[1]) in names]
+
+        def create_records(self, records: list[dict], table: str):
+            if table == "cellar.wines":
+                self.wines += [(len(self.wines) + 1, record["name"], record["vintage"]) for record in records]
+                self.inserted += [record["name"] for record in records]
+
+    file_path = import_file([bottle_row(name="barolo"), bottle_row(name="BAROLO "), bottle_row(name="Barbera"),
+                             bottle_row(name="barbera")])
+    chunk = imports.scan_import_file(file_path=file_path, file_format="csv").collect()
+    valid, _ = imports.validate_import_chunk(chunk=chunk, storage_ids={1})
+    db = CollatingDb()
+
+    wine_ids = imports.import_wines(db_conn=db, bottles=valid)
+    assert db.inserted == ["Barbera"]
+    assert wine_ids == {("barolo", 2018): 1, ("barbera", 2018): 2}
@@ -0,0 +1,57 @@
+import pytest
+
+from api import manage
+
+
+@pytest.fixture
+def manage_db_monkeypatch(db_monkeypatch, monkeypatch):
+    monkeypatch.setattr(manage, 'JdbcMariaDB', type(db_monkeypatch))
+    # The ALTER TABLE migrations are MariaDB specific, the mock DB already holds the latest tables
+    monkeypatch.setattr(manage, 'upgrade_database', lambda db_conn: None)
+    return db_monkeypatch
+
+
+@pytest.mark.unit
+def test_parse_args():
+    args = manage.parse_args(["rebuild-summary", "--owner-id", "3", "--verify"])
+    assert args.command == "rebuild-summary"
+    assert args.owner_id == 3
+    assert args.verify and not args.verify_only
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("argv", [["rebuild-summary"], ["rebuild-summary", "--verify"],
+                                  ["rebuild-summary", "--verify-only"]])
+def test_rebuild_summary(manage_db_monkeypatch, argv):
+    assert manage.main(argv) == 0
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("argv", [["rebuild-drink-window"], ["rebuild-drink-window", "--owner-id", "1"]])
+def test_rebuild_drink_window(manage_db_monkeypatch, argv):
+    assert manage.main(argv) == 0
+
+
+@pytest.mark.unit
+def test_migrate_wine_info(manage_db_monkeypatch):
+    assert manage.main(["migrate-wine-info"]) == 0
+
+
+@pytest.mark.unit
+def test_compact_changes(manage_db_monkeypatch):
+    assert manage.main(["compact-changes", "--retention-days", "30"]) == 0
+
+
+@pytest.mark.unit
+def test_snapshot_restore(manage_db_monkeypatch, tmp_path):
+    directory = str(tmp_path / "snapshot")
+    assert manage.main(["snapshot", directory, "--batch-size", "100"]) == 0
+    # Without a shared cache backend the restore is refused unless the API is stopped
+    assert manage.main(["restore", directory]) == 1
+    assert manage.main(["restore", directory, "--api-stopped"]) == 0
+
+
+@pytest.mark.unit
+def test_verify_summary_inconsistent(manage_db_monkeypatch, monkeypatch):
+    monkeypatch.setattr(manage, 'verify_owner_summary', lambda db_conn: [1])
+    assert manage.main(["rebuild-summary", "--verify-only"]) == 1
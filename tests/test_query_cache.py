@@ -0,0 +1,82 @@
+import pytest
+
+from db import query_cache
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("query, tables", [
+    ("SELECT * FROM cellar.wines WHERE id = %(id)s", {"wines"}),
+    ("SELECT w.name FROM `cellar`.`cellar` AS c LEFT JOIN cellar.wines AS w ON w.id = c.wine_id", {"cellar", "wines"}),
+    ("SELECT id FROM cellar.cellar WHERE wine_id IN (SELECT id FROM ratings)", {"cellar", "ratings"})])
+def test_tables_read(query, tables):
+    assert query_cache.tables_read(query) == tables
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("query, tables", [
+    ("INSERT INTO cellar.wines (name) VALUES (%(name)s)", {"wines"}),
+    ("  update `cellar`.`cellar` SET quantity = 1", {"cellar"}),
+    ("DELETE FROM cellar.drink_window WHERE cellar_id IN (SELECT id FROM cellar.cellar)", {"drink_window"}),
+    ("TRUNCATE TABLE cellar.owners", {"owners"}),
+    ("SELECT * FROM cellar.wines", set())])
+def test_tables_written(query, tables):
+    assert query_cache.tables_written(query) == tables
+
+
+@pytest.mark.unit
+def test_query_cache_invalidation():
+    cache = query_cache.QueryCache()
+    wines_key = cache.key("SELECT * FROM cellar.wines\n  WHERE id = %(id)s", {"id": 1}, False)
+    storages_key = cache.key("SELECT * FROM cellar.storages", None, True)
+    assert wines_key == cache.key("SELECT * FROM cellar.wines WHERE id = %(id)s", {"id": 1}, False)
+
+    cache.set(wines_key, [(1, "Barolo")])
+    cache.set(storages_key, [{"id": 1}])
+    assert cache.get(wines_key) == (True, [(1, "Barolo")])
+
+    # results are copied, mutating a result does not affect the cache
+    cache.get(storages_key)[1][0]["id"] = 2
+    assert cache.get(storages_key) == (True, [{"id": 1}])
+
+    cache.invalidate_query("INSERT INTO cellar.wines (name) VALUES ('Barbera')")
+    assert cache.get(wines_key) == (False, None)
+    assert cache.get(storages_key)[0]
+
+    cache.invalidate_tables(["cellar.storages"])
+    assert not cache.get(storages_key)[0]
+    assert cache.stats() == {"hits": 4, "misses": 2, "entries": 0}
+
+
+@pytest.mark.unit
+def test_query_cache_versions_before_query():
+    cache = query_cache.QueryCache()
+    key = cache.key("SELECT * FROM cellar.wines", None, False)
+    versions = cache.versions(key)
+    cache.invalidate_tables(["wines"])
+    cache.set(key, [(1, "Barolo")], versions=versions)
+    assert cache.get(key) == (False, None)
+
+    cache.set(key, [(1, "Barolo")], versions=cache.versions(key))
+    assert cache.get(key) == (True, [(1, "Barolo")])
+
+
+@pytest.mark.unit
+def test_query_cache_undetected_write_clears():
+    cache = query_cache.QueryCache()
+    key = cache.key("SELECT * FROM cellar.wines", None, False)
+    cache.set(key, [])
+    cache.invalidate_query("SELECT 1")
+    assert cache.get(key)[0]
+    cache.invalidate_query("drop database if exists cellar")
+    assert not cache.get(key)[0]
+
+
+@pytest.mark.unit
+def test_query_cache_eviction():
+    cache = query_cache.QueryCache(max_entries=2)
+    keys = [cache.key(f"SELECT {i} FROM cellar.wines", None, False) for i in range(3)]
+    for key in keys:
+        cache.set(key, [])
+    assert not cache.get(keys[0])[0]
+    assert cache.get(keys[1])[0] and cache.get(keys[2])[0]
+    assert cache.key("SELECT * FROM cellar.wines", {"ids": [1, 2]}, False) is None
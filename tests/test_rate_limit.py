@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+from fastapi import status
+
+from api import constants, rate_limit, cache_backends
+
+
+@pytest.fixture(params=["in_memory", "redis"])
+def rate_limit_backend(request):
+    if request.param == "in_memory":
+        return rate_limit.InMemoryRateLimitBackend()
+    return rate_limit.RedisRateLimitBackend(client=cache_backends.InMemoryRedis())
+
+
+@pytest.mark.unit
+def test_rate_limit_backend(rate_limit_backend, monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(rate_limit.time, 'time', lambda: now[0])
+    assert rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1) == (True, 1)
+    assert rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1) == (True, 0)
+    assert rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1) == (False, 0)
+    assert rate_limit_backend.take("cellar:user:b", capacity=2, refill_per_second=1) == (True, 1)
+
+    now[0] += 1.5
+    assert rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1) == (True, .5)
+    now[0] += 60
+    assert rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1) == (True, 1)
+
+    rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1)
+    rate_limit_backend.clear()
+    assert rate_limit_backend.take("cellar:user:a", capacity=2, refill_per_second=1) == (True, 1)
+
+
+@pytest.mark.unit
+def test_in_memory_rate_limit_backend_bounded(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    backend = rate_limit.InMemoryRateLimitBackend(max_keys=2)
+    backend.take("a", capacity=2, refill_per_second=1)
+    now[0] += 10
+    backend.take("b", capacity=2, refill_per_second=1)
+    # Bucket a refilled completely and is dropped to make room, bucket b is kept
+    backend.take("c", capacity=2, refill_per_second=1)
+    assert set(backend._buckets) == {"b", "c"}
+
+
+@pytest.mark.unit
+def test_rate_limit_backend_from_url():
+    assert isinstance(rate_limit.rate_limit_backend_from_url(None), rate_limit.InMemoryRateLimitBackend)
+    backend = rate_limit.rate_limit_backend_from_url("memory://")
+    assert isinstance(backend, rate_limit.RedisRateLimitBackend)
+    assert isinstance(backend.client, cache_backends.InMemoryRedis)
+    with pytest.raises(ValueError):
+        rate_limit.rate_limit_backend_from_url("memcached://localhost")
+    # the cache and rate limit backends on the same URL share their Redis client
+    assert cache_backends.cache_backend_from_url("memory://").client is backend.client
+    assert cache_backends.redis_client_from_url("memory://other") is not backend.client
+
+
+@pytest.mark.unit
+def test_rate_limit_middleware(test_app, token_new_user, cellar_all_user_data, monkeypatch):
+    token, _ = token_new_user(data=cellar_all_user_data)
+    monkeypatch.setitem(constants.RATE_LIMITS, "cellar_views", {"capacity": 2, "refill_per_second": .01})
+    url = '/cellar_views/wine_in_cellar/get_your_bottles'
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    responses = [test_app.get(url=url, headers=headers) for _ in range(3)]
+    assert [response.status_code for response in responses[:2]] == [status.HTTP_200_OK] * 2
+    assert responses[0].headers["ratelimit-limit"] == "2"
+    assert [response.headers["ratelimit-remaining"] for response in responses] == ["1", "0", "0"]
+    assert responses[1].headers["ratelimit-reset"] == "200"
+    assert responses[2].status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert responses[2].headers["retry-after"] == "100"
+
+    # The buckets are kept per client and per router, requests without a token are limited per address
+    response = test_app.get(url=url)
+    assert response.status_code == status.HTTP_403_FORBIDDEN and response.headers["ratelimit-remaining"] == "1"
+    response = test_app.get(url='/cellar_views/stats', headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    response = test_app.get(url='/users/get_users', headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "ratelimit-limit" not in test_app.get(url='/').headers
+
+
+@pytest.mark.unit
+def test_rate_limit_backend_take_async(rate_limit_backend, monkeypatch):
+    threads = []
+    take = rate_limit_backend.take
+
+    def recording_take(*args, **kwargs):
+        threads.append(threading.get_ident())
+        return take(*args, **kwargs)
+
+    monkeypatch.setattr(rate_limit_backend, "take", recording_take)
+    assert asyncio.run(rate_limit_backend.take_async("cellar:user:a", capacity=2, refill_per_second=1)) == (True, 1)
+    # Only the Redis backend, whose takes are round trips to an external service, leaves the event loop thread
+    on_loop = threads == [threading.get_ident()]
+    assert on_loop == isinstance(rate_limit_backend, rate_limit.InMemoryRateLimitBackend)
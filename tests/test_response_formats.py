@@ -0,0 +1,80 @@
+import io
+import json
+import decimal
+import datetime
+
+import polars as pl
+import pytest
+
+from db.rows import to_rows
+from api import response_formats
+
+
+SCHEMA = {"id": pl.Int64, "location": pl.Utf8, "drinking_date": pl.Date}
+ROWS = [{"id": 1, "location": "cellar", "drinking_date": datetime.date(2023, 5, 1)},
+        {"id": 2, "location": None, "drinking_date": "2024-01-31"}]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("accept, expected", [
+    (None, "application/json"),
+    ("*/*", "application/json"),
+    ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.stream"),
+    ("application/json;q=0.5, application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.stream"),
+    ("application/vnd.apache.arrow.stream;q=0.2, application/json", "application/json"),
+    ("application/vnd.apache.arrow.stream;q=invalid", "application/json"),
+    ("text/html", "application/json")])
+def test_negotiate_media_type(accept, expected):
+    assert response_formats.negotiate_media_type(accept) == expected
+
+
+@pytest.mark.unit
+def test_negotiate_msgpack_availability(monkeypatch):
+    monkeypatch.setattr(response_formats, "msgpack", None)
+    assert response_formats.negotiate_media_type("application/msgpack") == "application/json"
+    with pytest.raises(ImportError, match="msgpack"):
+        response_formats.msgpack_bytes(rows=ROWS)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_trusted_json_response(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(response_formats, "orjson", None)
+    # Rows of select results are serialised like dicts
+    row = to_rows(list(ROWS[1]), [tuple(ROWS[1].values())])[0]
+    rows = [{**ROWS[0], "alcohol_vol_perc": decimal.Decimal("13.5")}, row]
+    response = response_formats.TrustedJSONResponse(content=rows, headers={"ETag": '"1"'})
+    assert response.media_type == "application/json"
+    assert response.headers["etag"] == '"1"'
+    assert json.loads(response.body) == [{**ROWS[0], "drinking_date": "2023-05-01", "alcohol_vol_perc": 13.5},
+                                         ROWS[1]]
+
+
+@pytest.mark.unit
+def test_arrow_stream_response():
+    response = response_formats.binary_response(rows=ROWS, media_type=response_formats.ARROW_STREAM_MEDIA_TYPE,
+                                                schema=SCHEMA, headers={"ETag": '"1"'})
+    assert response.media_type == "application/vnd.apache.arrow.stream"
+    assert response.headers["etag"] == '"1"'
+    frame = pl.read_ipc_stream(io.BytesIO(response.body))
+    assert frame.schema == pl.Schema(SCHEMA)
+    assert frame["drinking_date"].to_list() == [datetime.date(2023, 5, 1), datetime.date(2024, 1, 31)]
+
+    # Empty lists keep their schema
+    empty = response_formats.arrow_stream_bytes(rows=[], schema=SCHEMA)
+    assert pl.read_ipc_stream(io.BytesIO(empty)).schema == pl.Schema(SCHEMA)
+
+
+@pytest.mark.unit
+def test_msgpack_response():
+    msgpack = pytest.importorskip("msgpack")
+    response = response_formats.binary_response(rows=ROWS, media_type=response_formats.MSGPACK_MEDIA_TYPE,
+                                                schema=SCHEMA)
+    assert msgpack.unpackb(response.body) == [{**ROWS[0], "drinking_date": "2023-05-01"}, ROWS[1]]
+
+
+@pytest.mark.unit
+def test_unsupported_binary_media_type():
+    with pytest.raises(ValueError):
+        response_formats.binary_response(rows=ROWS, media_type="application/json", schema=SCHEMA)
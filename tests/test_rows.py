@@ -0,0 +1,52 @@
+import pickle
+
+import pytest
+
+from pydantic import BaseModel
+
+from db.rows import Row, column_index, to_rows
+
+
+class RowModel(BaseModel):
+    id: int
+    name: str
+
+
+@pytest.mark.unit
+def test_row_mapping():
+    rows = to_rows(["id", "name"], [(1, "Barolo"), (2, "Chablis")])
+    row = rows[0]
+
+    assert row["name"] == "Barolo"
+    assert row.get("vintage") is None and row.get("id") == 1
+    assert "name" in row and "vintage" not in row
+    assert list(row) == ["id", "name"] and len(row) == 2
+    assert list(row.items()) == [("id", 1), ("name", "Barolo")]
+    assert row == {"id": 1, "name": "Barolo"} and {"id": 2, "name": "Chablis"} == rows[1]
+    assert {**row, "name": "Barbaresco"} == {"id": 1, "name": "Barbaresco"}
+    assert RowModel(**row) == RowModel(id=1, name="Barolo")
+    assert repr(row) == "Row({'id': 1, 'name': 'Barolo'})"
+    with pytest.raises(KeyError):
+        row["vintage"]
+    with pytest.raises(TypeError):
+        row["name"] = "Barbaresco"
+
+
+@pytest.mark.unit
+def test_rows_share_column_index():
+    rows = to_rows(("id", "name"), [(1, "Barolo"), (2, "Chablis")])
+    other = to_rows(["id", "name"], [(3, "Rioja")])
+    assert rows[0]._index is rows[1]._index is other[0]._index is column_index(("id", "name"))
+    assert not hasattr(rows[0], "__dict__")
+
+
+@pytest.mark.unit
+def test_duplicate_columns_keep_last_value():
+    assert to_rows(["id", "id"], [(1, 2)])[0] == {"id": 2}
+
+
+@pytest.mark.unit
+def test_row_pickle():
+    row = to_rows(["id", "name"], [(1, "Barolo")])[0]
+    assert pickle.loads(pickle.dumps(row)) == row
+    assert isinstance(pickle.loads(pickle.dumps(row)), Row)
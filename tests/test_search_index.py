@@ -0,0 +1,124 @@
+import math
+
+import pytest
+
+from api import search_index, cache_backends
+
+
+@pytest.fixture
+def filled_search_index():
+    index = search_index.SearchIndex()
+    index.add_wine(wine_id=1, name="Barolo Castiglione", vintage=2016, grapes="Nebbiolo 100%",
+                   geographic_info="country: Italy,\tregion: Piedmont,\tproducer: Vietti,\tadditional_info: None",
+                   quality_signature="DOCG")
+    index.add_wine(wine_id=2, name="Langhe Nebbiolo", vintage=2019, grapes="Nebbiolo",
+                   geographic_info="country: Italy,\tregion: Piedmont,\tproducer: None,\tadditional_info: None")
+    index.add_wine(wine_id=3, name="Chianti Classico", vintage=2018, grapes="Sangiovese",
+                   geographic_info="country: Italy,\tregion: Tuscany,\tproducer: None,\tadditional_info: None")
+    index.add_rating(rating_id=10, rater_id=1, wine_id=3, comments="Cherry and leather, lovely")
+    index.add_rating(rating_id=11, rater_id=2, wine_id=1, comments="Tar and roses, cherry finish")
+    return index
+
+
+@pytest.mark.unit
+def test_tokenize():
+    assert search_index.tokenize("Nebbiolo 85%, None barbera") == ["nebbiolo", "85", "barbera"]
+    assert search_index.tokenize(None) == []
+
+
+@pytest.mark.unit
+def test_search_ranking(filled_search_index):
+    results = filled_search_index.search(query="nebbiolo", owner_id=1, owner_wines={1, 2, 3})
+    # the wine named after the search term ranks first
+    assert [result["wine_id"] for result in results] == [2, 1]
+    assert results[0]["name"] == "Langhe Nebbiolo" and results[0]["vintage"] == 2019
+
+
+@pytest.mark.unit
+def test_search_ranking_repeated_ratings(filled_search_index):
+    # the notes are weighed against all ratings of the owner, also when these rate the same wine
+    filled_search_index.add_rating(rating_id=20, rater_id=3, wine_id=3, comments="Reminds me of Piedmont")
+    for rating_id in (21, 22, 23):
+        filled_search_index.add_rating(rating_id=rating_id, rater_id=3, wine_id=3, comments="Fresh")
+    results = filled_search_index.search(query="piedmont", owner_id=3, owner_wines={1, 2})
+    assert [result["wine_id"] for result in results] == [3, 1, 2]
+    assert results[0]["score"] == round(math.log(1 + 4 / 1), 4)
+    assert results[0]["rating_ids"] == [20]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("query, owner_id, owner_wines, wine_ids",
+                         [("piedmont nebbiolo", 1, {1, 2, 3}, [2, 1]),
+                          ("nebbiolo", 1, {2}, [2]),
+                          ("country", 1, {1, 2, 3}, []),
+                          ("cherry", 1, set(), [3]),
+                          ("cherry tar", 2, set(), [1]),
+                          ("cherry tar", 1, {1, 2, 3}, []),
+                          ("", 1, {1, 2, 3}, [])])
+def test_search_scope(filled_search_index, query, owner_id, owner_wines, wine_ids):
+    results = filled_search_index.search(query=query, owner_id=owner_id, owner_wines=owner_wines)
+    assert [result["wine_id"] for result in results] == wine_ids
+
+
+@pytest.mark.unit
+def test_search_matched_ratings(filled_search_index):
+    results = filled_search_index.search(query="tuscany leather", owner_id=1, owner_wines={3})
+    assert results[0]["rating_ids"] == [10]
+
+    filled_search_index.clear()
+    assert not filled_search_index.loaded
+    assert filled_search_index.search(query="tuscany", owner_id=1, owner_wines={3}) == []
+
+
+class FakeDb:
+    def __init__(self):
+        self.queries = []
+
+    def execute_query_select(self, query: str, params: dict | None = None):
+        self.queries.append(params)
+        if "FROM cellar.wines" in query:
+            return [(4, "Barbera d'Alba", 2020, "Barbera", None, None)]
+        return [(30, 1, 4, "Violets and cherries")]
+
+
+@pytest.mark.unit
+def test_writes_between_workers():
+    backend = cache_backends.InProcessCacheBackend()
+    worker_a = search_index.SearchIndex(backend=backend, namespace="search")
+    worker_b = search_index.SearchIndex(backend=backend, namespace="search")
+    db = FakeDb()
+    worker_a.load(db_conn=db)
+    worker_b.load(db_conn=db)
+    db.queries.clear()
+    worker_b.add_wine(wine_id=5, name="Dolcetto", vintage=2021)
+
+    worker_a.publish_wines([5, 6])
+    worker_a.publish_ratings(rater_id=1)
+    # a worker does not fetch its own writes, the other worker fetches the wines it misses and the rater's ratings
+    worker_a.ensure_loaded(db_conn=db)
+    assert not db.queries
+    worker_b.ensure_loaded(db_conn=db)
+    assert db.queries == [{"wine_0": 6}, {"rater_0": 1}]
+    results = worker_b.search(query="violets", owner_id=1, owner_wines=set())
+    assert [(result["wine_id"], result["rating_ids"]) for result in results] == [(4, [30])]
+    # ratings fetched again are not counted twice
+    worker_b.add_rating(rating_id=30, rater_id=1, wine_id=4, comments="Violets and cherries")
+    assert worker_b.search(query="violets", owner_id=1, owner_wines=set()) == results
+
+    worker_a.clear()
+    assert not worker_b.loaded
+
+
+@pytest.mark.unit
+def test_reload_after_ttl(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(search_index.time, 'monotonic', lambda: now[0])
+    index = search_index.SearchIndex(ttl_seconds=10)
+    db = FakeDb()
+    index.ensure_loaded(db_conn=db)
+    now[0] += 10
+    index.ensure_loaded(db_conn=db)
+    assert len(db.queries) == 2
+    now[0] += 1
+    index.ensure_loaded(db_conn=db)
+    assert len(db.queries) == 4
@@ -0,0 +1,74 @@
+import os
+import json
+
+import pytest
+
+from api import snapshots
+from api.constants import STATS_CACHE, OWNER_VERSIONS
+from api.routers.cellar_funcs import get_changes
+
+
+@pytest.mark.unit
+def test_snapshot_tables():
+    tables = snapshots.snapshot_tables()
+    assert tables[:5] == ["cellar", "owners", "storages", "ratings", "wines"]
+    assert "changes_compaction" in tables
+
+
+@pytest.mark.unit
+def test_snapshot_and_restore(db_monkeypatch, tmp_path):
+    db_test_conn = db_monkeypatch
+    owners = db_test_conn.execute_query_select(query="SELECT * FROM cellar.owners ORDER BY id")
+    directory = str(tmp_path / "snapshot")
+
+    manifest = snapshots.snapshot_database(db_conn=db_test_conn, directory=directory, batch_size=1)
+    assert manifest["name"] == "snapshot"
+    assert list(manifest["tables"]) == snapshots.snapshot_tables()
+    assert manifest["tables"]["owners"] == len(owners)
+    assert len(os.listdir(os.path.join(directory, "owners"))) == len(owners)
+    with open(os.path.join(directory, snapshots.SNAPSHOT_MANIFEST)) as file:
+        assert json.load(file)["tables"] == manifest["tables"]
+
+    db_test_conn.execute_query("DELETE FROM cellar.owners WHERE id = 0")
+    restored = snapshots.restore_database(db_conn=db_test_conn, directory=directory, batch_size=2)
+    assert restored == manifest["tables"]
+    assert db_test_conn.execute_query_select(query="SELECT * FROM cellar.owners ORDER BY id") == owners
+
+
+@pytest.mark.unit
+def test_restore_forces_resync(db_monkeypatch, tmp_path):
+    db_test_conn = db_monkeypatch
+    directory = str(tmp_path / "snapshot")
+    snapshots.snapshot_database(db_conn=db_test_conn, directory=directory)
+    # Changes made after the snapshot are rewound by the restore
+    db_test_conn.execute_query("INSERT INTO cellar.changes (owner_id, entity, entity_id, operation) "
+                               "VALUES (0, 'owner', 0, 'upsert')")
+    cursor = db_test_conn.execute_query_select(query="SELECT MAX(id) FROM cellar.changes")[0][0]
+    STATS_CACHE.set(0, {"bottles": 1})
+    version = OWNER_VERSIONS.get(0)
+
+    snapshots.restore_database(db_conn=db_test_conn, directory=directory)
+    assert STATS_CACHE.get(0) is None
+    assert OWNER_VERSIONS.get(0) != version
+    changes = get_changes(db_conn=db_test_conn, owner_id=0, since=cursor, limit=10)
+    assert changes["full_resync"] and changes["version"] > cursor
+    assert not get_changes(db_conn=db_test_conn, owner_id=0, since=changes["version"], limit=10)["full_resync"]
+
+
+@pytest.mark.unit
+def test_restore_incomplete_snapshot(db_monkeypatch, tmp_path):
+    db_test_conn = db_monkeypatch
+    directory = str(tmp_path / "snapshot")
+    snapshots.snapshot_database(db_conn=db_test_conn, directory=directory)
+    with open(os.path.join(directory, snapshots.SNAPSHOT_MANIFEST)) as file:
+        manifest = json.load(file)
+    # Tables unknown to the schema are ignored, missing part files are detected
+    manifest["tables"] = {"unknown": 1, "owners": manifest["tables"]["owners"] + 1}
+    with open(os.path.join(directory, snapshots.SNAPSHOT_MANIFEST), 'w') as file:
+        json.dump(manifest, file)
+
+    owners = db_test_conn.execute_query_select(query="SELECT * FROM cellar.owners ORDER BY id")
+    with pytest.raises(ValueError, match="owners"):
+        snapshots.restore_database(db_conn=db_test_conn, directory=directory)
+    # The snapshot is rejected before any table is emptied
+    assert db_test_conn.execute_query_select(query="SELECT * FROM cellar.owners ORDER BY id") == owners
@@ -6,6 +6,7 @@ import pytest
 from fastapi import status
 
 from api.constants import JWT_KEY, ALGORITHM
+from api.routers import users_router
 
 
 @pytest.mark.unit
@@ -156,3 +157,35 @@ def test_update_user(test_app, token_admin, token_new_user, expendable_user_data
     assert response_upd.status_code == status.HTTP_200_OK
     assert response_upd.json() == "User information updated successfully."
 
+
+
+@pytest.mark.unit
+def test_snapshot_db(test_app, token_admin, token_new_user, scopeless_user_data, monkeypatch, tmp_path):
+    monkeypatch.setattr(users_router, 'SNAPSHOT_DIR', str(tmp_path))
+    response = test_app.post(url='/users/snapshot',
+                             headers={"Authorization": f"Bearer {token_admin['access_token']}"})
+    assert response.status_code == status.HTTP_200_OK
+    snapshot = response.json()
+    assert snapshot["name"].startswith("cellar_")
+    assert snapshot["tables"]["owners"] >= 1
+    assert (tmp_path / snapshot["name"] / "manifest.json").exists()
+
+    token, _ = token_new_user(data=scopeless_user_data)
+    response = test_app.post(url='/users/snapshot', headers={"Authorization": f"Bearer {token['access_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json()["detail"] == "Not enough permissions"
+
+
+@pytest.mark.unit
+def test_get_db_admission_stats(test_app, token_admin, token_new_user, scopeless_user_data):
+    response = test_app.get(url='/users/db_admission_stats',
+                            headers={"Authorization": f"Bearer {token_admin['access_token']}"})
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert stats["admitted"] >= 1 and stats["max_concurrency"] >= 1
+    assert stats["queue_length"] == 0
+
+    token, _ = token_new_user(data=scopeless_user_data)
+    response = test_app.get(url='/users/db_admission_stats',
+                            headers={"Authorization": f"Bearer {token['access_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,46 @@
+import datetime
+
+import pytest
+
+from api import wine_info
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("drink_from, drink_before, years", [
+    (datetime.date(2020, 1, 1), datetime.date(2022, 6, 1), [2020, 2021, 2022]),
+    (datetime.date(2020, 3, 1), datetime.date(2022, 1, 1), [2021, 2022]),
+    ("2020-01-01", "2020-12-31", [2020]),
+    (datetime.date(2020, 3, 1), datetime.date(2020, 12, 31), []),
+    (datetime.date(2022, 1, 1), datetime.date(2020, 1, 1), [])])
+def test_drink_window_years(drink_from, drink_before, years):
+    assert list(wine_info.drink_window_years(drink_from, drink_before)) == years
+
+
+@pytest.mark.unit
+def test_drink_window_years_open_ended():
+    # an open-ended window is cut off a number of years after the current year
+    years = wine_info.drink_window_years("2020-01-01", "9999-12-31", max_years=10)
+    assert years == range(2020, datetime.date.today().year + 11)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("geographic_info, parsed", [
+    ("country: Italy,\tregion: Piedmont,\tproducer: Vietti,\tadditional_info: None",
+     {"country": "Italy", "region": "Piedmont", "producer": "Vietti"}),
+    ("country: France,\tregion: None,\tadditional_info: Clos", {"country": "France", "region": None, "producer": None}),
+    ("country: France,\tregion: Burgundy,\tadditional_info: Producer: Roumier, Bonnes-Mares",
+     {"country": "France", "region": "Burgundy", "producer": "Roumier"}),
+    ("country: Italy,\tregion: None,\tproducer: None,\tadditional_info: producer: Vietti",
+     {"country": "Italy", "region": None, "producer": None}),
+    (None, {"country": None, "region": None, "producer": None})])
+def test_parse_geo_info(geographic_info, parsed):
+    assert wine_info.parse_geo_info(geographic_info) == parsed
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("grapes, parsed", [("Nebbiolo", ["nebbiolo"]),
+                                            ("60% Merlot, Cabernet Franc 40 %, merlot", ["merlot", "cabernet franc"]),
+                                            ("None", []), (None, []),
+                                            ("Nebbiolo " + 120 * "x", ["nebbiolo " + 91 * "x"])])
+def test_parse_grapes(grapes, parsed):
+    assert wine_info.parse_grapes(grapes) == parsed